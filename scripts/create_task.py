@@ -11,7 +11,7 @@ if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
 
 from src.models.task import GenerationTask  # noqa: E402
-from src.storage.task_storage import TaskStorage  # noqa: E402
+from src.storage.factory import create_task_storage  # noqa: E402
 
 
 def main() -> None:
@@ -24,7 +24,7 @@ def main() -> None:
     url = sys.argv[1]
     task = GenerationTask.new(source_url=url, platform="youtube")
 
-    storage = TaskStorage(Path(ROOT) / "data" / "tasks.jsonl")
+    storage = create_task_storage(Path(ROOT) / "data")
     storage.add_task(task)
 
     print(f"Task created: {task.id}")
@@ -7,6 +7,7 @@ ROOT = str(Path(__file__).resolve().parents[1])
 if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
 
+from src.api.utils import reconstruct_analyzed_and_carousel
 from src.models.brand_profile import BrandProfile
 from src.pipeline.blotato_adapter import to_blotato_payload
 from src.storage.json_storage import JsonStorage
@@ -15,14 +16,14 @@ from src.storage.json_storage import JsonStorage
 def main():
     runs_path = Path(ROOT) / "data" / "runs.jsonl"
     storage = JsonStorage(runs_path)
-    runs = storage.load_runs()
+    # Берем последний прогон (читается с конца файла)
+    run = storage.load_last_run()
 
-    if not runs:
+    if run is None:
         print("No runs found in data/runs.jsonl. Run a pipeline first.")
         return
 
-    # Берем последний прогон
-    run = runs[-1]
+    analyzed, carousel = reconstruct_analyzed_and_carousel(run)
     
     # Создаем фиктивный профиль бренда
     brand = BrandProfile(
@@ -34,11 +35,11 @@ def main():
         style_hint="Professional, encouraging, expert tone"
     )
 
-    print(f"Generating Blotato payload for run from: {run.created_at}")
-    print(f"Reference: {run.reference.title}")
+    print(f"Generating Blotato payload for run from: {run['created_at']}")
+    print(f"Reference: {run['reference']['title']}")
     print("-" * 20)
 
-    payload = to_blotato_payload(run.carousel, run.analyzed, brand)
+    payload = to_blotato_payload(carousel, analyzed, brand)
     body = payload.to_request_body()
 
     print(json.dumps(body, indent=2, ensure_ascii=False))
@@ -1,6 +1,7 @@
 # scripts/run_analyze_sample.py
 from __future__ import annotations
 
+import asyncio
 import json
 import os
 import sys
@@ -13,9 +14,73 @@ if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
 
 from src.config.settings import Settings  # noqa: E402
-from src.clients.llm_client import LlmClient  # noqa: E402
+from src.clients import http_pool  # noqa: E402
+from src.clients.llm_batch_client import LlmBatchClient  # noqa: E402
+from src.clients.llm_client import AsyncLlmClient  # noqa: E402
+from src.pipeline.condense_transcript import condense_reference_async  # noqa: E402
 from src.pipeline.fetch_refs import fetch_all_refs  # noqa: E402
-from src.pipeline.analyze_content import analyze_reference, create_dummy_analysis  # noqa: E402
+from src.pipeline.analyze_content import (  # noqa: E402
+    analyze_reference_async,
+    analyze_references_batch,
+    create_dummy_analysis,
+)
+
+
+async def analyze_all(settings: Settings, refs: list) -> list:
+    """
+    Анализирует референсы одновременно: параллельность и лимиты провайдера
+    держит AsyncLlmClient (LLM_MAX_CONCURRENCY, LLM_RPM, LLM_TPM).
+    Возвращает результаты (или исключения) в порядке refs.
+    """
+    if not settings.limits.llm_enabled:
+        return [create_dummy_analysis(ref) for ref in refs]
+
+    llm_client = AsyncLlmClient.from_settings(settings)
+
+    async def analyze_one(ref):
+        # Длинный транскрипт сначала сжимается под LLM_TRANSCRIPT_TOKEN_BUDGET
+        prompt_ref = await condense_reference_async(settings, ref, llm_client)
+        return await analyze_reference_async(prompt_ref, llm_client)
+
+    try:
+        return await asyncio.gather(
+            *(analyze_one(ref) for ref in refs),
+            return_exceptions=True,
+        )
+    finally:
+        if llm_client.cache_stats():
+            print(f"LLM cache: {llm_client.cache_stats()}")
+        await http_pool.aclose_all()
+
+
+async def condense_all(settings: Settings, refs: list) -> list:
+    """
+    Сжимает длинные транскрипты под LLM_TRANSCRIPT_TOKEN_BUDGET перед пачкой:
+    в Batch API уходят уже готовые промпты, а сжатие — обычные параллельные вызовы.
+    """
+    llm_client = AsyncLlmClient.from_settings(settings)
+    try:
+        return await asyncio.gather(*(condense_reference_async(settings, ref, llm_client) for ref in refs))
+    finally:
+        await http_pool.aclose_all()
+
+
+def analyze_all_batch(settings: Settings, refs: list) -> list:
+    """
+    Анализирует референсы одной пачкой через Batch API (LLM_BATCH=1):
+    дешевле синхронных вызовов, но ответ может прийти не сразу.
+    """
+    if not settings.limits.llm_enabled:
+        return [create_dummy_analysis(ref) for ref in refs]
+
+    prompt_refs = asyncio.run(condense_all(settings, refs))
+    batch_client = LlmBatchClient.from_settings(settings)
+    try:
+        return analyze_references_batch(prompt_refs, batch_client)
+    finally:
+        if batch_client.cache_stats():
+            print(f"LLM cache: {batch_client.cache_stats()}")
+        http_pool.close_all()
 
 
 def main() -> None:
@@ -29,12 +94,11 @@ def main() -> None:
     print(f"YouTube results per query: {settings.limits.youtube_max_results}")
     print(f"LLM enabled: {settings.limits.llm_enabled}")
     print(f"LLM analyses per run: {settings.limits.llm_max_analyses_per_run}")
+    print(f"LLM batch mode: {settings.llm.batch}")
     print("-" * 40)
 
-    try:
-        llm_client = LlmClient() if settings.limits.llm_enabled else None
-    except RuntimeError as e:
-        print(f"Ошибка инициализации LLM: {e}")
+    if settings.limits.llm_enabled and not os.getenv("OPENAI_API_KEY"):
+        print("Ошибка инициализации LLM: OPENAI_API_KEY env var is required")
         print("Убедитесь, что OPENAI_API_KEY установлен в .env")
         return
 
@@ -50,36 +114,37 @@ def main() -> None:
     refs_to_analyze = refs[:limit]
     
     print(f"Найдено {len(refs)} референсов. Анализируем {len(refs_to_analyze)}...")
+    if settings.llm.batch:
+        results = analyze_all_batch(settings, refs_to_analyze)
+    else:
+        results = asyncio.run(analyze_all(settings, refs_to_analyze))
 
     analyzed_count = 0
-    for idx, ref in enumerate(refs_to_analyze, start=1):
+    for idx, (ref, analyzed) in enumerate(zip(refs_to_analyze, results), start=1):
         print(f"\n=== Анализ референса #{idx} ===")
         print(f"URL: {ref.url}")
         print(f"Title: {ref.title}")
-        
-        try:
-            if not settings.limits.llm_enabled:
-                analyzed = create_dummy_analysis(ref)
-                print("(Dry-run: использована заглушка вместо вызова LLM)")
-            else:
-                analyzed = analyze_reference(ref, llm_client)
-
-            print("\nРезультат анализа:")
-            output = {
-                "summary": analyzed.summary,
-                "content_type": analyzed.content_type.value,
-                "target_audience_score": analyzed.target_audience_score,
-                "usefulness_score": analyzed.usefulness_score,
-                "suggested_carousel_angle": analyzed.suggested_carousel_angle,
-                "key_points_count": len(analyzed.key_points),
-                "key_points": analyzed.key_points,
-            }
-            print(json.dumps(output, ensure_ascii=False, indent=2))
-            analyzed_count += 1
-            
-        except Exception as e:
-            print(f"Ошибка при анализе референса: {e}")
-        
+
+        if isinstance(analyzed, Exception):
+            print(f"Ошибка при анализе референса: {analyzed}")
+            print("-" * 40)
+            continue
+
+        if not settings.limits.llm_enabled:
+            print("(Dry-run: использована заглушка вместо вызова LLM)")
+
+        print("\nРезультат анализа:")
+        output = {
+            "summary": analyzed.summary,
+            "content_type": analyzed.content_type.value,
+            "target_audience_score": analyzed.target_audience_score,
+            "usefulness_score": analyzed.usefulness_score,
+            "suggested_carousel_angle": analyzed.suggested_carousel_angle,
+            "key_points_count": len(analyzed.key_points),
+            "key_points": analyzed.key_points,
+        }
+        print(json.dumps(output, ensure_ascii=False, indent=2))
+        analyzed_count += 1
         print("-" * 40)
 
     print(f"\nВсего проанализировано референсов: {analyzed_count}")
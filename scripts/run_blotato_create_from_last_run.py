@@ -16,21 +16,16 @@ from src.models.brand_profile import BrandProfile  # noqa: E402
 from src.clients.blotato_client import BlotatoClient  # noqa: E402
 from src.pipeline.blotato_adapter import to_blotato_payload  # noqa: E402
 from src.api.utils import reconstruct_analyzed_and_carousel  # noqa: E402
+from src.storage.json_storage import JsonStorage  # noqa: E402
 
 
 def load_last_run(path: Path) -> dict:
     if not path.exists():
         raise RuntimeError(f"runs file not found: {path}")
-    last_line = None
-    with path.open("r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            last_line = line
-    if last_line is None:
+    run_dict = JsonStorage(path).load_last_run()
+    if run_dict is None:
         raise RuntimeError("runs file is empty")
-    return json.loads(last_line)
+    return run_dict
 
 
 def main() -> None:
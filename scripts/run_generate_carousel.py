@@ -14,6 +14,7 @@ if ROOT not in sys.path:
 
 from src.config.settings import Settings  # noqa: E402
 from src.clients.llm_client import LlmClient  # noqa: E402
+from src.pipeline.condense_transcript import condense_reference  # noqa: E402
 from src.pipeline.fetch_refs import fetch_all_refs  # noqa: E402
 from src.pipeline.analyze_content import analyze_reference  # noqa: E402
 from src.pipeline.generate_carousel import generate_carousel_spec  # noqa: E402
@@ -28,7 +29,7 @@ def main() -> None:
     settings = Settings.from_env()
     
     try:
-        llm_client = LlmClient()
+        llm_client = LlmClient.from_settings(settings)
     except RuntimeError as e:
         print(f"Ошибка инициализации LLM: {e}")
         return
@@ -55,7 +56,9 @@ def main() -> None:
         print("LLM выключен в настройках. Невозможно сгенерировать карусель.")
         return
         
-    analyzed = analyze_reference(ref, llm_client)
+    # Длинный транскрипт сначала сжимается под LLM_TRANSCRIPT_TOKEN_BUDGET
+    prompt_ref = condense_reference(settings, ref, llm_client)
+    analyzed = analyze_reference(prompt_ref, llm_client)
 
     print("Генерация структуры карусели (модуль 3)...")
     spec = generate_carousel_spec(analyzed, llm_client)
@@ -0,0 +1,29 @@
+# scripts/run_worker.py
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.services.worker_service import run_worker  # noqa: E402
+
+
+def main() -> None:
+    # Загружаем переменные окружения
+    load_dotenv()
+
+    print("Starting worker daemon (Ctrl+C / SIGTERM to stop after the current task)...")
+    try:
+        run_worker(ROOT)
+    except Exception as e:
+        print(f"Worker crashed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
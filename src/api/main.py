@@ -2,14 +2,16 @@
 from __future__ import annotations
 
 import sys
-import json
 import os
+from contextlib import asynccontextmanager
 from pathlib import Path
+from datetime import datetime
+from itertools import islice
 from typing import List, Optional
 
-from fastapi import FastAPI, HTTPException, Request, Form, Response
+from fastapi import FastAPI, HTTPException, Request, Form, Response, Query
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
 
@@ -21,71 +23,97 @@ if str(ROOT) not in sys.path:
 # Загружаем переменные окружения
 load_dotenv()
 
-from src.models.task import GenerationTask, TaskStatus
-from src.storage.task_storage import TaskStorage
+from src.models.task import GenerationTask, PipelineMode, TaskStatus
+from src.storage.factory import create_task_storage
 from src.storage.json_storage import JsonStorage
 from src.services.worker_service import process_one_pending_task
-from src.services.export_service import run_to_markdown
+from src.services.export_service import run_to_markdown, runs_to_markdown
 from src.models.brand_profile import BrandProfile
 from src.pipeline.blotato_adapter import to_blotato_payload
 from src.clients.blotato_client import BlotatoClient
 from src.api.utils import reconstruct_analyzed_and_carousel
+from src.clients import http_pool
 
-app = FastAPI(title="Zavod Carousel API")
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    # Один пул соединений на хост на всё время жизни приложения
+    http_pool.configure()
+    try:
+        yield
+    finally:
+        http_pool.close_all()
+        await http_pool.aclose_all()
+
+app = FastAPI(title="Zavod Carousel API", lifespan=lifespan)
 
 # Настройка шаблонов
 templates = Jinja2Templates(directory=str(ROOT / "templates"))
 
 # Инициализируем хранилища
-tasks_path = ROOT / "data" / "tasks.jsonl"
 runs_path = ROOT / "data" / "runs.jsonl"
 
 # Создаем директорию data, если её нет
-tasks_path.parent.mkdir(parents=True, exist_ok=True)
+runs_path.parent.mkdir(parents=True, exist_ok=True)
 
-task_storage = TaskStorage(tasks_path)
+task_storage = create_task_storage(ROOT / "data")
 run_storage = JsonStorage(runs_path)
 
 def load_last_run_dict() -> dict | None:
-    if not runs_path.exists():
-        return None
-
-    last_line = None
     try:
-        with runs_path.open("r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if line:
-                    last_line = line
+        return run_storage.load_last_run()
     except Exception:
         return None
-        
-    if last_line is None:
+
+def parse_status(status: Optional[str]) -> Optional[TaskStatus]:
+    if not status:
         return None
-    return json.loads(last_line)
+    try:
+        return TaskStatus(status)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Unknown status: {status}")
+
+def parse_pipeline_mode(mode: Optional[str]) -> Optional[PipelineMode]:
+    if not mode:
+        return None
+    try:
+        return PipelineMode(mode)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Unknown pipeline mode: {mode}")
+
+def load_tasks_page(status: Optional[str], limit: int, after: Optional[str]):
+    try:
+        return task_storage.list_tasks_page(parse_status(status), limit=limit, after=after)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 # --- HTML Эндпоинты ---
 
 @app.get("/", response_class=HTMLResponse)
-async def index(request: Request, status: Optional[str] = None):
-    """Главная страница со списком задач и формой управления."""
-    tasks = task_storage.list_tasks()
-    if status:
-        tasks = [t for t in tasks if t.status.value == status]
-    
+async def index(
+    request: Request,
+    status: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    after: Optional[str] = None,
+):
+    """Главная страница со списком задач (постранично) и формой управления."""
+    tasks, next_cursor = load_tasks_page(status, limit, after)
+
     return templates.TemplateResponse(
         "index.html",
         {
             "request": request,
             "tasks": tasks,
             "status_filter": status,
+            "statuses": [s.value for s in TaskStatus],
+            "limit": limit,
+            "next_cursor": next_cursor,
         },
     )
 
 @app.post("/tasks/create")
-async def create_task_form(url: str = Form(...)):
+async def create_task_form(url: str = Form(...), pipeline_mode: Optional[str] = Form(None)):
     """Обработка формы создания задачи."""
-    task = GenerationTask.new(source_url=url, platform="youtube")
+    task = GenerationTask.new(source_url=url, platform="youtube", pipeline_mode=parse_pipeline_mode(pipeline_mode))
     task_storage.add_task(task)
     return RedirectResponse(url="/", status_code=303)
 
@@ -101,6 +129,23 @@ async def process_one_task():
         print(f"API Error processing task: {e}")
         return RedirectResponse(url="/?msg=error", status_code=303)
 
+@app.post("/tasks/{task_id}/retry")
+async def retry_task(task_id: str):
+    """
+    Возвращает FAILED-задачу в очередь. Воркер продолжит её с первой
+    незавершённой стадии — уже полученные Reference и анализ берутся из чекпоинта.
+    """
+    task = task_storage.get_task(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if task.status != TaskStatus.FAILED:
+        raise HTTPException(status_code=409, detail=f"Only failed tasks can be retried (status: {task.status.value})")
+
+    task.status = TaskStatus.PENDING
+    task.error = None
+    task_storage.update_task(task)
+    return RedirectResponse(url=f"/?msg=retried&task_id={task.id}", status_code=303)
+
 @app.post("/runs/latest/approve")
 async def approve_latest_run():
     """Одобряет последнюю карусель и отправляет её в Blotato."""
@@ -144,6 +189,37 @@ async def view_latest_run(request: Request):
         {"request": request, "run": run_dict},
     )
 
+@app.get("/runs/export/markdown")
+async def export_runs_markdown(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    content_type: Optional[str] = None,
+    min_usefulness: Optional[float] = None,
+):
+    """Выгружает историю прогонов в Markdown потоком, без загрузки всего файла в память."""
+    runs = run_storage.iter_runs(
+        since=since,
+        until=until,
+        content_type=content_type,
+        min_usefulness=min_usefulness,
+    )
+    return StreamingResponse(
+        runs_to_markdown(runs),
+        media_type="text/markdown",
+        headers={
+            "Content-Disposition": "attachment; filename=carousels.md"
+        }
+    )
+
+@app.get("/runs/{run_id}/view", response_class=HTMLResponse)
+async def view_run(request: Request, run_id: str):
+    """Страница просмотра результата конкретной задачи."""
+    run_dict = run_storage.get_run(run_id)
+    return templates.TemplateResponse(
+        "run_view.html",
+        {"request": request, "run": run_dict},
+    )
+
 @app.get("/runs/latest/markdown")
 async def download_latest_markdown():
     """Скачивает последнюю карусель в формате Markdown."""
@@ -167,6 +243,8 @@ async def download_latest_markdown():
 
 class TaskCreate(BaseModel):
     url: str
+    # None — режим конвейера из PIPELINE_MODE
+    pipeline_mode: Optional[str] = None
 
 class TaskResponse(BaseModel):
     id: str
@@ -177,7 +255,7 @@ class TaskResponse(BaseModel):
 @app.post("/tasks", response_model=TaskResponse)
 def create_task_api(payload: TaskCreate):
     """API эндпоинт для создания задачи."""
-    task = GenerationTask.new(payload.url)
+    task = GenerationTask.new(payload.url, pipeline_mode=parse_pipeline_mode(payload.pipeline_mode))
     task_storage.add_task(task)
     return TaskResponse(
         id=task.id,
@@ -186,12 +264,22 @@ def create_task_api(payload: TaskCreate):
     )
 
 @app.get("/tasks", response_model=List[TaskResponse])
-def list_tasks_api(status: Optional[str] = None):
-    """API эндпоинт для получения списка задач."""
-    tasks = task_storage.list_tasks()
-    if status:
-        tasks = [t for t in tasks if t.status.value == status]
-    
+def list_tasks_api(
+    response: Response,
+    status: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    after: Optional[str] = None,
+):
+    """
+    API эндпоинт для получения списка задач (от новых к старым).
+
+    after — курсор (id последней задачи предыдущей страницы),
+    следующий курсор возвращается в заголовке X-Next-Cursor.
+    """
+    tasks, next_cursor = load_tasks_page(status, limit, after)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+
     return [
         TaskResponse(
             id=t.id,
@@ -202,12 +290,62 @@ def list_tasks_api(status: Optional[str] = None):
         for t in tasks
     ]
 
+@app.get("/runs")
+def list_runs_api(
+    response: Response,
+    limit: int = Query(20, ge=1, le=200),
+    after: Optional[str] = None,
+    reverse: bool = True,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    content_type: Optional[str] = None,
+    platform: Optional[str] = None,
+    min_usefulness: Optional[float] = None,
+):
+    """
+    API эндпоинт для постраничного просмотра истории прогонов.
+
+    after — курсор (run_id последнего прогона предыдущей страницы),
+    следующий курсор возвращается в заголовке X-Next-Cursor.
+    """
+    if after is not None:
+        try:
+            cursor = datetime.fromisoformat(after)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        if reverse:
+            until = min(until, cursor) if until else cursor
+        else:
+            since = max(since, cursor) if since else cursor
+
+    runs = run_storage.iter_runs(
+        reverse=reverse,
+        since=since,
+        until=until,
+        content_type=content_type,
+        platform=platform,
+        min_usefulness=min_usefulness,
+    )
+    if after is not None:
+        runs = (r for r in runs if r.get("created_at") != after)
+
+    page = list(islice(runs, limit))
+    if len(page) == limit:
+        response.headers["X-Next-Cursor"] = page[-1]["created_at"]
+    return page
+
 @app.get("/runs/latest")
 def get_latest_run_api():
     """API эндпоинт для получения JSON последнего прогона."""
-    runs = run_storage.load_runs()
-    if not runs:
+    last_run = run_storage.load_last_run()
+    if last_run is None:
         raise HTTPException(status_code=404, detail="No runs found")
-    
-    last_run = runs[-1]
     return last_run
+
+@app.get("/runs/{run_id}")
+def get_run_api(run_id: str):
+    """API эндпоинт для получения JSON прогона по его id (run_id задачи)."""
+    run = run_storage.get_run(run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    return run
@@ -1,8 +1,9 @@
 # src/api/utils.py
 from __future__ import annotations
 
-from src.models.analyzed_content import AnalyzedContent, ContentType
+from src.models.analyzed_content import AnalyzedContent
 from src.models.carousel import CarouselSpec, Slide, SlideType
+from src.storage.serialization import analyzed_from_dict
 
 
 def reconstruct_analyzed_and_carousel(run_dict: dict) -> tuple[AnalyzedContent, CarouselSpec]:
@@ -12,17 +13,7 @@ def reconstruct_analyzed_and_carousel(run_dict: dict) -> tuple[AnalyzedContent,
     analyzed_dict = run_dict["analyzed"]
     carousel_dict = run_dict["carousel"]
 
-    analyzed = AnalyzedContent(
-        reference_url=analyzed_dict["reference_url"],
-        title=analyzed_dict["title"],
-        summary=analyzed_dict["summary"],
-        key_points=analyzed_dict["key_points"],
-        content_type=ContentType(analyzed_dict["content_type"]),
-        target_audience_score=analyzed_dict["target_audience_score"],
-        usefulness_score=analyzed_dict["usefulness_score"],
-        suggested_carousel_angle=analyzed_dict["suggested_carousel_angle"],
-        raw_llm_output=analyzed_dict.get("raw_llm_output"),
-    )
+    analyzed = analyzed_from_dict(analyzed_dict)
 
     slides: list[Slide] = []
     for s in carousel_dict["slides"]:
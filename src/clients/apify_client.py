@@ -1,12 +1,16 @@
 # src/clients/apify_client.py
 from __future__ import annotations
 
+import asyncio
 import json
+import random
 import time
-from typing import Any, Dict, List, Optional
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence
 
 import httpx
 
+from src.clients import http_pool
 from src.config.settings import Settings
 
 
@@ -15,13 +19,102 @@ class ApifyClientError(Exception):
     pass
 
 
-class ApifyClient:
-    """HTTP-клиент для работы с Apify API v2."""
+# Apify держит long-poll не дольше минуты
+MAX_WAIT_FOR_FINISH_SEC = 60
+TERMINAL_FAILED_STATUSES = ("FAILED", "ABORTED", "TIMED-OUT")
+# Сколько элементов датасета забирать за один запрос
+DATASET_PAGE_SIZE = 250
+
+
+@dataclass
+class RunWaitStats:
+    """Сколько ждали запуск актора и сколько запросов к API на это ушло."""
+
+    run_id: str = ""
+    status: str = ""
+    wait_sec: float = 0.0
+    requests: int = 0
+    long_poll: bool = True
+
+    def report(self) -> str:
+        mode = "long-poll" if self.long_poll else "backoff"
+        return f"Apify run {self.run_id}: {self.status} after {self.wait_sec:.1f}s, {self.requests} request(s) ({mode})"
+
+
+class _RunWaiter:
+    """
+    Логика ожидания запуска без ввода-вывода — общая для синхронного
+    и асинхронного клиента: сначала long-poll (waitForFinish), при его
+    отсутствии — опрос с экспоненциальной паузой и случайным разбросом.
+    """
+
+    def __init__(
+        self,
+        run_id: str,
+        timeout_sec: float,
+        polling_interval: float,
+        max_polling_interval: float,
+        stats: Optional[RunWaitStats],
+    ) -> None:
+        self.stats = stats if stats is not None else RunWaitStats()
+        self.stats.run_id = run_id
+        self._run_id = run_id
+        self._timeout_sec = timeout_sec
+        self._interval = polling_interval
+        self._max_interval = max_polling_interval
+        self._start = time.monotonic()
+        self._requested_at = self._start
+        self._wait = 0
+
+    def _remaining(self) -> float:
+        return self._timeout_sec - (time.monotonic() - self._start)
+
+    def next_wait_for_finish(self) -> Optional[int]:
+        """Параметр waitForFinish для следующего запроса (None — без long-poll)."""
+        remaining = self._remaining()
+        if remaining <= 0:
+            self.stats.status = "WAIT-TIMEOUT"
+            raise ApifyClientError(f"Превышено время ожидания завершения запуска {self._run_id}")
+        self._wait = min(MAX_WAIT_FOR_FINISH_SEC, max(1, int(remaining))) if self.stats.long_poll else 0
+        self._requested_at = time.monotonic()
+        return self._wait or None
+
+    def observe(self, run: Dict[str, Any]) -> Optional[float]:
+        """
+        Обрабатывает ответ get_run. Возвращает None, если запуск завершился
+        успешно, иначе паузу перед следующим запросом (0 — сразу).
+        """
+        self.stats.requests += 1
+        status = run["status"]
+        self.stats.status = status
+        if status == "SUCCEEDED":
+            return None
+        if status in TERMINAL_FAILED_STATUSES:
+            raise ApifyClientError(f"Запуск {self._run_id} завершился с ошибкой: {status}")
+
+        if self.stats.long_poll:
+            # Сервер отпустил запрос заметно раньше срока и запуск не закончен —
+            # long-poll не поддерживается, дальше опрашиваем сами
+            if self._wait and time.monotonic() - self._requested_at < self._wait / 2:
+                self.stats.long_poll = False
+            else:
+                return 0.0
+
+        delay = max(0.0, min(self._interval * random.uniform(0.5, 1.0), self._remaining()))
+        self._interval = min(self._interval * 2, self._max_interval)
+        return delay
+
+    def finish(self) -> None:
+        self.stats.wait_sec = time.monotonic() - self._start
+        print(self.stats.report())
+
+
+class _ApifyBase:
+    """Общее для синхронного и асинхронного клиента: адреса, токен, разбор ответов."""
 
     def __init__(self, settings: Settings, *, timeout: float = 60.0) -> None:
         self._settings = settings
         self._timeout = timeout
-        self._client = httpx.Client(timeout=timeout)
 
     @property
     def token(self) -> str:
@@ -31,51 +124,223 @@ class ApifyClient:
     def base_url(self) -> str:
         return self._settings.apify.base_url
 
+    def _start_actor_request(self, actor_id: str) -> tuple:
+        return f"{self.base_url}/acts/{actor_id}/runs", {"token": self.token}, self._timeout
+
+    def _get_run_request(self, run_id: str, wait_for_finish: Optional[int]) -> tuple:
+        params: Dict[str, Any] = {"token": self.token}
+        timeout = self._timeout
+        if wait_for_finish:
+            params["waitForFinish"] = wait_for_finish
+            timeout = self._timeout + wait_for_finish
+        return f"{self.base_url}/actor-runs/{run_id}", params, timeout
+
+    def _dataset_items_request(
+        self,
+        dataset_id: str,
+        offset: int,
+        limit: int,
+        fields: Optional[Sequence[str]],
+    ) -> tuple:
+        params: Dict[str, Any] = {"token": self.token, "offset": offset, "limit": limit}
+        if fields:
+            # Проекция на стороне Apify: лишние поля элемента не передаются по сети
+            params["fields"] = ",".join(fields)
+        return f"{self.base_url}/datasets/{dataset_id}/items", params, self._timeout
+
+    @staticmethod
+    def _parse_data(resp: httpx.Response) -> Dict[str, Any]:
+        resp.raise_for_status()
+        return resp.json()["data"]
+
+    @staticmethod
+    def _parse_items(resp: httpx.Response) -> List[Dict[str, Any]]:
+        resp.raise_for_status()
+        data = resp.json()
+        return data if isinstance(data, list) else []
+
+
+class ApifyClient(_ApifyBase):
+    """HTTP-клиент для работы с Apify API v2."""
+
+    def __init__(self, settings: Settings, *, timeout: float = 60.0) -> None:
+        super().__init__(settings, timeout=timeout)
+        self._client = http_pool.get_client(self.base_url)
+
+    def close(self) -> None:
+        """Пул соединений общий (http_pool) и закрывается при остановке приложения."""
+
     def start_actor(self, actor_id: str, input_payload: Dict[str, Any]) -> Dict[str, Any]:
         """Запускает актор и возвращает данные о запуске (Run object)."""
-        url = f"{self.base_url}/acts/{actor_id}/runs"
-        params = {"token": self.token}
+        url, params, timeout = self._start_actor_request(actor_id)
         try:
-            resp = self._client.post(url, params=params, json=input_payload)
-            resp.raise_for_status()
-            return resp.json()["data"]
+            return self._parse_data(self._client.post(url, params=params, json=input_payload, timeout=timeout))
         except Exception as e:
             raise ApifyClientError(f"Не удалось запустить актор {actor_id}: {e}")
 
-    def get_run(self, run_id: str) -> Dict[str, Any]:
-        """Получает актуальную информацию о запуске."""
-        url = f"{self.base_url}/actor-runs/{run_id}"
-        params = {"token": self.token}
+    def get_run(self, run_id: str, wait_for_finish: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Получает актуальную информацию о запуске.
+
+        wait_for_finish — long-poll на стороне Apify: сервер держит запрос
+        до завершения запуска, но не дольше указанного числа секунд (максимум 60).
+        """
+        url, params, timeout = self._get_run_request(run_id, wait_for_finish)
         try:
-            resp = self._client.get(url, params=params)
-            resp.raise_for_status()
-            return resp.json()["data"]
+            return self._parse_data(self._client.get(url, params=params, timeout=timeout))
         except Exception as e:
             raise ApifyClientError(f"Не удалось получить статус запуска {run_id}: {e}")
 
-    def get_dataset_items(self, dataset_id: str) -> List[Dict[str, Any]]:
+    def iter_dataset_items(
+        self,
+        dataset_id: str,
+        *,
+        fields: Optional[Sequence[str]] = None,
+        page_size: int = DATASET_PAGE_SIZE,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Отдаёт элементы датасета постранично (offset/limit): в памяти
+        одновременно только одна страница. fields — какие ключи запросить
+        (None — элементы целиком).
+        """
+        offset = 0
+        while True:
+            url, params, timeout = self._dataset_items_request(dataset_id, offset, page_size, fields)
+            try:
+                page = self._parse_items(self._client.get(url, params=params, timeout=timeout))
+            except Exception as e:
+                raise ApifyClientError(f"Не удалось получить данные из датасета {dataset_id}: {e}")
+            yield from page
+            if len(page) < page_size:
+                return
+            offset += len(page)
+
+    def get_dataset_items(
+        self,
+        dataset_id: str,
+        *,
+        fields: Optional[Sequence[str]] = None,
+    ) -> List[Dict[str, Any]]:
         """Получает элементы из датасета."""
-        url = f"{self.base_url}/datasets/{dataset_id}/items"
-        params = {"token": self.token}
+        return list(self.iter_dataset_items(dataset_id, fields=fields))
+
+    def wait_for_run(
+        self,
+        run_id: str,
+        timeout_sec: int = 300,
+        polling_interval: float = 1.0,
+        *,
+        max_polling_interval: float = 15.0,
+        stats: Optional[RunWaitStats] = None,
+    ) -> Dict[str, Any]:
+        """
+        Ожидает завершения запуска.
+
+        Сначала использует long-poll (waitForFinish): ответ приходит сразу
+        после завершения запуска, без лишних запросов. Если сервер вернул
+        незавершённый запуск, не подержав запрос, переходит на опрос с
+        экспоненциальной паузой от polling_interval до max_polling_interval
+        со случайным разбросом.
+
+        stats — если передан, в него пишется время ожидания и число запросов.
+        """
+        waiter = _RunWaiter(run_id, timeout_sec, polling_interval, max_polling_interval, stats)
         try:
-            resp = self._client.get(url, params=params)
-            resp.raise_for_status()
-            data = resp.json()
-            return data if isinstance(data, list) else []
+            while True:
+                run = self.get_run(run_id, wait_for_finish=waiter.next_wait_for_finish())
+                delay = waiter.observe(run)
+                if delay is None:
+                    return run
+                if delay:
+                    time.sleep(delay)
+        finally:
+            waiter.finish()
+
+
+class AsyncApifyClient(_ApifyBase):
+    """
+    Асинхронный вариант ApifyClient на httpx.AsyncClient с тем же набором методов.
+
+    Ожидание запуска — long-poll и asyncio.sleep, поэтому сотни запусков
+    в полёте живут в одном процессе без потока на каждый. Соединения —
+    из общего пула текущего event loop (http_pool), его размер задаётся
+    HTTP_ASYNC_MAX_CONNECTIONS_PER_HOST (long-poll держит соединение на запуск).
+    Создавать клиент нужно внутри работающего event loop.
+    """
+
+    def __init__(self, settings: Settings, *, timeout: float = 60.0) -> None:
+        super().__init__(settings, timeout=timeout)
+        self._client = http_pool.get_async_client(self.base_url)
+
+    async def aclose(self) -> None:
+        """Пул соединений общий (http_pool.aclose_all) — здесь закрывать нечего."""
+
+    async def __aenter__(self) -> "AsyncApifyClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def start_actor(self, actor_id: str, input_payload: Dict[str, Any]) -> Dict[str, Any]:
+        url, params, timeout = self._start_actor_request(actor_id)
+        try:
+            return self._parse_data(await self._client.post(url, params=params, json=input_payload, timeout=timeout))
+        except Exception as e:
+            raise ApifyClientError(f"Не удалось запустить актор {actor_id}: {e}")
+
+    async def get_run(self, run_id: str, wait_for_finish: Optional[int] = None) -> Dict[str, Any]:
+        url, params, timeout = self._get_run_request(run_id, wait_for_finish)
+        try:
+            return self._parse_data(await self._client.get(url, params=params, timeout=timeout))
         except Exception as e:
-            raise ApifyClientError(f"Не удалось получить данные из датасета {dataset_id}: {e}")
-
-    def wait_for_run(self, run_id: str, timeout_sec: int = 300, polling_interval: int = 10) -> Dict[str, Any]:
-        """Ожидает завершения запуска."""
-        start_time = time.time()
-        while time.time() - start_time < timeout_sec:
-            run = self.get_run(run_id)
-            status = run["status"]
-            if status == "SUCCEEDED":
-                return run
-            if status in ["FAILED", "ABORTED", "TIMED-OUT"]:
-                raise ApifyClientError(f"Запуск {run_id} завершился с ошибкой: {status}")
-            
-            time.sleep(polling_interval)
-        
-        raise ApifyClientError(f"Превышено время ожидания завершения запуска {run_id}")
+            raise ApifyClientError(f"Не удалось получить статус запуска {run_id}: {e}")
+
+    async def iter_dataset_items(
+        self,
+        dataset_id: str,
+        *,
+        fields: Optional[Sequence[str]] = None,
+        page_size: int = DATASET_PAGE_SIZE,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        offset = 0
+        while True:
+            url, params, timeout = self._dataset_items_request(dataset_id, offset, page_size, fields)
+            try:
+                page = self._parse_items(await self._client.get(url, params=params, timeout=timeout))
+            except Exception as e:
+                raise ApifyClientError(f"Не удалось получить данные из датасета {dataset_id}: {e}")
+            for item in page:
+                yield item
+            if len(page) < page_size:
+                return
+            offset += len(page)
+
+    async def get_dataset_items(
+        self,
+        dataset_id: str,
+        *,
+        fields: Optional[Sequence[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        return [item async for item in self.iter_dataset_items(dataset_id, fields=fields)]
+
+    async def wait_for_run(
+        self,
+        run_id: str,
+        timeout_sec: int = 300,
+        polling_interval: float = 1.0,
+        *,
+        max_polling_interval: float = 15.0,
+        stats: Optional[RunWaitStats] = None,
+    ) -> Dict[str, Any]:
+        """То же, что ApifyClient.wait_for_run, но без блокировки event loop."""
+        waiter = _RunWaiter(run_id, timeout_sec, polling_interval, max_polling_interval, stats)
+        try:
+            while True:
+                run = await self.get_run(run_id, wait_for_finish=waiter.next_wait_for_finish())
+                delay = waiter.observe(run)
+                if delay is None:
+                    return run
+                if delay:
+                    await asyncio.sleep(delay)
+        finally:
+            waiter.finish()
@@ -4,10 +4,12 @@ from __future__ import annotations
 import json
 import os
 from dataclasses import dataclass
-from typing import Any, Dict, Optional
+from typing import Any, Dict
 
 import httpx
 
+from src.clients import http_pool
+
 from src.models.blotato_payload import BlotatoCreateVideoPayload
 
 
@@ -36,7 +38,7 @@ class BlotatoClient:
     dry_run: bool = True  # по умолчанию НИЧЕГО не отправляем, только печатаем payload
 
     def __post_init__(self) -> None:
-        self._client = httpx.Client(timeout=self.timeout)
+        self._client = http_pool.get_client(self.base_url)
 
     @classmethod
     def from_env(cls, dry_run: bool = True) -> "BlotatoClient":
@@ -73,7 +75,7 @@ class BlotatoClient:
         }
 
         try:
-            resp = self._client.post(url, headers=headers, json=body)
+            resp = self._client.post(url, headers=headers, json=body, timeout=self.timeout)
             resp.raise_for_status()
         except httpx.HTTPError as exc:
             raise BlotatoClientError(f"Blotato HTTP error: {exc}") from exc
@@ -0,0 +1,115 @@
+# src/clients/http_pool.py
+"""
+Общий на процесс реестр HTTP-клиентов: по одному httpx.Client на хост.
+
+Клиенты Apify, LLM и Blotato берут соединения отсюда, поэтому keep-alive
+и TLS-сессия к хосту переиспользуются между вызовами и экземплярами
+клиентов. Закрывается всё одним close_all()/aclose_all() при остановке
+приложения (FastAPI lifespan, воркер).
+"""
+from __future__ import annotations
+
+import asyncio
+import threading
+import weakref
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import httpx
+
+from src.config.settings import HttpSettings
+
+
+_lock = threading.Lock()
+_config: Optional[HttpSettings] = None
+_clients: Dict[str, httpx.Client] = {}
+# Асинхронный клиент привязан к event loop, поэтому реестр — на каждый loop свой
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, httpx.AsyncClient]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def configure(config: Optional[HttpSettings] = None) -> HttpSettings:
+    """
+    Задаёт лимиты пула (по умолчанию — из env). Действует на клиенты,
+    созданные после вызова, поэтому вызывается при старте приложения.
+    """
+    global _config
+    with _lock:
+        _config = config or HttpSettings.from_env()
+        return _config
+
+
+def _get_config() -> HttpSettings:
+    global _config
+    if _config is None:
+        _config = HttpSettings.from_env()
+    return _config
+
+
+def _host_key(base_url: str) -> str:
+    parsed = urlparse(base_url)
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+
+def _client_kwargs(cfg: HttpSettings, max_connections: int) -> dict:
+    http2 = cfg.http2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            print("Warning: HTTP2=1, but package 'h2' is not installed (pip install httpx[http2]); using HTTP/1.1")
+            http2 = False
+    return {
+        "timeout": cfg.timeout_sec,
+        "http2": http2,
+        "limits": httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=min(cfg.max_keepalive_per_host, max_connections),
+            keepalive_expiry=cfg.keepalive_expiry_sec,
+        ),
+    }
+
+
+def get_client(base_url: str) -> httpx.Client:
+    """Общий синхронный клиент для хоста из base_url."""
+    key = _host_key(base_url)
+    with _lock:
+        client = _clients.get(key)
+        if client is None or client.is_closed:
+            cfg = _get_config()
+            client = httpx.Client(**_client_kwargs(cfg, cfg.max_connections_per_host))
+            _clients[key] = client
+        return client
+
+
+def get_async_client(base_url: str) -> httpx.AsyncClient:
+    """Общий асинхронный клиент для хоста в текущем event loop."""
+    loop = asyncio.get_running_loop()
+    key = _host_key(base_url)
+    with _lock:
+        per_loop = _async_clients.setdefault(loop, {})
+        client = per_loop.get(key)
+        if client is None or client.is_closed:
+            cfg = _get_config()
+            client = httpx.AsyncClient(**_client_kwargs(cfg, cfg.async_max_connections_per_host))
+            per_loop[key] = client
+        return client
+
+
+def close_all() -> None:
+    """Закрывает все синхронные клиенты реестра."""
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.close()
+
+
+async def aclose_all() -> None:
+    """Закрывает асинхронные клиенты текущего event loop."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = list(_async_clients.pop(loop, {}).values())
+    for client in clients:
+        await client.aclose()
@@ -0,0 +1,142 @@
+# src/clients/json_stream.py
+from __future__ import annotations
+
+import json
+from typing import Any, Callable, List, Optional
+
+
+FieldCallback = Callable[[str, Any], None]
+ItemCallback = Callable[[str, int, Any], None]
+
+
+class JsonStreamParser:
+    """
+    Инкрементальный разбор JSON-объекта, который приходит кусками (стриминг LLM).
+
+    Полный JSON-парсер здесь не нужен: сканер следит только за строками
+    и вложенностью скобок и, как только закрывается значение верхнего уровня,
+    разбирает его срез json.loads и вызывает on_field(key, value).
+    Элементы массивов верхнего уровня (slides, key_points) отдаются
+    по одному через on_item(key, index, value), не дожидаясь конца массива.
+    """
+
+    def __init__(self, on_field: Optional[FieldCallback] = None, on_item: Optional[ItemCallback] = None) -> None:
+        self.on_field = on_field
+        self.on_item = on_item
+        self._text = ""
+        self._pos = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._done = False
+
+        self._key_start: Optional[int] = None
+        self._key: Optional[str] = None
+        self._value_start: Optional[int] = None
+        self._item_start: Optional[int] = None
+        self._item_index = 0
+
+    @property
+    def done(self) -> bool:
+        """Объект верхнего уровня закрыт."""
+        return self._done
+
+    def feed(self, chunk: str) -> None:
+        if self._done or not chunk:
+            return
+        self._text += chunk
+        text = self._text
+        for i in range(self._pos, len(text)):
+            self._scan(text, i, text[i])
+            if self._done:
+                break
+        self._pos = len(text)
+
+    def _scan(self, text: str, i: int, ch: str) -> None:
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif ch == "\\":
+                self._escape = True
+            elif ch == '"':
+                self._in_string = False
+            return
+        if ch.isspace():
+            return
+
+        depth = len(self._stack)
+        if depth == 0:
+            # Всё до открывающей скобки (```json и т.п.) пропускаем
+            if ch == "{":
+                self._stack.append(ch)
+            return
+
+        if depth == 1 and self._key is not None and self._value_start is None:
+            self._value_start = i
+        if self._in_top_array() and self._item_start is None and ch not in ",]":
+            self._item_start = i
+
+        if ch == '"':
+            self._in_string = True
+            if depth == 1 and self._key is None:
+                self._key_start = i
+        elif ch in "{[":
+            self._stack.append(ch)
+        elif ch in "}]":
+            if ch == "]" and self._in_top_array():
+                self._finish_item(text, i)
+            self._stack.pop()
+            if not self._stack:
+                self._finish_field(text, i)
+                self._done = True
+        elif ch == ",":
+            if depth == 1:
+                self._finish_field(text, i)
+            elif self._in_top_array():
+                self._finish_item(text, i)
+        elif ch == ":" and depth == 1 and self._key_start is not None:
+            self._key = self._loads(text[self._key_start:i])
+            self._key_start = None
+
+    def _in_top_array(self) -> bool:
+        return len(self._stack) == 2 and self._stack[1] == "["
+
+    def _finish_field(self, text: str, end: int) -> None:
+        if self._key is not None and self._value_start is not None and self.on_field is not None:
+            value = self._loads(text[self._value_start:end])
+            if value is not _INVALID:
+                self.on_field(self._key, value)
+        self._key = None
+        self._value_start = None
+        self._item_start = None
+        self._item_index = 0
+
+    def _finish_item(self, text: str, end: int) -> None:
+        if self._item_start is None:
+            return
+        if self._key is not None and self.on_item is not None:
+            value = self._loads(text[self._item_start:end])
+            if value is not _INVALID:
+                self.on_item(self._key, self._item_index, value)
+        self._item_start = None
+        self._item_index += 1
+
+    @staticmethod
+    def _loads(raw: str) -> Any:
+        try:
+            return json.loads(raw)
+        except json.JSONDecodeError:
+            return _INVALID
+
+
+def replay(parsed: dict, on_field: Optional[FieldCallback] = None, on_item: Optional[ItemCallback] = None) -> None:
+    """Вызывает колбэки для уже готового объекта (ответ из кэша) в том же порядке, что и стриминг."""
+    for key, value in parsed.items():
+        if on_item is not None and isinstance(value, list):
+            for idx, item in enumerate(value):
+                on_item(key, idx, item)
+        if on_field is not None:
+            on_field(key, value)
+
+
+_INVALID = object()
@@ -0,0 +1,210 @@
+# src/clients/llm_batch_client.py
+from __future__ import annotations
+
+import json
+import tempfile
+import time
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple, Union
+
+import httpx
+
+from src.clients import http_pool
+from src.clients.llm_client import LlmClientError, LlmResponse, _LlmClientBase
+from src.config.settings import Settings
+from src.storage.file_cache import FileCache
+
+
+BatchResult = Union[LlmResponse, LlmClientError]
+# Парсер пайплайна для ответа запроса custom_id: исключение — ответ отвергнут и не кэшируется
+BatchValidator = Callable[[str, Dict[str, Any]], Any]
+
+
+class LlmBatchClient(_LlmClientBase):
+    """
+    Офлайн-режим для пачек запросов через OpenAI-совместимый Batch API.
+
+    Все запросы пишутся в один JSONL-файл (по строке на запрос с custom_id),
+    файл загружается в /files, по нему создаётся /batches, дальше клиент
+    опрашивает статус и сопоставляет ответы с запросами по custom_id.
+    Batch API дешевле синхронных вызовов и не держит воркер на каждый запрос,
+    зато результат приходит в пределах completion_window, а не сразу.
+
+    Тело запроса то же, что у LlmClient, поэтому ответы попадают в тот же кэш,
+    а уже закэшированные запросы в пачку не уходят.
+    """
+
+    TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+    def __init__(
+        self,
+        api_key: str | None = None,
+        base_url: str | None = None,
+        model: str = "gpt-4o-mini",
+        timeout: float = 60.0,
+        cache: Optional[FileCache] = None,
+        bypass_cache: bool = False,
+        *,
+        completion_window: str = "24h",
+        poll_interval: float = 30.0,
+        max_wait_sec: float = 24 * 3600,
+    ) -> None:
+        super().__init__(api_key, base_url, model, timeout, cache, bypass_cache)
+        self.completion_window = completion_window
+        self.poll_interval = poll_interval
+        self.max_wait_sec = max_wait_sec
+        self._client = http_pool.get_client(self.base_url)
+
+    @classmethod
+    def from_settings(cls, settings: Settings, **kwargs: Any) -> "LlmBatchClient":
+        """Клиент с кэшем (LLM_CACHE_*) и опросом пачки по LLM_BATCH_POLL_INTERVAL / LLM_BATCH_MAX_WAIT_HOURS."""
+        cfg = settings.llm
+        kwargs.setdefault("poll_interval", cfg.batch_poll_interval_sec)
+        kwargs.setdefault("max_wait_sec", cfg.batch_max_wait_hours * 3600)
+        return cls(**cls._cache_kwargs(settings, kwargs))
+
+    @property
+    def _headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.api_key}"}
+
+    def complete_json_batch(
+        self,
+        requests: Iterable[Tuple[str, str, str]],
+        *,
+        validate: Optional[BatchValidator] = None,
+    ) -> Dict[str, BatchResult]:
+        """
+        Выполняет пачку запросов (custom_id, system_prompt, user_prompt).
+
+        Возвращает custom_id -> LlmResponse или LlmClientError для запросов,
+        которые провайдер не выполнил или чей ответ отверг validate
+        (ошибка одного запроса не валит пачку).
+        """
+        results: Dict[str, BatchResult] = {}
+        pending: Dict[str, Tuple[Dict[str, Any], Optional[str]]] = {}
+        for custom_id, system_prompt, user_prompt in requests:
+            _, _, payload = self._request(system_prompt, user_prompt)
+            cache_key, hit = self._lookup(payload, None, _bind(validate, custom_id))
+            if hit is not None:
+                results[custom_id] = hit
+            else:
+                pending[custom_id] = (payload, cache_key)
+
+        if results:
+            print(f"LLM batch: {len(results)} request(s) served from cache")
+        if not pending:
+            return results
+
+        input_file_id = self._upload_requests(pending)
+        batch = self._create_batch(input_file_id)
+        print(f"LLM batch {batch['id']}: submitted {len(pending)} request(s)")
+        batch = self._wait_for_batch(batch["id"])
+
+        if batch.get("output_file_id"):
+            for line in self._download_lines(batch["output_file_id"]):
+                self._collect_line(line, pending, results, validate)
+        if batch.get("error_file_id"):
+            for line in self._download_lines(batch["error_file_id"]):
+                self._collect_line(line, pending, results, validate)
+
+        for custom_id in pending:
+            results.setdefault(
+                custom_id,
+                LlmClientError(f"No result for {custom_id} in batch {batch['id']} (status: {batch.get('status')})"),
+            )
+        return results
+
+    def _upload_requests(self, pending: Dict[str, Tuple[Dict[str, Any], Optional[str]]]) -> str:
+        """Пишет запросы во временный JSONL и загружает его в /files."""
+        with tempfile.TemporaryFile() as f:
+            for custom_id, (payload, _) in pending.items():
+                line = {
+                    "custom_id": custom_id,
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": payload,
+                }
+                f.write((json.dumps(line, ensure_ascii=False) + "\n").encode("utf-8"))
+            f.seek(0)
+            resp = self._call(
+                "POST",
+                "/files",
+                data={"purpose": "batch"},
+                files={"file": ("batch.jsonl", f, "application/jsonl")},
+            )
+        return resp.json()["id"]
+
+    def _create_batch(self, input_file_id: str) -> Dict[str, Any]:
+        resp = self._call(
+            "POST",
+            "/batches",
+            json={
+                "input_file_id": input_file_id,
+                "endpoint": "/v1/chat/completions",
+                "completion_window": self.completion_window,
+            },
+        )
+        return resp.json()
+
+    def _wait_for_batch(self, batch_id: str) -> Dict[str, Any]:
+        start = time.monotonic()
+        while True:
+            batch = self._call("GET", f"/batches/{batch_id}").json()
+            status = batch.get("status")
+            if status in self.TERMINAL_STATUSES:
+                counts = batch.get("request_counts") or {}
+                print(
+                    f"LLM batch {batch_id}: {status} after {time.monotonic() - start:.0f}s "
+                    f"(completed {counts.get('completed', '?')}, failed {counts.get('failed', '?')})"
+                )
+                return batch
+            if time.monotonic() - start > self.max_wait_sec:
+                raise LlmClientError(f"LLM batch {batch_id} is still {status} after {self.max_wait_sec:.0f}s")
+            time.sleep(self.poll_interval)
+
+    def _download_lines(self, file_id: str) -> Iterable[str]:
+        resp = self._call("GET", f"/files/{file_id}/content")
+        return (line for line in resp.text.splitlines() if line.strip())
+
+    def _collect_line(
+        self,
+        line: str,
+        pending: Dict[str, Tuple[Dict[str, Any], Optional[str]]],
+        results: Dict[str, BatchResult],
+        validate: Optional[BatchValidator] = None,
+    ) -> None:
+        try:
+            obj = json.loads(line)
+        except json.JSONDecodeError:
+            print(f"Warning: Failed to parse batch output line: {line[:200]}")
+            return
+        custom_id = obj.get("custom_id")
+        if custom_id not in pending:
+            return
+
+        response = obj.get("response") or {}
+        if obj.get("error") or response.get("status_code", 200) >= 400:
+            error = obj.get("error") or response.get("body")
+            results[custom_id] = LlmClientError(f"LLM batch request {custom_id} failed: {error}")
+            return
+        try:
+            results[custom_id] = self._finish(
+                response.get("body") or {}, pending[custom_id][1], _bind(validate, custom_id)
+            )
+        except LlmClientError as exc:
+            results[custom_id] = exc
+
+    def _call(self, method: str, path: str, **kwargs: Any) -> httpx.Response:
+        try:
+            resp = self._client.request(
+                method, f"{self.base_url}{path}", headers=self._headers, timeout=self.timeout, **kwargs
+            )
+            resp.raise_for_status()
+        except httpx.HTTPError as exc:
+            raise LlmClientError(f"LLM batch HTTP error: {exc}") from exc
+        return resp
+
+
+def _bind(validate: Optional[BatchValidator], custom_id: str) -> Optional[Callable[[Dict[str, Any]], Any]]:
+    if validate is None:
+        return None
+    return lambda parsed: validate(custom_id, parsed)
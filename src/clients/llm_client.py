@@ -1,29 +1,46 @@
 # src/clients/llm_client.py
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import json
 import os
+import random
+import time
 from dataclasses import dataclass
-from typing import Any, Dict
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Optional
 
 import httpx
 
+from src.clients import http_pool
+from src.clients.json_stream import FieldCallback, ItemCallback, JsonStreamParser, replay
+from src.config.settings import Settings
+from src.storage.file_cache import FileCache
+
 
 @dataclass
 class LlmResponse:
     raw: Dict[str, Any]
     parsed: Dict[str, Any]
+    cached: bool = False
 
 
 class LlmClientError(Exception):
     ...
 
 
-class LlmClient:
-    """
-    Минимальный клиент для вызова LLM, возвращающего строго JSON.
+class LlmResponseInvalid(LlmClientError):
+    """JSON разобрался, но парсер пайплайна отверг ответ (пустые поля, нет оценок)."""
 
-    По умолчанию — OpenAI Chat Completions API совместимые эндпоинты.
+
+# Проверка разобранного JSON парсером пайплайна: исключение — ответ отвергнут
+Validator = Callable[[Dict[str, Any]], Any]
+
+
+class _LlmClientBase:
+    """
+    Общее для синхронного и асинхронного клиента: тело запроса, кэш, разбор ответа.
     """
 
     def __init__(
@@ -32,26 +49,46 @@ class LlmClient:
         base_url: str | None = None,
         model: str = "gpt-4o-mini",
         timeout: float = 60.0,
+        cache: Optional[FileCache] = None,
+        bypass_cache: bool = False,
     ) -> None:
         self.api_key = api_key or os.getenv("OPENAI_API_KEY")
         if not self.api_key:
-            raise RuntimeError("OPENAI_API_KEY env var is required for LlmClient")
+            raise RuntimeError(f"OPENAI_API_KEY env var is required for {type(self).__name__}")
 
         self.base_url = base_url or "https://api.openai.com/v1"
         self.model = model
-        self._client = httpx.Client(timeout=timeout)
+        self.timeout = timeout
+        self.cache = cache
+        self.bypass_cache = bypass_cache
 
-    def complete_json(self, system_prompt: str, user_prompt: str) -> LlmResponse:
-        """
-        Отправляет запрос к модели и ожидает, что она вернёт валидный JSON в message.content.
-        """
+    @staticmethod
+    def _cache_kwargs(settings: Settings, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        cfg = settings.cache
+        if cfg.llm_ttl_hours > 0:
+            kwargs.setdefault(
+                "cache",
+                FileCache(cfg.dir / "llm", ttl_sec=cfg.llm_ttl_hours * 3600, max_entries=cfg.llm_max_entries),
+            )
+        kwargs.setdefault("bypass_cache", cfg.llm_bypass)
+        return kwargs
+
+    def cache_stats(self) -> Optional[dict]:
+        return self.cache.stats() if self.cache is not None else None
+
+    def _cache_key(self, payload: Dict[str, Any]) -> str:
+        # base_url в ключе: одна и та же модель у разных провайдеров/прокси отвечает по-разному
+        blob = json.dumps({"base_url": self.base_url, "payload": payload}, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def _request(self, system_prompt: str, user_prompt: str, model: Optional[str] = None) -> tuple:
         url = f"{self.base_url}/chat/completions"
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
         }
         payload = {
-            "model": self.model,
+            "model": model or self.model,
             "messages": [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt},
@@ -59,14 +96,57 @@ class LlmClient:
             "temperature": 0.3,
             "response_format": {"type": "json_object"}
         }
+        return url, headers, payload
 
+    def _lookup(
+        self,
+        payload: Dict[str, Any],
+        bypass_cache: Optional[bool],
+        validate: Optional[Validator] = None,
+    ) -> tuple:
+        """
+        Ключ кэша и закэшированный ответ (None — промах или кэш не читаем).
+        Ответ, который validate больше не принимает (записан до проверки), считается промахом.
+        """
+        if self.cache is None:
+            return None, None
+        cache_key = self._cache_key(payload)
+        bypass = self.bypass_cache if bypass_cache is None else bypass_cache
+        if bypass:
+            return cache_key, None
+        hit = self.cache.get(cache_key)
+        if hit is None:
+            return cache_key, None
         try:
-            resp = self._client.post(url, headers=headers, json=payload)
-            resp.raise_for_status()
-        except httpx.HTTPError as exc:
-            raise LlmClientError(f"LLM HTTP error: {exc}") from exc
+            self._validate(hit["parsed"], validate)
+        except LlmClientError as exc:
+            print(f"LLM cache: dropping rejected response ({exc})")
+            self.cache.delete(cache_key)
+            return cache_key, None
+        return cache_key, LlmResponse(raw=hit["raw"], parsed=hit["parsed"], cached=True)
+
+    @staticmethod
+    def _validate(parsed: Dict[str, Any], validate: Optional[Validator]) -> None:
+        if validate is None:
+            return
+        try:
+            validate(parsed)
+        except LlmClientError:
+            raise
+        except Exception as exc:
+            raise LlmResponseInvalid(f"LLM response rejected by parser: {exc}") from exc
 
-        data = resp.json()
+    def _finish(
+        self,
+        data: Dict[str, Any],
+        cache_key: Optional[str],
+        validate: Optional[Validator] = None,
+    ) -> LlmResponse:
+        """
+        Разбирает JSON из ответа и кладёт его в кэш — только если его принял
+        validate: иначе неудачная задача на каждом повторе получала бы
+        из кэша тот же негодный ответ до конца TTL.
+        """
         try:
             content = data["choices"][0]["message"]["content"]
         except (KeyError, IndexError) as exc:
@@ -88,4 +168,353 @@ class LlmClient:
         except json.JSONDecodeError as exc:
             raise LlmClientError(f"Failed to parse LLM JSON: {content}") from exc
 
+        self._validate(parsed, validate)
+        if cache_key is not None:
+            self.cache.put(cache_key, {"raw": data, "parsed": parsed})
         return LlmResponse(raw=data, parsed=parsed)
+
+
+class LlmClient(_LlmClientBase):
+    """
+    Минимальный клиент для вызова LLM, возвращающего строго JSON.
+
+    По умолчанию — OpenAI Chat Completions API совместимые эндпоинты.
+
+    cache — кэш ответов по sha256 полного запроса (модель, сообщения,
+    temperature, формат): повторный анализ того же видео не тратит токены.
+    bypass_cache=True — кэш не читается, но свежий ответ в него записывается.
+    validate — парсер пайплайна: ответ, который он отверг, не кэшируется.
+    """
+
+    def __init__(
+        self,
+        api_key: str | None = None,
+        base_url: str | None = None,
+        model: str = "gpt-4o-mini",
+        timeout: float = 60.0,
+        cache: Optional[FileCache] = None,
+        bypass_cache: bool = False,
+    ) -> None:
+        super().__init__(api_key, base_url, model, timeout, cache, bypass_cache)
+        self._client = http_pool.get_client(self.base_url)
+
+    @classmethod
+    def from_settings(cls, settings: Settings, **kwargs: Any) -> "LlmClient":
+        """Клиент с кэшем ответов на диске по настройкам (LLM_CACHE_*)."""
+        return cls(**cls._cache_kwargs(settings, kwargs))
+
+    def close(self) -> None:
+        """Пул соединений общий (http_pool) и закрывается при остановке приложения."""
+
+    def complete_json(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        *,
+        bypass_cache: Optional[bool] = None,
+        model: Optional[str] = None,
+        validate: Optional[Validator] = None,
+    ) -> LlmResponse:
+        """
+        Отправляет запрос к модели и ожидает, что она вернёт валидный JSON в message.content.
+        Одинаковый запрос отдаётся из кэша без обращения к API.
+        model — модель для этого запроса вместо self.model (маршрутизация по стадиям).
+        """
+        url, headers, payload = self._request(system_prompt, user_prompt, model)
+        cache_key, hit = self._lookup(payload, bypass_cache, validate)
+        if hit is not None:
+            return hit
+
+        try:
+            resp = self._client.post(url, headers=headers, json=payload, timeout=self.timeout)
+            resp.raise_for_status()
+        except httpx.HTTPError as exc:
+            raise LlmClientError(f"LLM HTTP error: {exc}") from exc
+
+        return self._finish(resp.json(), cache_key, validate)
+
+    def complete_json_stream(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        *,
+        on_field: Optional[FieldCallback] = None,
+        on_item: Optional[ItemCallback] = None,
+        bypass_cache: Optional[bool] = None,
+        model: Optional[str] = None,
+        validate: Optional[Validator] = None,
+    ) -> LlmResponse:
+        """
+        То же, что complete_json, но ответ читается потоком (SSE, stream=True):
+        поля верхнего уровня отдаются в on_field(key, value), как только закрылись,
+        элементы массивов — в on_item(key, index, value). Так следующий шаг
+        (или UI) получает summary и первые слайды, не дожидаясь конца генерации.
+
+        Кэш общий с complete_json; для ответа из кэша колбэки вызываются сразу.
+        """
+        url, headers, payload = self._request(system_prompt, user_prompt, model)
+        cache_key, hit = self._lookup(payload, bypass_cache, validate)
+        if hit is not None:
+            replay(hit.parsed, on_field, on_item)
+            return hit
+
+        parser = JsonStreamParser(on_field, on_item)
+        parts = []
+        last: Dict[str, Any] = {}
+        finish_reason = None
+        try:
+            with self._client.stream(
+                "POST", url, headers=headers, json={**payload, "stream": True}, timeout=self.timeout
+            ) as resp:
+                resp.raise_for_status()
+                for line in resp.iter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    raw = line[len("data:"):].strip()
+                    if raw == "[DONE]":
+                        break
+                    try:
+                        last = json.loads(raw)
+                    except json.JSONDecodeError:
+                        continue
+                    for choice in last.get("choices") or []:
+                        delta = (choice.get("delta") or {}).get("content")
+                        if delta:
+                            parts.append(delta)
+                            parser.feed(delta)
+                        finish_reason = choice.get("finish_reason") or finish_reason
+        except httpx.HTTPError as exc:
+            raise LlmClientError(f"LLM HTTP error: {exc}") from exc
+
+        # Собираем ответ в формате обычного (не потокового) completion — для _finish и кэша
+        data = {
+            "id": last.get("id"),
+            "model": last.get("model"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(parts)},
+                    "finish_reason": finish_reason,
+                }
+            ],
+        }
+        if last.get("usage"):
+            data["usage"] = last["usage"]
+        return self._finish(data, cache_key, validate)
+
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка числа токенов (~3 символа на токен для русского текста)."""
+    return len(text) // 3 + 1
+
+
+class RateLimiter:
+    """
+    Token bucket сразу на два лимита провайдера: запросы в минуту и токены в минуту.
+
+    acquire(tokens) ждёт, пока в обоих ведрах хватит ёмкости. После ответа
+    settle() поправляет списание по фактическому usage. pause_until() —
+    общая пауза для всех запросов, когда провайдер вернул 429 с Retry-After.
+    """
+
+    def __init__(self, requests_per_minute: Optional[int], tokens_per_minute: Optional[int]) -> None:
+        self.rpm = requests_per_minute
+        self.tpm = tokens_per_minute
+        self._requests = float(requests_per_minute or 0)
+        self._tokens = float(tokens_per_minute or 0)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rpm:
+            self._requests = min(float(self.rpm), self._requests + elapsed * self.rpm / 60.0)
+        if self.tpm:
+            self._tokens = min(float(self.tpm), self._tokens + elapsed * self.tpm / 60.0)
+
+    async def acquire(self, tokens: int) -> None:
+        # Запрос больше всего ведра иначе ждал бы вечно
+        tokens = min(tokens, self.tpm) if self.tpm else tokens
+        while True:
+            async with self._lock:
+                self._refill()
+                wait = self._paused_until - time.monotonic()
+                if wait <= 0:
+                    need_requests = 1 - self._requests if self.rpm else 0.0
+                    need_tokens = tokens - self._tokens if self.tpm else 0.0
+                    wait = max(
+                        need_requests * 60.0 / self.rpm if self.rpm and need_requests > 0 else 0.0,
+                        need_tokens * 60.0 / self.tpm if self.tpm and need_tokens > 0 else 0.0,
+                    )
+                    if wait <= 0:
+                        if self.rpm:
+                            self._requests -= 1
+                        if self.tpm:
+                            self._tokens -= tokens
+                        return
+            await asyncio.sleep(wait)
+
+    def settle(self, estimated: int, actual: int) -> None:
+        """Возвращает в ведро переоценку (или дописывает недооценку) токенов."""
+        if self.tpm:
+            self._tokens = min(float(self.tpm), self._tokens + estimated - actual)
+
+    def pause_until(self, moment: float) -> None:
+        self._paused_until = max(self._paused_until, moment)
+
+
+def retry_after_seconds(resp: httpx.Response) -> Optional[float]:
+    """
+    Сколько ждать по заголовкам ответа: Retry-After (секунды или HTTP-дата)
+    или x-ratelimit-reset-requests / x-ratelimit-reset-tokens ("1s", "6m0s", "20ms").
+    """
+    raw = resp.headers.get("retry-after")
+    if raw:
+        try:
+            return max(0.0, float(raw))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(raw).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+
+    waits = [
+        _parse_reset(resp.headers.get(name))
+        for name in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")
+    ]
+    waits = [w for w in waits if w is not None]
+    return max(waits) if waits else None
+
+
+def _parse_reset(raw: Optional[str]) -> Optional[float]:
+    if not raw:
+        return None
+    total = 0.0
+    number = ""
+    i = 0
+    units = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+    while i < len(raw):
+        ch = raw[i]
+        if ch.isdigit() or ch == ".":
+            number += ch
+            i += 1
+            continue
+        unit = "ms" if raw.startswith("ms", i) else ch
+        if unit not in units or not number:
+            return None
+        total += float(number) * units[unit]
+        number = ""
+        i += len(unit)
+    if number:
+        total += float(number)
+    return total
+
+
+class AsyncLlmClient(_LlmClientBase):
+    """
+    Асинхронный LlmClient для пачек запросов.
+
+    - не больше max_concurrency запросов одновременно (семафор);
+    - RateLimiter держит лимиты провайдера по запросам и токенам в минуту;
+    - 429 и 5xx повторяются до max_retries раз: пауза берётся из Retry-After /
+      x-ratelimit-reset-*, иначе экспоненциальная со случайным разбросом.
+
+    Кэш ответов — общий с синхронным клиентом. Создавать внутри работающего event loop.
+    """
+
+    RETRY_STATUSES = (408, 409, 429, 500, 502, 503, 504)
+
+    def __init__(
+        self,
+        api_key: str | None = None,
+        base_url: str | None = None,
+        model: str = "gpt-4o-mini",
+        timeout: float = 60.0,
+        cache: Optional[FileCache] = None,
+        bypass_cache: bool = False,
+        *,
+        max_concurrency: int = 4,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        max_retries: int = 5,
+        expected_completion_tokens: int = 1000,
+    ) -> None:
+        super().__init__(api_key, base_url, model, timeout, cache, bypass_cache)
+        self._client = http_pool.get_async_client(self.base_url)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        self.max_retries = max_retries
+        self.expected_completion_tokens = expected_completion_tokens
+
+    @classmethod
+    def from_settings(cls, settings: Settings, **kwargs: Any) -> "AsyncLlmClient":
+        """Клиент с кэшем (LLM_CACHE_*) и лимитами провайдера (LLM_MAX_CONCURRENCY, LLM_RPM, LLM_TPM)."""
+        cfg = settings.llm
+        kwargs.setdefault("max_concurrency", cfg.max_concurrency)
+        kwargs.setdefault("requests_per_minute", cfg.requests_per_minute)
+        kwargs.setdefault("tokens_per_minute", cfg.tokens_per_minute)
+        kwargs.setdefault("max_retries", cfg.max_retries)
+        return cls(**cls._cache_kwargs(settings, kwargs))
+
+    async def aclose(self) -> None:
+        """Пул соединений общий (http_pool.aclose_all) — здесь закрывать нечего."""
+
+    async def complete_json(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        *,
+        bypass_cache: Optional[bool] = None,
+        model: Optional[str] = None,
+        validate: Optional[Validator] = None,
+    ) -> LlmResponse:
+        url, headers, payload = self._request(system_prompt, user_prompt, model)
+        cache_key, hit = self._lookup(payload, bypass_cache, validate)
+        if hit is not None:
+            return hit
+
+        estimated = estimate_tokens(system_prompt + user_prompt) + self.expected_completion_tokens
+        async with self._semaphore:
+            data = await self._post_with_retries(url, headers, payload, estimated)
+        return self._finish(data, cache_key, validate)
+
+    async def _post_with_retries(
+        self,
+        url: str,
+        headers: Dict[str, str],
+        payload: Dict[str, Any],
+        estimated: int,
+    ) -> Dict[str, Any]:
+        attempt = 0
+        while True:
+            await self.limiter.acquire(estimated)
+            try:
+                resp = await self._client.post(url, headers=headers, json=payload, timeout=self.timeout)
+            except httpx.TransportError as exc:
+                if attempt >= self.max_retries:
+                    raise LlmClientError(f"LLM HTTP error: {exc}") from exc
+                delay = None
+            else:
+                if resp.status_code < 400:
+                    data = resp.json()
+                    actual = (data.get("usage") or {}).get("total_tokens")
+                    if actual:
+                        self.limiter.settle(estimated, int(actual))
+                    return data
+                if resp.status_code not in self.RETRY_STATUSES or attempt >= self.max_retries:
+                    raise LlmClientError(f"LLM HTTP error: {resp.status_code} {resp.text[:500]}")
+                delay = retry_after_seconds(resp)
+                if resp.status_code == 429 and delay is not None:
+                    # Лимит общий на ключ — притормаживаем все запросы, а не только этот
+                    self.limiter.pause_until(time.monotonic() + delay)
+
+            if delay is None:
+                delay = min(60.0, 2 ** attempt) * random.uniform(0.5, 1.0)
+            else:
+                delay += random.uniform(0, 0.5)
+            attempt += 1
+            print(f"LLM request retry {attempt}/{self.max_retries} in {delay:.1f}s")
+            await asyncio.sleep(delay)
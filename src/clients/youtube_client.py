@@ -2,64 +2,95 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Sequence
+from urllib.parse import parse_qs, urlparse, urlunparse
 
-from src.clients.apify_client import ApifyClient, ApifyClientError
+from src.clients.apify_client import ApifyClient, ApifyClientError, AsyncApifyClient
 from src.config.settings import Settings
 from src.models.reference import EngagementMetrics, Platform, Reference
 
+if TYPE_CHECKING:
+    from src.storage.reference_cache import ReferenceCache
+    from src.storage.search_cache import SearchCache
 
-class YouTubeClient:
+
+class _YouTubeClientBase:
     """
-    Клиент для работы с Apify actor'ом streamers/youtube-scraper через поллинг.
+    Общая часть синхронного и асинхронного клиента: входные данные актора,
+    кэши и маппинг ответа в Reference. Ввод-вывод — в наследниках.
     """
 
     ACTOR_ID = "streamers~youtube-scraper"
 
-    def __init__(self, settings: Settings) -> None:
+    # Ключи элемента датасета, которые читает _map_item_to_reference
+    # (+ транскрипт для анализа) — остальное Apify не присылает
+    ITEM_FIELDS = (
+        "url", "videoUrl", "title", "channelName", "author",
+        "uploadDate", "publishedAt", "publishDate", "date",
+        "description", "text", "hashtags", "tags",
+        "durationSeconds", "duration",
+        "viewCount", "views", "likeCount", "likes", "commentCount", "comments",
+        "transcript", "subtitle", "captions",
+    )
+
+    def __init__(
+        self,
+        settings: Settings,
+        reference_cache: Optional["ReferenceCache"] = None,
+        search_cache: Optional["SearchCache"] = None,
+    ) -> None:
         self._settings = settings
-        self._apify = ApifyClient(settings)
+        # Кэш Reference по URL: повторный URL не запускает актор
+        self.reference_cache = reference_cache
+        # Кэш выдачи по поисковому запросу: свежий запрос не запускает актор
+        self.search_cache = search_cache
 
-    def fetch_search_videos(
+    def _search_params(self, max_results: Optional[int], max_age_days: Optional[int]) -> tuple:
+        return (
+            max_results or self._settings.limits.youtube_max_results,
+            max_age_days or self._settings.fetch.max_age_days,
+        )
+
+    def cached_search(
         self,
         query: str,
         *,
         max_results: Optional[int] = None,
         max_age_days: Optional[int] = None,
-    ) -> List[Reference]:
-        """Ищет видео и ждет завершения работы актора."""
-        fetch_cfg = self._settings.fetch
-        max_results = max_results or self._settings.limits.youtube_max_results
-        max_age_days = max_age_days or fetch_cfg.max_age_days
+    ) -> Optional[List[Reference]]:
+        """Свежая выдача по запросу из кэша или None (кэша нет / устарел)."""
+        if self.search_cache is None:
+            return None
+        max_results, max_age_days = self._search_params(max_results, max_age_days)
+        return self.search_cache.get(query, max_results, max_age_days)
 
-        input_payload: Dict[str, Any] = {
+    @staticmethod
+    def _search_payload(query: str, max_results: int, max_age_days: int) -> Dict[str, Any]:
+        return {
             "searchKeywords": query,
             "maxResults": max_results,
             "postsFromDate": f"{max_age_days} days ago",
         }
 
-        print(f"--- YouTube Search ---")
-        print(f"Query: {query}")
-        
-        try:
-            run = self._apify.start_actor(self.ACTOR_ID, input_payload)
-            run_id = run["id"]
-            print(f"Actor started. Run ID: {run_id}")
-            
-            print("Waiting for completion (polling)...")
-            final_run = self._apify.wait_for_run(run_id, timeout_sec=600)
-            
-            ds_id = final_run["defaultDatasetId"]
-            items = self._apify.get_dataset_items(ds_id)
-            
-            print(f"DEBUG: Apify returned {len(items)} items before filtering.")
-
-        except ApifyClientError as e:
-            print(f"YouTube search failed: {e}")
-            return []
+    @staticmethod
+    def _start_urls_payload(urls: List[str]) -> Dict[str, Any]:
+        return {
+            "startUrls": [{"url": u} for u in urls],
+            "maxResults": len(urls),
+        }
 
+    def _collect_search_results(
+        self,
+        query: str,
+        items: Iterable[Dict[str, Any]],
+        max_results: int,
+        max_age_days: int,
+    ) -> List[Reference]:
+        """Маппит выдачу поиска (можно потоком), фильтрует по свежести и кладёт в кэши."""
         references: List[Reference] = []
+        total = 0
         for i, item in enumerate(items):
+            total += 1
             ref = self._map_item_to_reference(item)
             if not ref:
                 # В dev-режиме выведем ключи, если маппинг не удался
@@ -67,41 +98,73 @@ class YouTubeClient:
                     print(f"DEBUG item[{i}] keys: {list(item.keys())}")
                 continue
             
+            if self.reference_cache is not None:
+                self.reference_cache.put(ref)
+
             if self._settings.app_mode == "dev":
                 references.append(ref)
             else:
                 if ref.is_recent(max_age_days=max_age_days):
                     references.append(ref)
 
+        if self.search_cache is not None:
+            self.search_cache.put(query, max_results, max_age_days, references)
+
+        print(f"DEBUG: Apify returned {total} items before filtering.")
         print(f"DEBUG: Returning {len(references)} Reference objects.")
         return references
 
-    def fetch_video_by_url(self, url: str) -> Optional[Reference]:
-        """
-        Пытается получить видео напрямую по URL через Apify actor.
-        Возвращает первый валидный Reference или None.
-        """
-        input_payload: Dict[str, Any] = {
-            "startUrls": [{"url": url}],
-            "maxResults": 1,
-        }
-
-        try:
-            run = self._apify.start_actor(self.ACTOR_ID, input_payload)
-            run_id = run["id"]
-            final_run = self._apify.wait_for_run(run_id, timeout_sec=600)
-            ds_id = final_run["defaultDatasetId"]
-            items = self._apify.get_dataset_items(ds_id)
-        except ApifyClientError as e:
-            print(f"YouTube fetch by URL failed: {e}")
+    def _cached_reference(self, url: str) -> Optional[Reference]:
+        if self.reference_cache is None:
             return None
+        cached = self.reference_cache.get(url)
+        if cached is not None:
+            print(f"YouTube fetch by URL: cache hit for {url}")
+        return cached
 
+    def _first_reference(self, items: List[Dict[str, Any]]) -> Optional[Reference]:
         for item in items:
             ref = self._map_item_to_reference(item)
             if ref:
+                if self.reference_cache is not None:
+                    self.reference_cache.put(ref)
                 return ref
         return None
 
+    def _split_cached(self, urls: Sequence[str]) -> tuple:
+        """Делит URL на найденные в кэше (normalized -> Reference) и те, что надо запросить."""
+        found: Dict[str, Reference] = {}
+        to_fetch: List[str] = []
+        for url in dict.fromkeys(urls):
+            cached = self.reference_cache.get(url) if self.reference_cache is not None else None
+            if cached is not None:
+                found[normalize_youtube_url(url)] = cached
+            else:
+                to_fetch.append(url)
+        if found:
+            print(f"YouTube batch fetch: {len(found)} URL(s) served from cache")
+        return found, to_fetch
+
+    def _collect_by_urls(
+        self,
+        urls: Sequence[str],
+        items: List[Dict[str, Any]],
+        found: Dict[str, Reference],
+    ) -> Dict[str, Reference]:
+        """Сопоставляет элементы датасета с запрошенными URL по нормализованному виду."""
+        wanted = {normalize_youtube_url(u) for u in urls}
+        for item in items:
+            ref = self._map_item_to_reference(item)
+            if not ref:
+                continue
+            key = normalize_youtube_url(ref.url)
+            if key in wanted and key not in found:
+                found[key] = ref
+                if self.reference_cache is not None:
+                    self.reference_cache.put(ref)
+        print(f"YouTube batch fetch: {len(found)}/{len(wanted)} URLs resolved in one actor run")
+        return found
+
     def _map_item_to_reference(self, item: Dict[str, Any]) -> Optional[Reference]:
         """Мапит элемент ответа в Reference согласно контракту данных."""
         try:
@@ -209,3 +272,206 @@ class YouTubeClient:
         except Exception:
             return None
         return None
+
+
+class YouTubeClient(_YouTubeClientBase):
+    """
+    Клиент для работы с Apify actor'ом streamers/youtube-scraper (ожидание через long-poll).
+    """
+
+    def __init__(
+        self,
+        settings: Settings,
+        reference_cache: Optional["ReferenceCache"] = None,
+        search_cache: Optional["SearchCache"] = None,
+    ) -> None:
+        super().__init__(settings, reference_cache, search_cache)
+        self._apify = ApifyClient(settings)
+
+    def close(self) -> None:
+        self._apify.close()
+
+    def fetch_search_videos(
+        self,
+        query: str,
+        *,
+        max_results: Optional[int] = None,
+        max_age_days: Optional[int] = None,
+    ) -> List[Reference]:
+        """Ищет видео и ждет завершения работы актора (или берёт свежую выдачу из кэша)."""
+        max_results, max_age_days = self._search_params(max_results, max_age_days)
+        cached = self.cached_search(query, max_results=max_results, max_age_days=max_age_days)
+        if cached is not None:
+            print(f"YouTube search: cache hit for '{query}' ({len(cached)} items)")
+            return cached
+
+        input_payload = self._search_payload(query, max_results, max_age_days)
+
+        print(f"--- YouTube Search ---")
+        print(f"Query: {query}")
+        
+        try:
+            run = self._apify.start_actor(self.ACTOR_ID, input_payload)
+            run_id = run["id"]
+            print(f"Actor started. Run ID: {run_id}")
+            
+            print("Waiting for completion (long-poll)...")
+            final_run = self._apify.wait_for_run(run_id, timeout_sec=600)
+            
+            ds_id = final_run["defaultDatasetId"]
+            # Страницы датасета маппятся по мере загрузки, целиком в память не попадают
+            items = self._apify.iter_dataset_items(ds_id, fields=self.ITEM_FIELDS)
+            return self._collect_search_results(query, items, max_results, max_age_days)
+
+        except ApifyClientError as e:
+            print(f"YouTube search failed: {e}")
+            return []
+
+    def fetch_video_by_url(self, url: str) -> Optional[Reference]:
+        """
+        Пытается получить видео напрямую по URL через Apify actor.
+        Возвращает первый валидный Reference или None.
+        """
+        cached = self._cached_reference(url)
+        if cached is not None:
+            return cached
+
+        try:
+            items = self._run_start_urls([url])
+        except ApifyClientError as e:
+            print(f"YouTube fetch by URL failed: {e}")
+            return None
+        return self._first_reference(items)
+
+    def fetch_videos_by_urls(self, urls: Sequence[str]) -> Dict[str, Reference]:
+        """
+        Получает сразу несколько видео одним запуском актора (startUrls = все URL).
+
+        Возвращает словарь normalize_youtube_url(url) -> Reference только для
+        найденных видео; чего нет в ответе — ищется вызывающим кодом иначе.
+        """
+        if not urls:
+            return {}
+        found, to_fetch = self._split_cached(urls)
+        if not to_fetch:
+            return found
+
+        try:
+            items = self._run_start_urls(to_fetch)
+        except ApifyClientError as e:
+            print(f"YouTube batch fetch by URL failed: {e}")
+            return found
+        return self._collect_by_urls(urls, items, found)
+
+    def _run_start_urls(self, urls: List[str]) -> List[Dict[str, Any]]:
+        """Запускает актор по списку startUrls и возвращает элементы датасета."""
+        run = self._apify.start_actor(self.ACTOR_ID, self._start_urls_payload(urls))
+        run_id = run["id"]
+        final_run = self._apify.wait_for_run(run_id, timeout_sec=600)
+        ds_id = final_run["defaultDatasetId"]
+        return self._apify.get_dataset_items(ds_id, fields=self.ITEM_FIELDS)
+
+
+class AsyncYouTubeClient(_YouTubeClientBase):
+    """
+    Асинхронный вариант YouTubeClient поверх AsyncApifyClient.
+
+    Маппинг и кэши — общие с синхронным клиентом; ожидание запусков не держит
+    поток, поэтому много запросов можно вести одновременно через asyncio.gather.
+    """
+
+    def __init__(
+        self,
+        settings: Settings,
+        reference_cache: Optional["ReferenceCache"] = None,
+        search_cache: Optional["SearchCache"] = None,
+        apify: Optional[AsyncApifyClient] = None,
+    ) -> None:
+        super().__init__(settings, reference_cache, search_cache)
+        self._apify = apify or AsyncApifyClient(settings)
+
+    async def aclose(self) -> None:
+        await self._apify.aclose()
+
+    async def __aenter__(self) -> "AsyncYouTubeClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def fetch_search_videos(
+        self,
+        query: str,
+        *,
+        max_results: Optional[int] = None,
+        max_age_days: Optional[int] = None,
+    ) -> List[Reference]:
+        max_results, max_age_days = self._search_params(max_results, max_age_days)
+        cached = self.cached_search(query, max_results=max_results, max_age_days=max_age_days)
+        if cached is not None:
+            print(f"YouTube search: cache hit for '{query}' ({len(cached)} items)")
+            return cached
+
+        print(f"--- YouTube Search (async) --- Query: {query}")
+        try:
+            items = await self._run(self._search_payload(query, max_results, max_age_days))
+        except ApifyClientError as e:
+            print(f"YouTube search failed: {e}")
+            return []
+        return self._collect_search_results(query, items, max_results, max_age_days)
+
+    async def fetch_video_by_url(self, url: str) -> Optional[Reference]:
+        cached = self._cached_reference(url)
+        if cached is not None:
+            return cached
+        try:
+            items = await self._run(self._start_urls_payload([url]))
+        except ApifyClientError as e:
+            print(f"YouTube fetch by URL failed: {e}")
+            return None
+        return self._first_reference(items)
+
+    async def fetch_videos_by_urls(self, urls: Sequence[str]) -> Dict[str, Reference]:
+        if not urls:
+            return {}
+        found, to_fetch = self._split_cached(urls)
+        if not to_fetch:
+            return found
+        try:
+            items = await self._run(self._start_urls_payload(to_fetch))
+        except ApifyClientError as e:
+            print(f"YouTube batch fetch by URL failed: {e}")
+            return found
+        return self._collect_by_urls(urls, items, found)
+
+    async def _run(self, input_payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+        run = await self._apify.start_actor(self.ACTOR_ID, input_payload)
+        final_run = await self._apify.wait_for_run(run["id"], timeout_sec=600)
+        return await self._apify.get_dataset_items(final_run["defaultDatasetId"], fields=self.ITEM_FIELDS)
+
+
+def normalize_youtube_url(url: str) -> str:
+    """
+    Нормализует YouTube URL для сравнения:
+    - youtu.be/<id> -> youtube.com/watch?v=<id>
+    - удаляет лишние query-параметры, оставляя v
+    """
+    if not url:
+        return ""
+    parsed = urlparse(url)
+
+    if "youtu.be" in parsed.netloc:
+        video_id = parsed.path.strip("/")
+        if video_id:
+            return f"https://www.youtube.com/watch?v={video_id}"
+
+    if "youtube.com" in parsed.netloc:
+        qs = parse_qs(parsed.query)
+        video_id = (qs.get("v") or [""])[0]
+        if video_id:
+            normalized = parsed._replace(path="/watch", query=f"v={video_id}", fragment="")
+            return urlunparse(normalized)
+
+    # fallback: убираем query/fragment
+    normalized = parsed._replace(query="", fragment="")
+    return urlunparse(normalized).rstrip("/")
@@ -2,7 +2,22 @@
 from __future__ import annotations
 
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from src.models.task import PipelineMode
+
+
+def _env_int_or_none(name: str) -> Optional[int]:
+    """Целое из переменной окружения; пусто или не задано — None."""
+    raw = os.getenv(name)
+    return int(raw) if raw else None
+
+
+def _env_flag(name: str) -> bool:
+    """Булев флаг из переменной окружения: 1 / true / yes."""
+    return os.getenv(name, "").lower() in ("1", "true", "yes")
 
 
 @dataclass
@@ -21,6 +36,15 @@ class FetchSettings:
     tiktok_max_results: int = 50
     instagram_max_results: int = 50
 
+    # сколько поисковых запусков актора держать одновременно
+    search_max_in_flight: int = 5
+
+    @classmethod
+    def from_env(cls) -> "FetchSettings":
+        return cls(
+            search_max_in_flight=max(1, int(os.getenv("YOUTUBE_SEARCH_MAX_IN_FLIGHT", cls.search_max_in_flight))),
+        )
+
 
 @dataclass
 class LimitsSettings:
@@ -36,12 +60,168 @@ class LimitsSettings:
     llm_enabled: bool = True
 
 
+@dataclass
+class WorkerSettings:
+    # как часто опрашивать очередь, когда работы нет (секунды)
+    poll_interval_sec: float = 2.0
+    # до какого интервала растягивать опрос при долгом простое
+    max_idle_interval_sec: float = 30.0
+
+    # сколько задач обрабатывать одновременно
+    concurrency: int = 1
+    # лимиты одновременных вызовов по стадиям (None — не больше concurrency)
+    apify_fetch_concurrency: Optional[int] = None
+    llm_analyze_concurrency: Optional[int] = None
+    llm_generate_concurrency: Optional[int] = None
+    # сколько pending-задач собирать в один запуск Apify-актора (None — concurrency)
+    fetch_batch_size: Optional[int] = None
+    # режим конвейера для задач без своего pipeline_mode
+    pipeline_mode: PipelineMode = PipelineMode.TWO_STEP
+
+    def stage_limit(self, value: Optional[int]) -> int:
+        return max(1, min(value or self.concurrency, self.concurrency))
+
+    @property
+    def batch_size(self) -> int:
+        return self.stage_limit(self.fetch_batch_size)
+
+    @classmethod
+    def from_env(cls) -> "WorkerSettings":
+        return cls(
+            poll_interval_sec=float(os.getenv("WORKER_POLL_INTERVAL", cls.poll_interval_sec)),
+            max_idle_interval_sec=float(os.getenv("WORKER_MAX_IDLE_INTERVAL", cls.max_idle_interval_sec)),
+            concurrency=max(1, int(os.getenv("WORKER_CONCURRENCY", cls.concurrency))),
+            apify_fetch_concurrency=_env_int_or_none("WORKER_APIFY_CONCURRENCY"),
+            llm_analyze_concurrency=_env_int_or_none("WORKER_LLM_ANALYZE_CONCURRENCY"),
+            llm_generate_concurrency=_env_int_or_none("WORKER_LLM_GENERATE_CONCURRENCY"),
+            fetch_batch_size=_env_int_or_none("WORKER_FETCH_BATCH_SIZE"),
+            pipeline_mode=PipelineMode(os.getenv("PIPELINE_MODE", cls.pipeline_mode.value).lower()),
+        )
+
+
+@dataclass
+class LlmSettings:
+    # лимиты для асинхронных пачек запросов (AsyncLlmClient)
+    max_concurrency: int = 4
+    # лимиты провайдера: запросы и токены в минуту (None — не ограничивать)
+    requests_per_minute: Optional[int] = None
+    tokens_per_minute: Optional[int] = None
+    # сколько раз повторять 429/5xx
+    max_retries: int = 5
+    # офлайн-анализ пачкой через Batch API (scripts/run_analyze_sample.py)
+    batch: bool = False
+    # Batch API: интервал опроса статуса пачки и сколько ждать её завершения
+    batch_poll_interval_sec: float = 30.0
+    batch_max_wait_hours: float = 24.0
+    # бюджет токенов на описание и транскрипт в промпте анализа;
+    # длинный транскрипт режется на куски по transcript_chunk_tokens и сжимается (map-reduce)
+    transcript_token_budget: int = 6000
+    transcript_chunk_tokens: int = 4000
+    # сколько кусков сжимать одновременно
+    transcript_max_concurrency: int = 4
+    # читать ответы LLM потоком (SSE): слайды и поля анализа доступны до конца генерации
+    stream: bool = False
+    # маршрутизация моделей (ModelRouter): анализ сначала на дешёвой модели,
+    # на сильную — если оценки попали в «неуверенный» диапазон или ответ не прошёл проверку
+    analysis_model: str = "gpt-4o-mini"
+    # None — без эскалации
+    analysis_strong_model: Optional[str] = "gpt-4o"
+    escalation_score_min: float = 0.4
+    escalation_score_max: float = 0.7
+    # модель для генерации карусели (None — модель клиента)
+    carousel_model: Optional[str] = None
+
+    @classmethod
+    def from_env(cls) -> "LlmSettings":
+        return cls(
+            max_concurrency=max(1, int(os.getenv("LLM_MAX_CONCURRENCY", cls.max_concurrency))),
+            requests_per_minute=_env_int_or_none("LLM_RPM"),
+            tokens_per_minute=_env_int_or_none("LLM_TPM"),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", cls.max_retries)),
+            batch=_env_flag("LLM_BATCH"),
+            batch_poll_interval_sec=float(os.getenv("LLM_BATCH_POLL_INTERVAL", cls.batch_poll_interval_sec)),
+            batch_max_wait_hours=float(os.getenv("LLM_BATCH_MAX_WAIT_HOURS", cls.batch_max_wait_hours)),
+            transcript_token_budget=int(os.getenv("LLM_TRANSCRIPT_TOKEN_BUDGET", cls.transcript_token_budget)),
+            transcript_chunk_tokens=int(os.getenv("LLM_TRANSCRIPT_CHUNK_TOKENS", cls.transcript_chunk_tokens)),
+            transcript_max_concurrency=max(
+                1, int(os.getenv("LLM_TRANSCRIPT_CONCURRENCY", cls.transcript_max_concurrency))
+            ),
+            stream=_env_flag("LLM_STREAM"),
+            analysis_model=os.getenv("LLM_ANALYSIS_MODEL", cls.analysis_model),
+            analysis_strong_model=os.getenv("LLM_ANALYSIS_STRONG_MODEL", cls.analysis_strong_model) or None,
+            escalation_score_min=float(os.getenv("LLM_ESCALATION_SCORE_MIN", cls.escalation_score_min)),
+            escalation_score_max=float(os.getenv("LLM_ESCALATION_SCORE_MAX", cls.escalation_score_max)),
+            carousel_model=os.getenv("LLM_CAROUSEL_MODEL") or None,
+        )
+
+
+@dataclass
+class HttpSettings:
+    # таймаут запроса по умолчанию (клиенты могут передать свой)
+    timeout_sec: float = 60.0
+    # лимиты пула соединений на один хост
+    max_connections_per_host: int = 20
+    max_keepalive_per_host: int = 10
+    keepalive_expiry_sec: float = 30.0
+    # асинхронным клиентам (long-poll на каждый запуск актора) нужно больше соединений
+    async_max_connections_per_host: int = 200
+    # HTTP/2 (нужен пакет h2: pip install httpx[http2])
+    http2: bool = False
+
+    @classmethod
+    def from_env(cls) -> "HttpSettings":
+        return cls(
+            max_connections_per_host=int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", cls.max_connections_per_host)),
+            max_keepalive_per_host=int(os.getenv("HTTP_MAX_KEEPALIVE_PER_HOST", cls.max_keepalive_per_host)),
+            keepalive_expiry_sec=float(os.getenv("HTTP_KEEPALIVE_EXPIRY", cls.keepalive_expiry_sec)),
+            async_max_connections_per_host=int(
+                os.getenv("HTTP_ASYNC_MAX_CONNECTIONS_PER_HOST", cls.async_max_connections_per_host)
+            ),
+            http2=_env_flag("HTTP2"),
+        )
+
+
+@dataclass
+class CacheSettings:
+    # каталог дисковых кэшей
+    dir: Path = Path(__file__).resolve().parents[2] / "data" / "cache"
+
+    # кэш Reference по URL: сколько часов доверять метрикам (0 — кэш выключен)
+    reference_ttl_hours: float = 24.0
+    reference_max_entries: int = 5000
+
+    # кэш результатов поиска: сколько часов считать выдачу по запросу свежей (0 — выключен)
+    search_ttl_hours: float = 6.0
+    search_max_entries: int = 1000
+
+    # кэш ответов LLM по хэшу запроса (0 — выключен); bypass — не читать кэш, только обновлять
+    llm_ttl_hours: float = 24.0 * 7
+    llm_max_entries: int = 2000
+    llm_bypass: bool = False
+
+    @classmethod
+    def from_env(cls) -> "CacheSettings":
+        return cls(
+            dir=Path(os.getenv("CACHE_DIR", str(cls.dir))),
+            reference_ttl_hours=float(os.getenv("REFERENCE_CACHE_TTL_HOURS", cls.reference_ttl_hours)),
+            reference_max_entries=int(os.getenv("REFERENCE_CACHE_MAX_ENTRIES", cls.reference_max_entries)),
+            search_ttl_hours=float(os.getenv("SEARCH_CACHE_TTL_HOURS", cls.search_ttl_hours)),
+            search_max_entries=int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", cls.search_max_entries)),
+            llm_ttl_hours=float(os.getenv("LLM_CACHE_TTL_HOURS", cls.llm_ttl_hours)),
+            llm_max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", cls.llm_max_entries)),
+            llm_bypass=_env_flag("LLM_CACHE_BYPASS"),
+        )
+
+
 @dataclass
 class Settings:
     apify: ApifySettings
     fetch: FetchSettings
     limits: LimitsSettings
     app_mode: str = "dev"
+    worker: WorkerSettings = field(default_factory=WorkerSettings)
+    cache: CacheSettings = field(default_factory=CacheSettings)
+    llm: LlmSettings = field(default_factory=LlmSettings)
 
     @classmethod
     def from_env(cls) -> "Settings":
@@ -70,7 +250,10 @@ class Settings:
 
         return cls(
             apify=ApifySettings(api_token=api_token),
-            fetch=FetchSettings(),
+            fetch=FetchSettings.from_env(),
             limits=limits,
-            app_mode=app_mode
+            app_mode=app_mode,
+            worker=WorkerSettings.from_env(),
+            cache=CacheSettings.from_env(),
+            llm=LlmSettings.from_env(),
         )
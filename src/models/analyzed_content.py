@@ -42,3 +42,7 @@ class AnalyzedContent:
 
     # Дополнительно, если захотим использовать дальше
     raw_llm_output: Optional[dict] = None
+
+    # Какая модель дала итоговый анализ и почему он уходил на сильную (ModelRouter)
+    llm_model: Optional[str] = None
+    escalation_reason: Optional[str] = None
@@ -1,12 +1,13 @@
 from __future__ import annotations
 
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
 from datetime import datetime
 from typing import Any, Dict
 
 from src.models.reference import Reference
 from src.models.analyzed_content import AnalyzedContent
 from src.models.carousel import CarouselSpec
+from src.models.serialization import to_serializable
 
 
 @dataclass
@@ -26,18 +27,4 @@ class PersistedRun:
         Преобразует объект в JSON‑совместимый dict.
         Даты -> isoformat, Enum -> value.
         """
-        def convert(obj: Any) -> Any:
-            from enum import Enum
-            if isinstance(obj, datetime):
-                return obj.isoformat()
-            if isinstance(obj, Enum):
-                return obj.value
-            if hasattr(obj, "__dataclass_fields__"):
-                return {k: convert(v) for k, v in asdict(obj).items()}
-            if isinstance(obj, dict):
-                return {k: convert(v) for k, v in obj.items()}
-            if isinstance(obj, (list, tuple)):
-                return [convert(v) for v in obj]
-            return obj
-
-        return convert(self)
+        return to_serializable(self)
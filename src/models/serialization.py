@@ -0,0 +1,25 @@
+# src/models/serialization.py
+from __future__ import annotations
+
+from dataclasses import asdict
+from datetime import datetime
+from enum import Enum
+from typing import Any
+
+
+def to_serializable(obj: Any) -> Any:
+    """
+    Преобразует dataclass/список/словарь в JSON‑совместимый вид.
+    Даты -> isoformat, Enum -> value.
+    """
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    if isinstance(obj, Enum):
+        return obj.value
+    if hasattr(obj, "__dataclass_fields__"):
+        return {k: to_serializable(v) for k, v in asdict(obj).items()}
+    if isinstance(obj, dict):
+        return {k: to_serializable(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [to_serializable(v) for v in obj]
+    return obj
@@ -1,11 +1,13 @@
 from __future__ import annotations
 
-from dataclasses import dataclass, asdict, field
+from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
 from typing import Any, Dict, Optional
 from uuid import uuid4
 
+from src.models.serialization import to_serializable
+
 
 class TaskStatus(str, Enum):
     PENDING = "pending"
@@ -14,6 +16,13 @@ class TaskStatus(str, Enum):
     FAILED = "failed"
 
 
+class PipelineMode(str, Enum):
+    # анализ и генерация карусели — два последовательных запроса к LLM
+    TWO_STEP = "two_step"
+    # анализ и карусель одним запросом (analyze_and_generate)
+    FUSED = "fused"
+
+
 @dataclass
 class GenerationTask:
     """
@@ -25,6 +34,7 @@ class GenerationTask:
     - platform: платформа ("youtube" и т.п.).
     - status: статус задачи.
     - error: текст ошибки, если FAILED.
+    - pipeline_mode: режим конвейера (None — глобальный PIPELINE_MODE).
     """
 
     id: str
@@ -41,8 +51,16 @@ class GenerationTask:
     # краткий текст ошибки, если статус FAILED
     error: Optional[str] = None
 
+    # режим конвейера для этой задачи; None — по настройкам воркера
+    pipeline_mode: Optional[PipelineMode] = None
+
     @classmethod
-    def new(cls, source_url: str, platform: str = "youtube") -> "GenerationTask":
+    def new(
+        cls,
+        source_url: str,
+        platform: str = "youtube",
+        pipeline_mode: Optional[PipelineMode] = None,
+    ) -> "GenerationTask":
         now = datetime.utcnow()
         return cls(
             id=str(uuid4()),
@@ -51,21 +69,8 @@ class GenerationTask:
             status=TaskStatus.PENDING,
             created_at=now,
             updated_at=now,
+            pipeline_mode=pipeline_mode,
         )
 
     def to_serializable_dict(self) -> Dict[str, Any]:
-        def convert(obj: Any) -> Any:
-            from enum import Enum
-            if isinstance(obj, datetime):
-                return obj.isoformat()
-            if isinstance(obj, Enum):
-                return obj.value
-            if hasattr(obj, "__dataclass_fields__"):
-                return {k: convert(v) for k, v in asdict(obj).items()}
-            if isinstance(obj, dict):
-                return {k: convert(v) for k, v in obj.items()}
-            if isinstance(obj, (list, tuple)):
-                return [convert(v) for v in obj]
-            return obj
-
-        return convert(self)
+        return to_serializable(self)
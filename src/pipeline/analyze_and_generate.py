@@ -0,0 +1,114 @@
+# src/pipeline/analyze_and_generate.py
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from src.clients.llm_client import LlmClient, LlmClientError
+from src.models.analyzed_content import AnalyzedContent
+from src.models.carousel import CarouselSpec
+from src.models.reference import Reference
+from src.pipeline.analyze_content import (
+    ANALYSIS_JSON_FORMAT,
+    ANALYSIS_REQUIREMENTS,
+    _content_block,
+    _parse_analysis,
+    _parse_valid_analysis,
+)
+from src.pipeline.generate_carousel import (
+    CAROUSEL_JSON_FORMAT,
+    CAROUSEL_PHOTO_REQUIREMENTS,
+    CAROUSEL_STRUCTURE_REQUIREMENTS,
+    parse_carousel_spec,
+)
+
+
+SYSTEM_PROMPT = """
+Ты — эксперт по маркетингу на Wildberries и по созданию Instagram-каруселей для предпринимателей.
+Твоя задача — проанализировать русскоязычное видео и сразу превратить его содержание
+в структуру обучающей карусели для НОВИЧКОВ на WB: слайды, заголовки, тексты и финальный CTA.
+
+Все тексты пиши по-русски, просто и конкретно.
+
+Важно:
+- У нас есть эксперт (лицо бренда) с фото.
+- Отмечай, на каких слайдах нужно показывать фото эксперта (обычно HOOK и CTA, иногда 1-2 ключевых контент-слайда).
+Отвечай строго в формате JSON, без пояснений, без дополнительного текста.
+""".strip()
+
+
+def build_fused_prompt(ref: Reference) -> str:
+    """
+    Один user-prompt на анализ и карусель: ответ содержит объекты
+    "analysis" (как у analyze_reference) и "carousel" (как у generate_carousel_spec).
+    """
+    return f"""
+Проанализируй следующий контент (видео с YouTube про Wildberries) и по нему создай
+структуру Instagram-карусели (до 10 слайдов) для новичка на WB:
+
+{_content_block(ref)}
+
+Верни JSON строго в формате:
+
+{{
+  "analysis": {ANALYSIS_JSON_FORMAT},
+  "carousel": {CAROUSEL_JSON_FORMAT}
+}}
+
+Требования к analysis:
+{ANALYSIS_REQUIREMENTS}
+
+Карусель строй по тезисам и углу из analysis.
+{CAROUSEL_STRUCTURE_REQUIREMENTS}
+
+Требования к карусели:
+{CAROUSEL_PHOTO_REQUIREMENTS}
+
+Очень важно:
+- Соблюдай структуру JSON.
+- Не используй Markdown, не оборачивай JSON в ```.
+- Все тексты — на русском.
+""".strip()
+
+
+def analyze_and_generate(
+    ref: Reference,
+    llm_client: LlmClient,
+    *,
+    on_analysis: Optional[Callable[[AnalyzedContent], None]] = None,
+    model: Optional[str] = None,
+) -> Tuple[AnalyzedContent, CarouselSpec]:
+    """
+    Совмещённый режим конвейера (PIPELINE_MODE=fused): анализ и карусель
+    одним запросом к LLM вместо двух последовательных. Вдвое меньше ожидания
+    на задачу, и резюме с тезисами не отправляются модели второй раз.
+
+    on_analysis — ответ читается потоком, и AnalyzedContent отдаётся,
+    как только закрылся объект "analysis", пока модель ещё пишет карусель.
+    """
+    user_prompt = build_fused_prompt(ref)
+    def validate(parsed: Dict[str, Any]) -> Any:
+        return _parse_fused(ref, parsed)
+
+    if on_analysis is None:
+        resp = llm_client.complete_json(SYSTEM_PROMPT, user_prompt, model=model, validate=validate)
+    else:
+        def on_field(key: str, value: Any) -> None:
+            if key == "analysis" and isinstance(value, dict):
+                on_analysis(_parse_analysis(ref, value))
+
+        resp = llm_client.complete_json_stream(
+            SYSTEM_PROMPT, user_prompt, on_field=on_field, model=model, validate=validate
+        )
+    return _parse_fused(ref, resp.parsed)
+
+
+def _parse_fused(ref: Reference, data: Dict[str, Any]) -> Tuple[AnalyzedContent, CarouselSpec]:
+    """Разбирает совмещённый ответ на AnalyzedContent и CarouselSpec."""
+    analysis_data = data.get("analysis")
+    carousel_data = data.get("carousel")
+    if not isinstance(analysis_data, dict) or not isinstance(carousel_data, dict):
+        raise LlmClientError(f"Fused LLM response must contain 'analysis' and 'carousel' objects: {data}")
+
+    analyzed = _parse_valid_analysis(ref, analysis_data)
+    spec = parse_carousel_spec(analyzed, carousel_data)
+    return analyzed, spec
@@ -1,9 +1,12 @@
 # src/pipeline/analyze_content.py
 from __future__ import annotations
 
-from typing import Optional
+import math
+from typing import Any, Dict, List, Optional, Union
 
-from src.clients.llm_client import LlmClient
+from src.clients.json_stream import FieldCallback
+from src.clients.llm_batch_client import LlmBatchClient
+from src.clients.llm_client import AsyncLlmClient, LlmClient, LlmClientError, LlmResponseInvalid
 from src.models.analyzed_content import AnalyzedContent, ContentType
 from src.models.reference import Reference
 
@@ -17,30 +20,29 @@ SYSTEM_PROMPT = """
 """.strip()
 
 
-def _build_user_prompt(ref: Reference) -> str:
-    title = ref.title or ""
-    desc = ref.caption_or_description or ""
-    transcript = ""
+def _transcript_text(ref: Reference) -> str:
     raw_transcript = None
     if ref.raw:
         # Пытаемся найти транскрипт в разных полях
         raw_transcript = ref.raw.get("transcript") or ref.raw.get("subtitle") or ref.raw.get("captions")
+    return raw_transcript if isinstance(raw_transcript, str) else ""
+
 
-    if isinstance(raw_transcript, str):
-        transcript = raw_transcript
+def _content_block(ref: Reference) -> str:
+    """Заголовок, описание и транскрипт видео одним блоком для промпта."""
+    title = ref.title or ""
+    desc = ref.caption_or_description or ""
+    transcript = _transcript_text(ref)
 
-    text_block = "\n\n".join(
+    return "\n\n".join(
         part for part in [f"Заголовок: {title}", f"Описание: {desc}", f"Транскрипт: {transcript}"] if part.strip()
     )
 
-    return f"""
-Проанализируй следующий контент (видео с YouTube про Wildberries):
 
-{text_block}
-
-Нужен результат в следующем JSON-формате:
-
-{{
+# Формат и требования к анализу — общие для отдельного и совмещённого
+# (analyze_and_generate) промптов, разбираются одним _parse_analysis
+ANALYSIS_JSON_FORMAT = """
+{
   "summary": "краткое резюме видео (2-3 предложения, на русском)",
   "key_points": [
     "тезис 1 (для отдельного слайда карусели, кратко и понятно)",
@@ -51,50 +53,148 @@ def _build_user_prompt(ref: Reference) -> str:
   "target_audience_score": 0.0,
   "usefulness_score": 0.0,
   "suggested_carousel_angle": "формулировка для карусели, например: '7 ошибок новичка на Wildberries'"
-}}
+}
+""".strip()
 
-Требования:
+ANALYSIS_REQUIREMENTS = """
 - Думай о ЦА: человек, который хочет запустить бизнес на Wildberries с нуля.
 - target_audience_score — от 0 до 1, где 1 — максимально полезно для такого новичка.
 - usefulness_score — общая полезность контента, от 0 до 1.
 - key_points должны быть 6–12 штук, каждый — отдельная мысль для слайда.
 - content_type выбери один из перечисленных вариантов.
+""".strip()
+
+
+def _build_user_prompt(ref: Reference) -> str:
+    return f"""
+Проанализируй следующий контент (видео с YouTube про Wildberries):
+
+{_content_block(ref)}
+
+Нужен результат в следующем JSON-формате:
+
+{ANALYSIS_JSON_FORMAT}
+
+Требования:
+{ANALYSIS_REQUIREMENTS}
 - Ответ верни ТОЛЬКО как валидный JSON.
 """.strip()
 
 
-def analyze_reference(ref: Reference, llm_client: LlmClient) -> AnalyzedContent:
+def analyze_reference(
+    ref: Reference,
+    llm_client: LlmClient,
+    *,
+    on_field: Optional[FieldCallback] = None,
+    model: Optional[str] = None,
+) -> AnalyzedContent:
     """
     Анализирует один Reference и возвращает структурированное описание контента
     под карусель.
 
     Предполагается, что ref caption_or_description уже заполнено,
     а транскрипт (если есть) лежит в ref.raw["transcript"].
+
+    on_field — ответ читается потоком, поля (summary, key_points, ...)
+    отдаются по мере готовности. model — модель вместо модели клиента.
     """
     user_prompt = _build_user_prompt(ref)
-    llm_resp = llm_client.complete_json(SYSTEM_PROMPT, user_prompt)
-    data = llm_resp.parsed
 
-    summary = data.get("summary", "").strip()
-    key_points = [kp.strip() for kp in data.get("key_points", []) if isinstance(kp, str) and kp.strip()]
-    ctype_raw = (data.get("content_type") or "other").lower()
+    # В кэш попадает только полный ответ: негодный не должен возвращаться на повторах
+    def validate(parsed: Dict[str, Any]) -> Any:
+        return _parse_valid_analysis(ref, parsed)
 
-    try:
-        content_type = ContentType(ctype_raw)
-    except ValueError:
-        content_type = ContentType.OTHER
+    if on_field is None:
+        llm_resp = llm_client.complete_json(SYSTEM_PROMPT, user_prompt, model=model, validate=validate)
+    else:
+        llm_resp = llm_client.complete_json_stream(
+            SYSTEM_PROMPT, user_prompt, on_field=on_field, model=model, validate=validate
+        )
+    return _parse_analysis(ref, llm_resp.parsed)
 
+
+async def analyze_reference_async(ref: Reference, llm_client: AsyncLlmClient) -> AnalyzedContent:
+    """
+    То же, что analyze_reference, через AsyncLlmClient: пачку референсов
+    можно анализировать одновременно (asyncio.gather) в пределах лимитов клиента.
+    """
+    user_prompt = _build_user_prompt(ref)
+    llm_resp = await llm_client.complete_json(
+        SYSTEM_PROMPT, user_prompt, validate=lambda parsed: _parse_valid_analysis(ref, parsed)
+    )
+    return _parse_analysis(ref, llm_resp.parsed)
+
+
+def analyze_references_batch(
+    refs: List[Reference],
+    batch_client: LlmBatchClient,
+) -> List[Union[AnalyzedContent, Exception]]:
+    """
+    Офлайн-анализ пачки референсов одним запросом к Batch API.
+
+    Промпты те же, что у analyze_reference; custom_id — индекс референса,
+    поэтому дубликаты URL не путаются. Транскрипты refs уже должны укладываться
+    в LLM_TRANSCRIPT_TOKEN_BUDGET (condense_reference / condense_reference_async). Возвращает результаты (или исключения)
+    в порядке refs, как asyncio.gather(..., return_exceptions=True).
+    """
+    by_id = {f"ref-{idx}": ref for idx, ref in enumerate(refs)}
+    requests = [(custom_id, SYSTEM_PROMPT, _build_user_prompt(ref)) for custom_id, ref in by_id.items()]
+    responses = batch_client.complete_json_batch(
+        requests, validate=lambda custom_id, parsed: _parse_valid_analysis(by_id[custom_id], parsed)
+    )
+
+    results: List[Union[AnalyzedContent, Exception]] = []
+    for idx, ref in enumerate(refs):
+        llm_resp = responses.get(f"ref-{idx}") or LlmClientError(f"No batch result for {ref.url}")
+        if isinstance(llm_resp, Exception):
+            results.append(llm_resp)
+            continue
+        try:
+            results.append(_parse_analysis(ref, llm_resp.parsed))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+def _text(value: Any) -> str:
+    """Строковое поле ответа модели; null, числа и прочее — пустая строка."""
+    return value.strip() if isinstance(value, str) else ""
+
+
+def _score(value: Any) -> Optional[float]:
+    """Оценка 0..1 из ответа модели; None — поля нет или это не число."""
+    if isinstance(value, bool):
+        return None
     try:
-        target_audience_score = float(data.get("target_audience_score") or 0.0)
+        score = float(value)
     except (TypeError, ValueError):
-        target_audience_score = 0.0
+        return None
+    return score if math.isfinite(score) else None
+
+
+def _parse_analysis(ref: Reference, data: Dict[str, Any]) -> AnalyzedContent:
+    """
+    Превращает JSON-ответ модели в AnalyzedContent.
+
+    Поля неверного типа не роняют разбор: текст становится пустым, оценка — 0.0
+    (а ModelRouter по raw_llm_output считает такой ответ невалидным).
+    """
+    if not isinstance(data, dict):
+        raise LlmClientError(f"LLM analysis must be a JSON object: {data}")
+
+    summary = _text(data.get("summary"))
+    key_points_raw = data.get("key_points")
+    key_points = [_text(kp) for kp in key_points_raw if _text(kp)] if isinstance(key_points_raw, list) else []
+    ctype_raw = _text(data.get("content_type")).lower() or "other"
 
     try:
-        usefulness_score = float(data.get("usefulness_score") or 0.0)
-    except (TypeError, ValueError):
-        usefulness_score = 0.0
+        content_type = ContentType(ctype_raw)
+    except ValueError:
+        content_type = ContentType.OTHER
 
-    suggested_angle = data.get("suggested_carousel_angle", "").strip()
+    target_audience_score = _score(data.get("target_audience_score"))
+    usefulness_score = _score(data.get("usefulness_score"))
+    suggested_angle = _text(data.get("suggested_carousel_angle"))
 
     return AnalyzedContent(
         reference_url=ref.url,
@@ -102,13 +202,42 @@ def analyze_reference(ref: Reference, llm_client: LlmClient) -> AnalyzedContent:
         summary=summary,
         key_points=key_points,
         content_type=content_type,
-        target_audience_score=target_audience_score,
-        usefulness_score=usefulness_score,
+        target_audience_score=target_audience_score if target_audience_score is not None else 0.0,
+        usefulness_score=usefulness_score if usefulness_score is not None else 0.0,
         suggested_carousel_angle=suggested_angle,
-        raw_llm_output=llm_resp.parsed,
+        raw_llm_output=data,
     )
 
 
+def _analysis_problem(analyzed: AnalyzedContent) -> Optional[str]:
+    """
+    Чем анализ негоден (None — годен): нет резюме или тезисов, оценки нет,
+    она не число или вне 0..1. Общая проверка для кэша LLM и ModelRouter.
+    """
+    if not analyzed.summary:
+        return "empty summary"
+    if not analyzed.key_points:
+        return "no key_points"
+    # _parse_analysis подставляет 0.0 вместо пропущенной оценки — смотрим в сам ответ, если он есть
+    raw = analyzed.raw_llm_output
+    for key in ("usefulness_score", "target_audience_score"):
+        score = _score(raw.get(key)) if raw is not None else getattr(analyzed, key)
+        if score is None:
+            return f"{key} is missing or not a number"
+        if not 0.0 <= score <= 1.0:
+            return f"{key} is out of 0..1"
+    return None
+
+
+def _parse_valid_analysis(ref: Reference, data: Dict[str, Any]) -> AnalyzedContent:
+    """_parse_analysis, отвергающий негодный анализ (LlmResponseInvalid)."""
+    analyzed = _parse_analysis(ref, data)
+    problem = _analysis_problem(analyzed)
+    if problem is not None:
+        raise LlmResponseInvalid(f"LLM analysis rejected: {problem}")
+    return analyzed
+
+
 def create_dummy_analysis(ref: Reference) -> AnalyzedContent:
     """Создает заглушку анализа для dry-run режима."""
     return AnalyzedContent(
@@ -0,0 +1,199 @@
+# src/pipeline/condense_transcript.py
+from __future__ import annotations
+
+import asyncio
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from typing import List
+
+from src.clients.llm_client import AsyncLlmClient, LlmClient, estimate_tokens
+from src.config.settings import Settings
+from src.models.reference import Reference
+from src.pipeline.analyze_content import _transcript_text
+
+
+SYSTEM_PROMPT = """
+Ты сжимаешь фрагменты транскриптов русскоязычных видео про Wildberries.
+Сохраняй конкретику: шаги, цифры, суммы, сроки, названия инструментов, ошибки и советы.
+Убирай повторы, приветствия, рекламу и отступления.
+
+Отвечай строго в формате JSON, без пояснений, без дополнительного текста.
+""".strip()
+
+# Описанию видео достаётся не больше этой доли бюджета, остальное — транскрипту
+DESCRIPTION_BUDGET_SHARE = 0.25
+# Сколько раз сжимать уже сжатое, прежде чем просто обрезать
+MAX_REDUCE_ROUNDS = 3
+
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s+|\n+")
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Обрезает текст по оценке estimate_tokens, стараясь не рвать слово."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    cut = text[: max(0, max_tokens - 1) * 3]
+    space = cut.rfind(" ")
+    if space > len(cut) // 2:
+        cut = cut[:space]
+    return cut.rstrip() + "…"
+
+
+def split_into_chunks(text: str, max_tokens: int) -> List[str]:
+    """
+    Режет текст на куски не больше max_tokens по границам предложений.
+    Предложение длиннее куска (транскрипты без пунктуации) режется по словам.
+    """
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+
+    def flush() -> None:
+        nonlocal current, current_tokens
+        if current:
+            chunks.append(" ".join(current))
+        current, current_tokens = [], 0
+
+    for sentence in _SENTENCE_END.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        pieces = [sentence]
+        if estimate_tokens(sentence) > max_tokens:
+            words = sentence.split()
+            step = max(1, len(words) * max_tokens // estimate_tokens(sentence))
+            pieces = [" ".join(words[i:i + step]) for i in range(0, len(words), step)]
+        for piece in pieces:
+            tokens = estimate_tokens(piece)
+            if current and current_tokens + tokens > max_tokens:
+                flush()
+            current.append(piece)
+            current_tokens += tokens
+    flush()
+    return chunks
+
+
+def _build_chunk_prompt(chunk: str, part: int, total: int, max_words: int) -> str:
+    return f"""
+Фрагмент {part} из {total} транскрипта видео:
+
+{chunk}
+
+Сожми фрагмент до {max_words} слов, не теряя полезных для новичка на Wildberries деталей.
+
+Верни JSON строго в формате:
+
+{{
+  "summary": "сжатый текст фрагмента"
+}}
+""".strip()
+
+
+def _round_plan(text: str, budget: int, chunk_tokens: int) -> tuple:
+    """Куски очередного раунда и сколько слов можно потратить на сжатие каждого."""
+    chunks = split_into_chunks(text, chunk_tokens)
+    # ~2 токена на русское слово по оценке estimate_tokens
+    max_words = max(50, budget // len(chunks) // 2)
+    return chunks, max_words
+
+
+def _summary_of(parsed: dict) -> str:
+    summary = parsed.get("summary")
+    return summary.strip() if isinstance(summary, str) else ""
+
+
+def condense_text(
+    text: str,
+    budget: int,
+    llm_client: LlmClient,
+    *,
+    chunk_tokens: int,
+    max_concurrency: int = 1,
+) -> str:
+    """
+    Map-reduce: текст в пределах budget возвращается как есть; длинный режется
+    на куски, куски сжимаются параллельно, сжатые склеиваются — и так, пока
+    результат не влезет в бюджет (не больше MAX_REDUCE_ROUNDS раундов).
+    """
+    for _ in range(MAX_REDUCE_ROUNDS):
+        if estimate_tokens(text) <= budget:
+            return text
+        chunks, max_words = _round_plan(text, budget, chunk_tokens)
+
+        def summarize(item: tuple) -> str:
+            idx, chunk = item
+            resp = llm_client.complete_json(SYSTEM_PROMPT, _build_chunk_prompt(chunk, idx, len(chunks), max_words))
+            return _summary_of(resp.parsed)
+
+        with ThreadPoolExecutor(max_workers=min(max_concurrency, len(chunks)), thread_name_prefix="condense") as pool:
+            # map сохраняет порядок кусков
+            summaries = list(pool.map(summarize, enumerate(chunks, start=1)))
+        text = "\n\n".join(s for s in summaries if s)
+    return truncate_to_tokens(text, budget)
+
+
+async def condense_text_async(text: str, budget: int, llm_client: AsyncLlmClient, *, chunk_tokens: int) -> str:
+    """То же, что condense_text; параллельность кусков держит AsyncLlmClient."""
+    for _ in range(MAX_REDUCE_ROUNDS):
+        if estimate_tokens(text) <= budget:
+            return text
+        chunks, max_words = _round_plan(text, budget, chunk_tokens)
+        responses = await asyncio.gather(
+            *(
+                llm_client.complete_json(SYSTEM_PROMPT, _build_chunk_prompt(chunk, idx, len(chunks), max_words))
+                for idx, chunk in enumerate(chunks, start=1)
+            )
+        )
+        text = "\n\n".join(s for s in (_summary_of(r.parsed) for r in responses) if s)
+    return truncate_to_tokens(text, budget)
+
+
+def _fit_description(settings: Settings, ref: Reference) -> tuple:
+    """Обрезанное описание и бюджет, оставшийся транскрипту."""
+    budget = settings.llm.transcript_token_budget
+    desc = truncate_to_tokens(ref.caption_or_description or "", int(budget * DESCRIPTION_BUDGET_SHARE))
+    return desc, max(1, budget - estimate_tokens(desc))
+
+
+def _with_content(ref: Reference, desc: str, transcript: str) -> Reference:
+    if desc == (ref.caption_or_description or "") and transcript == _transcript_text(ref):
+        return ref
+    print(
+        f"Condense: {ref.url}: transcript {estimate_tokens(_transcript_text(ref))} -> "
+        f"{estimate_tokens(transcript)} tokens"
+    )
+    # Исходный ref (с полным транскриптом) не меняется — копия идёт только в промпт анализа
+    return replace(
+        ref,
+        caption_or_description=desc or ref.caption_or_description,
+        raw={**(ref.raw or {}), "transcript": transcript},
+    )
+
+
+def condense_reference(settings: Settings, ref: Reference, llm_client: LlmClient) -> Reference:
+    """
+    Reference, у которого описание и транскрипт укладываются в LLM_TRANSCRIPT_TOKEN_BUDGET:
+    короткие видео возвращаются без изменений, длинные транскрипты сжимаются condense_text.
+    """
+    desc, budget = _fit_description(settings, ref)
+    transcript = condense_text(
+        _transcript_text(ref),
+        budget,
+        llm_client,
+        chunk_tokens=settings.llm.transcript_chunk_tokens,
+        max_concurrency=settings.llm.transcript_max_concurrency,
+    )
+    return _with_content(ref, desc, transcript)
+
+
+async def condense_reference_async(settings: Settings, ref: Reference, llm_client: AsyncLlmClient) -> Reference:
+    """Асинхронный вариант condense_reference (для AsyncLlmClient)."""
+    desc, budget = _fit_description(settings, ref)
+    transcript = await condense_text_async(
+        _transcript_text(ref),
+        budget,
+        llm_client,
+        chunk_tokens=settings.llm.transcript_chunk_tokens,
+    )
+    return _with_content(ref, desc, transcript)
@@ -1,12 +1,14 @@
 # src/pipeline/fetch_refs.py
 from __future__ import annotations
 
-from typing import Iterable, List, Optional
-from urllib.parse import parse_qs, urlparse, urlunparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
 
 from src.config.settings import Settings
 from src.models.reference import Reference
-from src.clients.youtube_client import YouTubeClient
+from src.clients.youtube_client import AsyncYouTubeClient, YouTubeClient, normalize_youtube_url as _normalize_youtube_url
+from src.storage.reference_cache import ReferenceCache
+from src.storage.search_cache import SearchCache
 
 
 # Базовый список запросов под нишу "WB с нуля"
@@ -23,54 +25,106 @@ DEFAULT_YOUTUBE_QUERIES: List[str] = [
 ]
 
 
-def fetch_all_refs(settings: Settings) -> List[Reference]:
+def create_youtube_client(settings: Settings) -> YouTubeClient:
+    """YouTubeClient с кэшами Reference и поисковой выдачи на диске (если они включены в настройках)."""
+    return YouTubeClient(
+        settings,
+        reference_cache=ReferenceCache.from_settings(settings),
+        search_cache=SearchCache.from_settings(settings),
+    )
+
+
+def create_async_youtube_client(settings: Settings) -> AsyncYouTubeClient:
+    """Асинхронный вариант create_youtube_client с теми же кэшами."""
+    return AsyncYouTubeClient(
+        settings,
+        reference_cache=ReferenceCache.from_settings(settings),
+        search_cache=SearchCache.from_settings(settings),
+    )
+
+
+def _queries_to_run(settings: Settings) -> List[str]:
+    # Ограничиваем количество запросов
+    return DEFAULT_YOUTUBE_QUERIES[:settings.limits.youtube_max_queries]
+
+
+def fetch_all_refs(settings: Settings, yt_client: Optional[YouTubeClient] = None) -> List[Reference]:
     """
     Пайплайн сбора референсов.
     
     Собирает данные из YouTube (в будущем TikTok/Instagram).
     Использует лимиты из settings.limits.
+    yt_client можно передать снаружи, чтобы переиспользовать пул соединений.
+
+    Запросы запускаются параллельно (не больше settings.fetch.search_max_in_flight
+    запусков актора одновременно), так что время сбора — примерно время самого
+    долгого запуска. Результаты склеиваются в порядке запросов.
     """
-    yt_client = YouTubeClient(settings)
-    
-    all_references: List[Reference] = []
-    
-    # Ограничиваем количество запросов
-    max_queries = settings.limits.youtube_max_queries
-    queries_to_run = DEFAULT_YOUTUBE_QUERIES[:max_queries]
-    
-    for query in queries_to_run:
+    yt_client = yt_client or create_youtube_client(settings)
+    queries = _queries_to_run(settings)
+
+    def search(query: str) -> List[Reference]:
         try:
             # Ограничиваем количество результатов на запрос
-            references = yt_client.fetch_search_videos(
+            return yt_client.fetch_search_videos(
                 query=query,
                 max_results=settings.limits.youtube_max_results
             )
-            all_references.extend(references)
         except Exception as e:
             print(f"Ошибка при сборе YouTube по запросу '{query}': {e}")
+            return []
+
+    max_in_flight = min(settings.fetch.search_max_in_flight, len(queries))
+    if max_in_flight <= 1:
+        results = [search(query) for query in queries]
+    else:
+        with ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="yt-search") as pool:
+            # map сохраняет порядок запросов — дедупликация остаётся детерминированной
+            results = list(pool.map(search, queries))
 
+    all_references: List[Reference] = []
+    for references in results:
+        all_references.extend(references)
     return _deduplicate_by_url(all_references)
 
 
-def fetch_reference_for_url(settings: Settings, url: str) -> Optional[Reference]:
+def fetch_reference_for_url(
+    settings: Settings,
+    url: str,
+    yt_client: Optional[YouTubeClient] = None,
+    try_direct: bool = True,
+) -> Optional[Reference]:
     """
     Пытается найти Reference для конкретного URL среди результатов поиска.
     Не делает дополнительных API вызовов сверх fetch_all_refs.
+    try_direct=False — пропустить прямой fetch (его уже сделал батч).
     """
     print(f"Searching for specific URL: {url}...")
-    yt_client = YouTubeClient(settings)
+    yt_client = yt_client or create_youtube_client(settings)
     normalized_target = _normalize_youtube_url(url)
 
     # Сначала пробуем прямой fetch по URL
-    direct_ref = yt_client.fetch_video_by_url(url)
-    if direct_ref:
-        if _normalize_youtube_url(direct_ref.url) == normalized_target:
-            print(f"Success! Found via direct fetch: {direct_ref.title}")
-            return direct_ref
-        # Если Apify вернул другое видео, все равно продолжаем искать
-        print("Direct fetch returned non-matching URL, fallback to search.")
-
-    refs = fetch_all_refs(settings)
+    if try_direct:
+        direct_ref = yt_client.fetch_video_by_url(url)
+        if direct_ref:
+            if _normalize_youtube_url(direct_ref.url) == normalized_target:
+                print(f"Success! Found via direct fetch: {direct_ref.title}")
+                return direct_ref
+            # Если Apify вернул другое видео, все равно продолжаем искать
+            print("Direct fetch returned non-matching URL, fallback to search.")
+
+    # Поиск по индексу закэшированной выдачи вместо повторных поисков
+    if yt_client.search_cache is not None:
+        cached_ref = yt_client.search_cache.lookup(url)
+        if cached_ref is not None:
+            print(f"Success! Found in cached search results: {cached_ref.title}")
+            return cached_ref
+        max_results = settings.limits.youtube_max_results
+        if all(yt_client.cached_search(q, max_results=max_results) is not None for q in _queries_to_run(settings)):
+            print(f"Reference for URL {url} not found in fresh cached search results.")
+            return None
+
+    refs = fetch_all_refs(settings, yt_client)
     
     for ref in refs:
         if _normalize_youtube_url(ref.url) == normalized_target:
@@ -81,6 +135,37 @@ def fetch_reference_for_url(settings: Settings, url: str) -> Optional[Reference]
     return None
 
 
+def fetch_references_for_urls(
+    settings: Settings,
+    urls: List[str],
+    yt_client: Optional[YouTubeClient] = None,
+) -> Dict[str, Optional[Reference]]:
+    """
+    Пакетный вариант fetch_reference_for_url: все URL уходят в один запуск
+    актора, ответ сопоставляется с URL по нормализованному виду.
+    Для ненайденных — один общий поиск (fetch_all_refs) вместо поиска на каждый URL.
+
+    Возвращает словарь url -> Reference (None, если не нашли).
+    """
+    yt_client = yt_client or create_youtube_client(settings)
+    found = yt_client.fetch_videos_by_urls(urls)
+    result: Dict[str, Optional[Reference]] = {
+        url: found.get(_normalize_youtube_url(url)) for url in urls
+    }
+
+    missing = [url for url, ref in result.items() if ref is None]
+    if missing and yt_client.search_cache is not None:
+        for url in missing:
+            result[url] = yt_client.search_cache.lookup(url)
+        missing = [url for url in missing if result[url] is None]
+    if missing:
+        print(f"Batch fetch: {len(missing)} URL(s) not returned by actor, fallback to search.")
+        by_url = {_normalize_youtube_url(ref.url): ref for ref in fetch_all_refs(settings, yt_client)}
+        for url in missing:
+            result[url] = by_url.get(_normalize_youtube_url(url))
+    return result
+
+
 def _deduplicate_by_url(refs: Iterable[Reference]) -> List[Reference]:
     """Удаляет дубликаты по URL."""
     seen = set()
@@ -91,30 +176,3 @@ def _deduplicate_by_url(refs: Iterable[Reference]) -> List[Reference]:
         seen.add(ref.url)
         result.append(ref)
     return result
-
-
-def _normalize_youtube_url(url: str) -> str:
-    """
-    Нормализует YouTube URL для сравнения:
-    - youtu.be/<id> -> youtube.com/watch?v=<id>
-    - удаляет лишние query-параметры, оставляя v
-    """
-    if not url:
-        return ""
-    parsed = urlparse(url)
-
-    if "youtu.be" in parsed.netloc:
-        video_id = parsed.path.strip("/")
-        if video_id:
-            return f"https://www.youtube.com/watch?v={video_id}"
-
-    if "youtube.com" in parsed.netloc:
-        qs = parse_qs(parsed.query)
-        video_id = (qs.get("v") or [""])[0]
-        if video_id:
-            normalized = parsed._replace(path="/watch", query=f"v={video_id}", fragment="")
-            return urlunparse(normalized)
-
-    # fallback: убираем query/fragment
-    normalized = parsed._replace(query="", fragment="")
-    return urlunparse(normalized).rstrip("/")
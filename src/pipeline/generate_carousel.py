@@ -1,11 +1,12 @@
 # src/pipeline/generate_carousel.py
 from __future__ import annotations
 
-from typing import List
+from typing import Any, Callable, Dict, List, Optional
 
 from src.clients.llm_client import LlmClient
 from src.models.analyzed_content import AnalyzedContent
 from src.models.carousel import CarouselSpec, Slide, SlideType
+from src.pipeline.analyze_content import _text
 
 
 SYSTEM_PROMPT = """
@@ -23,6 +24,42 @@ SYSTEM_PROMPT = """
 """.strip()
 
 
+# Требования и формат карусели — общие для отдельного и совмещённого
+# (analyze_and_generate) промптов, разбираются одним parse_carousel_spec
+CAROUSEL_STRUCTURE_REQUIREMENTS = """
+Требования к структуре:
+- Слайд 1: сильный HOOK (зацепка). Короткий заголовок + подзаголовок, который обещает пользу.
+- Слайды 2–N-1: CONTENT — раскрывают ключевые тезисы, один слайд = одна мысль.
+- Последний слайд: CTA — чёткий призыв к действию (подписаться, сохранить, написать, перейти и т.п.).
+- Всего 6–10 слайдов.
+- Текст на слайдах — максимально конкретный, без воды, 1–3 короткие строки.
+- Пиши понятным языком для новичка, который боится «сложного бизнеса».
+""".strip()
+
+CAROUSEL_JSON_FORMAT = """
+{
+  "main_angle": "общий заголовок/угол карусели",
+  "slides": [
+    {
+      "type": "hook" | "content" | "cta",
+      "title": "краткий заголовок слайда",
+      "body": "2-3 строки текста, раскрывающие идею слайда",
+      "visual_hint": "краткая подсказка по визуалу (иконки, иллюстрации, композиция)",
+      "show_expert_photo": true | false
+    }
+  ],
+  "caption": "предложенный текст для описания поста",
+  "hashtags": ["#wildberries", "#бизнеснанолях", "..."]
+}
+""".strip()
+
+CAROUSEL_PHOTO_REQUIREMENTS = """
+- Слайд 1 (HOOK) почти всегда show_expert_photo = true.
+- Последний слайд (CTA) часто show_expert_photo = true.
+- Для остальных слайдов решай по здравому смыслу.
+""".strip()
+
+
 def build_carousel_prompt(ac: AnalyzedContent) -> str:
     """
     Формирует user‑prompt для генерации структуры карусели.
@@ -43,35 +80,14 @@ def build_carousel_prompt(ac: AnalyzedContent) -> str:
 
 Нужно создать структуру Instagram-карусели (до 10 слайдов) для новичка на WB.
 
-Требования к структуре:
-- Слайд 1: сильный HOOK (зацепка). Короткий заголовок + подзаголовок, который обещает пользу.
-- Слайды 2–N-1: CONTENT — раскрывают ключевые тезисы, один слайд = одна мысль.
-- Последний слайд: CTA — чёткий призыв к действию (подписаться, сохранить, написать, перейти и т.п.).
-- Всего 6–10 слайдов.
-- Текст на слайдах — максимально конкретный, без воды, 1–3 короткие строки.
-- Пиши понятным языком для новичка, который боится «сложного бизнеса».
+{CAROUSEL_STRUCTURE_REQUIREMENTS}
 
 Верни JSON строго в формате:
 
-{{
-  "main_angle": "общий заголовок/угол карусели",
-  "slides": [
-    {{
-      "type": "hook" | "content" | "cta",
-      "title": "краткий заголовок слайда",
-      "body": "2-3 строки текста, раскрывающие идею слайда",
-      "visual_hint": "краткая подсказка по визуалу (иконки, иллюстрации, композиция)",
-      "show_expert_photo": true | false
-    }}
-  ],
-  "caption": "предложенный текст для описания поста",
-  "hashtags": ["#wildberries", "#бизнеснанолях", "..."]
-}}
+{CAROUSEL_JSON_FORMAT}
 
 Требования:
-- Слайд 1 (HOOK) почти всегда show_expert_photo = true.
-- Последний слайд (CTA) часто show_expert_photo = true.
-- Для остальных слайдов решай по здравому смыслу.
+{CAROUSEL_PHOTO_REQUIREMENTS}
 
 Очень важно:
 - Соблюдай структуру JSON.
@@ -80,49 +96,57 @@ def build_carousel_prompt(ac: AnalyzedContent) -> str:
 """.strip()
 
 
-def generate_carousel_spec(ac: AnalyzedContent, llm_client: LlmClient) -> CarouselSpec:
+def generate_carousel_spec(
+    ac: AnalyzedContent,
+    llm_client: LlmClient,
+    *,
+    on_slide: Optional[Callable[[Slide], None]] = None,
+    model: Optional[str] = None,
+) -> CarouselSpec:
     """
     Генерирует структуру карусели по результатам анализа контента.
+
+    on_slide — ответ читается потоком, и каждый слайд отдаётся сразу,
+    как только модель его дописала (до конца всей генерации).
+    model — модель вместо модели клиента (LLM_CAROUSEL_MODEL).
     """
     user_prompt = build_carousel_prompt(ac)
-    resp = llm_client.complete_json(SYSTEM_PROMPT, user_prompt)
-    data = resp.parsed
+    def validate(parsed: Dict[str, Any]) -> Any:
+        return parse_carousel_spec(ac, parsed)
+
+    if on_slide is None:
+        resp = llm_client.complete_json(SYSTEM_PROMPT, user_prompt, model=model, validate=validate)
+    else:
+        def on_item(key: str, idx: int, value: Any) -> None:
+            slide = _slide_from_dict(idx + 1, value) if key == "slides" else None
+            if slide is not None:
+                on_slide(slide)
+
+        resp = llm_client.complete_json_stream(
+            SYSTEM_PROMPT, user_prompt, on_item=on_item, model=model, validate=validate
+        )
+    return parse_carousel_spec(ac, resp.parsed)
 
-    main_angle = data.get("main_angle") or ac.suggested_carousel_angle or ac.title
 
-    slides_data = data.get("slides") or []
+def parse_carousel_spec(ac: AnalyzedContent, data: Dict[str, Any]) -> CarouselSpec:
+    """
+    Собирает CarouselSpec из JSON-ответа модели (формат CAROUSEL_JSON_FORMAT).
+    """
+    main_angle = _text(data.get("main_angle")) or ac.suggested_carousel_angle or ac.title
+
+    slides_data = data.get("slides")
+    if not isinstance(slides_data, list):
+        slides_data = []
     slides: List[Slide] = []
 
     for idx, s in enumerate(slides_data, start=1):
-        raw_type = (s.get("type") or "content").lower()
-        try:
-            slide_type = SlideType(raw_type)
-        except ValueError:
-            slide_type = SlideType.CONTENT
-
-        title = s.get("title", "").strip()
-        body = s.get("body", "").strip()
-        visual_hint = (s.get("visual_hint") or "").strip() or None
-        show_expert_photo = bool(s.get("show_expert_photo", False))
+        slide = _slide_from_dict(idx, s)
+        if slide is not None:
+            slides.append(slide)
 
-        # простая защита от пустых слайдов
-        if not title and not body:
-            continue
-
-        slides.append(
-            Slide(
-                index=idx,
-                type=slide_type,
-                title=title,
-                body=body,
-                visual_hint=visual_hint,
-                show_expert_photo=show_expert_photo,
-            )
-        )
-
-    caption = (data.get("caption") or "").strip() or None
-    hashtags_raw = data.get("hashtags") or []
-    hashtags = [h.strip() for h in hashtags_raw if isinstance(h, str) and h.strip()] or None
+    caption = _text(data.get("caption")) or None
+    hashtags_raw = data.get("hashtags")
+    hashtags = [_text(h) for h in hashtags_raw if _text(h)] if isinstance(hashtags_raw, list) else []
 
     return CarouselSpec(
         reference_url=ac.reference_url,
@@ -130,7 +154,36 @@ def generate_carousel_spec(ac: AnalyzedContent, llm_client: LlmClient) -> Carous
         content_type=ac.content_type.value,
         slides=slides,
         caption=caption,
-        hashtags=hashtags,
+        hashtags=hashtags or None,
+    )
+
+
+def _slide_from_dict(idx: int, s: Any) -> Optional[Slide]:
+    """Слайд из элемента "slides"; None — для пустых и битых элементов."""
+    if not isinstance(s, dict):
+        return None
+    raw_type = _text(s.get("type")).lower() or "content"
+    try:
+        slide_type = SlideType(raw_type)
+    except ValueError:
+        slide_type = SlideType.CONTENT
+
+    title = _text(s.get("title"))
+    body = _text(s.get("body"))
+    visual_hint = _text(s.get("visual_hint")) or None
+    show_expert_photo = bool(s.get("show_expert_photo", False))
+
+    # простая защита от пустых слайдов
+    if not title and not body:
+        return None
+
+    return Slide(
+        index=idx,
+        type=slide_type,
+        title=title,
+        body=body,
+        visual_hint=visual_hint,
+        show_expert_photo=show_expert_photo,
     )
 
 
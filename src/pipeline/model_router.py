@@ -0,0 +1,223 @@
+# src/pipeline/model_router.py
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional, Tuple, TypeVar
+
+from src.clients.json_stream import FieldCallback, replay
+from src.clients.llm_client import LlmClient, LlmClientError, LlmResponseInvalid
+from src.config.settings import Settings
+from src.models.analyzed_content import AnalyzedContent
+from src.models.carousel import CarouselSpec, Slide
+from src.models.reference import Reference
+from src.pipeline.analyze_and_generate import analyze_and_generate
+from src.pipeline.analyze_content import _analysis_problem, analyze_reference
+from src.pipeline.generate_carousel import generate_carousel_spec
+
+
+T = TypeVar("T")
+
+
+@dataclass
+class ModelStats:
+    """Вызовы одной модели: сколько, сколько упало и суммарное время."""
+
+    calls: int = 0
+    failures: int = 0
+    total_sec: float = 0.0
+
+    @property
+    def avg_sec(self) -> float:
+        return self.total_sec / self.calls if self.calls else 0.0
+
+
+@dataclass
+class RouterStats:
+    """Решения маршрутизатора: сколько анализов ушло на сильную модель и почему."""
+
+    analyses: int = 0
+    escalations: int = 0
+    reasons: Dict[str, int] = field(default_factory=dict)
+    models: Dict[str, ModelStats] = field(default_factory=dict)
+
+    @property
+    def escalation_rate(self) -> float:
+        return self.escalations / self.analyses if self.analyses else 0.0
+
+    def report(self) -> str:
+        reasons = ", ".join(f"{k}={v}" for k, v in sorted(self.reasons.items())) or "-"
+        models = "; ".join(
+            f"{name}: {s.calls} call(s), {s.failures} failed, avg {s.avg_sec:.1f}s"
+            for name, s in sorted(self.models.items())
+        )
+        return (
+            f"Model router: {self.analyses} analysis(es), {self.escalations} escalated "
+            f"({self.escalation_rate:.0%}; {reasons}); {models}"
+        )
+
+
+class ModelRouter:
+    """
+    Выбор модели по стадиям конвейера.
+
+    Анализ сначала идёт на дешёвую быструю модель (analysis_model). На сильную
+    (strong_model) он повторяется, только если ответ не прошёл проверку
+    (битый JSON, ответ отверг парсер, нет резюме или тезисов, оценки нет,
+    она не число или вне 0..1) или одна из оценок
+    (usefulness_score, target_audience_score) попала в «неуверенный» диапазон
+    uncertain_band. Карусель генерируется своей моделью (carousel_model).
+
+    В совмещённом режиме (analyze_and_generate) анализ и карусель — один запрос,
+    поэтому он целиком идёт по каскаду моделей анализа, а carousel_model
+    там не используется.
+
+    Итоговая модель и причина эскалации пишутся в AnalyzedContent
+    (llm_model, escalation_reason) и сохраняются вместе с прогоном; сводка
+    решений и время ответа каждой модели копятся в stats (потокобезопасно).
+    """
+
+    def __init__(
+        self,
+        llm_client: LlmClient,
+        *,
+        analysis_model: Optional[str] = None,
+        strong_model: Optional[str] = None,
+        carousel_model: Optional[str] = None,
+        uncertain_band: Tuple[float, float] = (0.4, 0.7),
+    ) -> None:
+        self.llm_client = llm_client
+        self.analysis_model = analysis_model or llm_client.model
+        self.strong_model = strong_model if strong_model != self.analysis_model else None
+        self.carousel_model = carousel_model or llm_client.model
+        self.uncertain_band = uncertain_band
+        self.stats = RouterStats()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, settings: Settings, llm_client: LlmClient) -> "ModelRouter":
+        """Модели и диапазон эскалации из настроек (LLM_*_MODEL, LLM_ESCALATION_SCORE_*)."""
+        cfg = settings.llm
+        return cls(
+            llm_client,
+            analysis_model=cfg.analysis_model,
+            strong_model=cfg.analysis_strong_model,
+            carousel_model=cfg.carousel_model,
+            uncertain_band=(cfg.escalation_score_min, cfg.escalation_score_max),
+        )
+
+    def escalation_reason(self, analyzed: AnalyzedContent) -> Optional[str]:
+        """Почему анализ дешёвой модели нужно перепроверить сильной (None — не нужно)."""
+        if _analysis_problem(analyzed) is not None:
+            return "invalid"
+        scores = (analyzed.usefulness_score, analyzed.target_audience_score)
+        low, high = self.uncertain_band
+        if any(low <= s <= high for s in scores):
+            return "uncertain_score"
+        return None
+
+    def analyze(self, ref: Reference, *, on_field: Optional[FieldCallback] = None) -> AnalyzedContent:
+        """
+        analyze_reference с каскадом моделей. Потоком (on_field) читается только
+        запрос, ответ которого точно окончательный; если окончательным оказался
+        ответ дешёвой модели, поля отдаются в on_field после проверки.
+        """
+        def run(model: str, final: bool) -> AnalyzedContent:
+            return analyze_reference(ref, self.llm_client, on_field=on_field if final else None, model=model)
+
+        analyzed, streamed = self._cascade(run, lambda result: result)
+        if on_field is not None and not streamed:
+            replay(analyzed.raw_llm_output or {}, on_field)
+        return analyzed
+
+    def analyze_and_generate(
+        self,
+        ref: Reference,
+        *,
+        on_analysis: Optional[Callable[[AnalyzedContent], None]] = None,
+    ) -> Tuple[AnalyzedContent, CarouselSpec]:
+        """Совмещённый режим с тем же каскадом: эскалируется весь запрос целиком."""
+        def run(model: str, final: bool) -> Tuple[AnalyzedContent, CarouselSpec]:
+            return analyze_and_generate(
+                ref, self.llm_client, on_analysis=on_analysis if final else None, model=model
+            )
+
+        (analyzed, spec), streamed = self._cascade(run, lambda result: result[0])
+        if on_analysis is not None and not streamed:
+            on_analysis(analyzed)
+        return analyzed, spec
+
+    def generate_carousel(
+        self,
+        ac: AnalyzedContent,
+        *,
+        on_slide: Optional[Callable[[Slide], None]] = None,
+    ) -> CarouselSpec:
+        return self._timed(
+            self.carousel_model,
+            lambda: generate_carousel_spec(ac, self.llm_client, on_slide=on_slide, model=self.carousel_model),
+        )
+
+    def _cascade(
+        self,
+        run: Callable[[str, bool], T],
+        analysis_of: Callable[[T], AnalyzedContent],
+    ) -> Tuple[T, bool]:
+        """
+        Дешёвая модель, при необходимости — сильная; решение пишется в stats.
+        Возвращает результат и признак, что он получен запуском с final=True
+        (колбэки стриминга уже вызваны).
+        """
+        strong = self.strong_model
+        try:
+            result = self._timed(self.analysis_model, lambda: run(self.analysis_model, strong is None))
+            reason = self.escalation_reason(analysis_of(result)) if strong is not None else None
+        except LlmClientError as exc:
+            if strong is None:
+                self._record(None)
+                raise
+            # Ответ отверг парсер (_analysis_problem) — то же, что "invalid" в escalation_reason
+            reason = "invalid" if isinstance(exc, LlmResponseInvalid) else "invalid_json"
+        except Exception:
+            self._record(None)
+            raise
+
+        self._record(reason)
+        if reason is None:
+            _mark(analysis_of(result), self.analysis_model, None)
+            return result, strong is None
+        print(f"Model router: escalating analysis {self.analysis_model} -> {strong} ({reason})")
+        result = self._timed(strong, lambda: run(strong, True))
+        _mark(analysis_of(result), strong, reason)
+        return result, True
+
+    def _timed(self, model: str, call: Callable[[], T]) -> T:
+        start = time.monotonic()
+        try:
+            result = call()
+        except Exception:
+            self._add_call(model, time.monotonic() - start, failed=True)
+            raise
+        self._add_call(model, time.monotonic() - start, failed=False)
+        return result
+
+    def _add_call(self, model: str, elapsed: float, *, failed: bool) -> None:
+        with self._lock:
+            s = self.stats.models.setdefault(model, ModelStats())
+            s.calls += 1
+            s.total_sec += elapsed
+            if failed:
+                s.failures += 1
+
+    def _record(self, reason: Optional[str]) -> None:
+        with self._lock:
+            self.stats.analyses += 1
+            if reason is not None:
+                self.stats.escalations += 1
+                self.stats.reasons[reason] = self.stats.reasons.get(reason, 0) + 1
+
+
+def _mark(analyzed: AnalyzedContent, model: str, reason: Optional[str]) -> None:
+    analyzed.llm_model = model
+    analyzed.escalation_reason = reason
@@ -1,6 +1,9 @@
 # src/services/export_service.py
 from __future__ import annotations
 
+from typing import Iterable, Iterator
+
+
 def run_to_markdown(run_dict: dict) -> str:
     """
     Преобразует данные прогона в текстовый формат Markdown.
@@ -50,3 +53,16 @@ def run_to_markdown(run_dict: dict) -> str:
             md.append(" ".join(carousel.get("hashtags")))
             
     return "\n".join(md)
+
+
+def runs_to_markdown(runs: Iterable[dict]) -> Iterator[str]:
+    """
+    Потоково экспортирует несколько прогонов в один Markdown-документ.
+    Прогоны читаются по одному, поэтому выгрузку можно отдавать частями.
+    """
+    first = True
+    for run_dict in runs:
+        if not first:
+            yield "\n\n"
+        first = False
+        yield run_to_markdown(run_dict)
@@ -1,21 +1,31 @@
 # src/services/worker_service.py
 from __future__ import annotations
 
+import signal
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 
 from dotenv import load_dotenv
 
-from src.config.settings import Settings
+from src.config.settings import Settings, WorkerSettings
+from src.clients import http_pool
 from src.clients.llm_client import LlmClient
-from src.models.task import TaskStatus, GenerationTask
+from src.clients.youtube_client import YouTubeClient
+from src.models.reference import Reference
+from src.models.task import PipelineMode, TaskStatus, GenerationTask
 from src.models.persisted_run import PersistedRun
-from src.pipeline.fetch_refs import fetch_reference_for_url
-from src.pipeline.analyze_content import analyze_reference, create_dummy_analysis
-from src.pipeline.generate_carousel import generate_carousel_spec, create_dummy_carousel_spec
+from src.pipeline.fetch_refs import create_youtube_client, fetch_reference_for_url, fetch_references_for_urls
+from src.pipeline.analyze_content import create_dummy_analysis
+from src.pipeline.condense_transcript import condense_reference
+from src.pipeline.generate_carousel import create_dummy_carousel_spec
+from src.pipeline.model_router import ModelRouter
+from src.storage.checkpoint_storage import CheckpointStorage
+from src.storage.factory import AnyTaskStorage, create_task_storage
 from src.storage.json_storage import JsonStorage
-from src.storage.task_storage import TaskStorage
 
 
 class NoPendingTasks(Exception):
@@ -23,61 +33,153 @@ class NoPendingTasks(Exception):
     pass
 
 
-def process_one_pending_task(root: Path) -> Optional[GenerationTask]:
+class StageLimits:
+    """
+    Семафоры на одновременные вызовы внешних API по стадиям конвейера:
+    даже при большом пуле задач Apify и LLM получают не больше своих квот.
     """
-    Берёт одну pending-задачу, прогоняет её через весь конвейер
-    и обновляет статус задачи + сохраняет PersistedRun.
 
-    Возвращает обработанную задачу или None, если pending задач нет.
+    def __init__(self, cfg: WorkerSettings) -> None:
+        self.fetch = threading.BoundedSemaphore(cfg.stage_limit(cfg.apify_fetch_concurrency))
+        self.analyze = threading.BoundedSemaphore(cfg.stage_limit(cfg.llm_analyze_concurrency))
+        self.generate = threading.BoundedSemaphore(cfg.stage_limit(cfg.llm_generate_concurrency))
+
+
+@dataclass
+class WorkerContext:
+    """
+    Всё, что воркеру нужно для обработки задач: настройки, клиенты с пулами
+    соединений и хранилища. Создаётся один раз и переиспользуется между задачами.
     """
-    load_dotenv()
-    settings = Settings.from_env()
-    
+
+    settings: Settings
+    task_storage: AnyTaskStorage
+    run_storage: JsonStorage
+    yt_client: YouTubeClient
+    checkpoints: CheckpointStorage
     llm_client: Optional[LlmClient] = None
-    if settings.limits.llm_enabled:
-        try:
-            llm_client = LlmClient()
-        except RuntimeError as e:
-            # Если LLM не настроен, это критическая ошибка для воркера
-            raise RuntimeError(f"LLM client initialization failed: {e}")
+    limits: StageLimits = field(init=False)
+    # выбор модели по стадиям (дешёвая модель для анализа с эскалацией, своя для карусели)
+    router: Optional[ModelRouter] = field(init=False)
 
-    tasks_path = root / "data" / "tasks.jsonl"
-    runs_path = root / "data" / "runs.jsonl"
+    def __post_init__(self) -> None:
+        self.limits = StageLimits(self.settings.worker)
+        self.router = ModelRouter.from_settings(self.settings, self.llm_client) if self.llm_client else None
 
-    task_storage = TaskStorage(tasks_path)
-    storage = JsonStorage(runs_path)
+    @classmethod
+    def create(cls, root: Path) -> "WorkerContext":
+        load_dotenv()
+        settings = Settings.from_env()
 
-    task = task_storage.fetch_next_pending()
-    if task is None:
-        return None
+        llm_client: Optional[LlmClient] = None
+        if settings.limits.llm_enabled:
+            try:
+                llm_client = LlmClient.from_settings(settings)
+            except RuntimeError as e:
+                # Если LLM не настроен, это критическая ошибка для воркера
+                raise RuntimeError(f"LLM client initialization failed: {e}")
+
+        return cls(
+            settings=settings,
+            task_storage=create_task_storage(root / "data"),
+            run_storage=JsonStorage(root / "data" / "runs.jsonl"),
+            yt_client=create_youtube_client(settings),
+            checkpoints=CheckpointStorage(root / "data" / "checkpoints"),
+            llm_client=llm_client,
+        )
 
-    task.status = TaskStatus.IN_PROGRESS
-    task_storage.update_task(task)
+    def close(self) -> None:
+        """Отпускает клиентов; общий пул соединений закрывает владелец процесса (http_pool.close_all)."""
+        if self.router is not None and self.router.stats.analyses:
+            print(self.router.stats.report())
+        self.yt_client.close()
+        if self.llm_client is not None:
+            self.llm_client.close()
 
+
+def process_task(
+    ctx: WorkerContext,
+    task: GenerationTask,
+    ref: Optional[Reference] = None,
+    *,
+    prefetched: bool = False,
+) -> GenerationTask:
+    """
+    Прогоняет уже взятую (IN_PROGRESS) задачу через весь конвейер,
+    обновляет её статус и сохраняет PersistedRun.
+
+    prefetched=True — Reference уже получен пакетным fetch (ref может быть None,
+    если видео не нашлось), повторно в Apify не ходим.
+
+    Результаты fetch и анализа сохраняются в чекпоинт задачи, поэтому
+    повторный запуск (retry) начинает с первой незавершённой стадии.
+
+    В режиме PipelineMode.FUSED (task.pipeline_mode или PIPELINE_MODE)
+    анализ и карусель получаются одним запросом к LLM. С LLM_STREAM=1
+    ответы читаются потоком: анализ сохраняется в чекпоинт, как только готов,
+    слайды логируются по мере генерации.
+    """
+    settings = ctx.settings
     try:
         print(f"Worker service: processing task {task.id} for {task.source_url}")
-        ref = fetch_reference_for_url(settings, task.source_url)
-        if ref is None:
-            raise RuntimeError(f"No Reference found for URL: {task.source_url}. Check if it matches search queries.")
+        checkpoint = ctx.checkpoints.load(task.id)
+        if checkpoint.reference is not None:
+            print(f"Worker service: task {task.id} resumes from checkpoint")
+            ref = checkpoint.reference
+        else:
+            if not prefetched:
+                with ctx.limits.fetch:
+                    ref = fetch_reference_for_url(settings, task.source_url, ctx.yt_client)
+            if ref is None:
+                raise RuntimeError(f"No Reference found for URL: {task.source_url}. Check if it matches search queries.")
+            ctx.checkpoints.save_reference(task.id, ref)
 
         if settings.limits.llm_enabled:
-            analyzed = analyze_reference(ref, llm_client)
-            spec = generate_carousel_spec(analyzed, llm_client)
+            mode = task.pipeline_mode or settings.worker.pipeline_mode
+            stream = settings.llm.stream
+            analyzed = checkpoint.analyzed
+            spec = None
+            if analyzed is None:
+                with ctx.limits.analyze:
+                    # Длинный транскрипт сжимается под LLM_TRANSCRIPT_TOKEN_BUDGET; в чекпоинте остаётся полный
+                    prompt_ref = condense_reference(settings, ref, ctx.llm_client)
+                if mode == PipelineMode.FUSED:
+                    # При стриминге анализ попадает в чекпоинт, пока модель ещё пишет карусель
+                    on_analysis = (lambda a: ctx.checkpoints.save_analyzed(task.id, a)) if stream else None
+                    with ctx.limits.generate:
+                        analyzed, spec = ctx.router.analyze_and_generate(prompt_ref, on_analysis=on_analysis)
+                else:
+                    with ctx.limits.analyze:
+                        analyzed = ctx.router.analyze(prompt_ref)
+                escalated = f", escalated: {analyzed.escalation_reason}" if analyzed.escalation_reason else ""
+                print(f"Worker service: task {task.id} analysed by {analyzed.llm_model}{escalated}")
+                ctx.checkpoints.save_analyzed(task.id, analyzed)
+            if spec is None:
+                # Анализ уже в чекпоинте — дальше только генерация, в любом режиме
+                on_slide = (
+                    (lambda slide: print(f"Worker service: task {task.id} slide {slide.index} ready"))
+                    if stream
+                    else None
+                )
+                with ctx.limits.generate:
+                    spec = ctx.router.generate_carousel(analyzed, on_slide=on_slide)
         else:
             analyzed = create_dummy_analysis(ref)
             spec = create_dummy_carousel_spec(analyzed)
 
+        # created_at окончательно проставит append_run под блокировкой хранилища
         run = PersistedRun(
             created_at=datetime.utcnow(),
             reference=ref,
             analyzed=analyzed,
             carousel=spec,
         )
-        storage.append_run(run)
+        ctx.run_storage.append_run(run)
 
         task.status = TaskStatus.DONE
         task.run_id = run.created_at.isoformat()
-        task_storage.update_task(task)
+        ctx.task_storage.update_task(task)
+        ctx.checkpoints.clear(task.id)
         print(f"Worker service: task {task.id} completed successfully")
         return task
 
@@ -85,5 +187,170 @@ def process_one_pending_task(root: Path) -> Optional[GenerationTask]:
         print(f"Worker service: task {task.id} failed: {exc}")
         task.status = TaskStatus.FAILED
         task.error = str(exc)
-        task_storage.update_task(task)
+        ctx.task_storage.update_task(task)
         raise
+
+
+def prefetch_references(ctx: WorkerContext, tasks: List[GenerationTask]) -> List[Optional[Reference]]:
+    """
+    Получает Reference для пачки задач одним запуском Apify-актора.
+    Задачи, у которых Reference уже есть в чекпоинте, в запуск не попадают.
+    Возвращает список в порядке задач.
+    """
+    urls = [t.source_url for t in tasks if ctx.checkpoints.load(t.id).reference is None]
+    if not urls:
+        return [None] * len(tasks)
+    with ctx.limits.fetch:
+        by_url = fetch_references_for_urls(ctx.settings, urls, ctx.yt_client)
+    return [by_url.get(t.source_url) for t in tasks]
+
+
+def process_next(ctx: WorkerContext) -> Optional[GenerationTask]:
+    """Берёт одну pending-задачу и обрабатывает её. None — если очередь пуста."""
+    # Одна атомарная операция: два воркера не возьмут одну и ту же задачу
+    task = ctx.task_storage.claim_next_pending()
+    if task is None:
+        return None
+    return process_task(ctx, task)
+
+
+def process_one_pending_task(root: Path) -> Optional[GenerationTask]:
+    """
+    Берёт одну pending-задачу, прогоняет её через весь конвейер
+    и обновляет статус задачи + сохраняет PersistedRun.
+
+    Возвращает обработанную задачу или None, если pending задач нет.
+    """
+    ctx = WorkerContext.create(root)
+    try:
+        return process_next(ctx)
+    finally:
+        ctx.close()
+
+
+def run_worker(root: Path, stop_event: Optional[threading.Event] = None) -> int:
+    """
+    Долгоживущий воркер: один набор клиентов и настроек на всё время работы,
+    задачи обрабатываются пулом из settings.worker.concurrency потоков,
+    пока не придёт SIGTERM/SIGINT.
+
+    Большую часть времени задача ждёт Apify и LLM по сети, поэтому потоки
+    здесь достаточно; отдельные лимиты стадий (StageLimits) не дают
+    превысить квоты провайдеров.
+
+    Сигнал не прерывает задачи в работе: они дорабатываются, после чего
+    воркер выходит. Когда очередь пуста, интервал опроса растёт
+    от poll_interval_sec до max_idle_interval_sec.
+
+    Возвращает число успешно обработанных задач.
+    """
+    stop_event = stop_event or threading.Event()
+
+    def _request_stop(signum, _frame) -> None:
+        print(f"Worker: got signal {signum}, draining in-flight tasks and stopping...")
+        stop_event.set()
+
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, _request_stop)
+        signal.signal(signal.SIGINT, _request_stop)
+
+    http_pool.configure()
+    ctx = WorkerContext.create(root)
+    cfg = ctx.settings.worker
+    batch_size = cfg.batch_size
+    processed = 0
+    processed_lock = threading.Lock()
+    # Свободные слоты пула: новую задачу берём из очереди, только когда есть кому её обработать
+    slots = threading.BoundedSemaphore(cfg.concurrency)
+    idle_interval = cfg.poll_interval_sec
+
+    def _on_done(future: Future) -> None:
+        nonlocal processed
+        slots.release()
+        if future.exception() is None:
+            with processed_lock:
+                processed += 1
+
+    def _submit(task: GenerationTask, ref: Optional[Reference], prefetched: bool) -> None:
+        try:
+            future = executor.submit(process_task, ctx, task, ref, prefetched=prefetched)
+        except RuntimeError:
+            # Пул уже закрывается (shutdown) — дорабатываем задачу в текущем потоке
+            future = Future()
+            try:
+                future.set_result(process_task(ctx, task, ref, prefetched=prefetched))
+            except Exception as e:
+                future.set_exception(e)
+        future.add_done_callback(_on_done)
+
+    def _dispatch_batch(tasks: List[GenerationTask]) -> None:
+        """Один запуск актора на всю пачку, дальше каждая задача идёт своим потоком."""
+        try:
+            refs = prefetch_references(ctx, tasks)
+        except Exception as e:
+            # Пачка упала целиком — каждая задача попробует получить свой Reference сама
+            print(f"Worker: batch fetch failed, falling back to per-task fetch: {e}")
+            for task in tasks:
+                _submit(task, None, prefetched=False)
+            return
+        for task, ref in zip(tasks, refs):
+            _submit(task, ref, prefetched=True)
+
+    def _claim_batch() -> List[GenerationTask]:
+        """
+        Берёт из очереди до batch_size задач. Один слот уже захвачен,
+        остальные добираем без ожидания — пачка не больше свободной части пула.
+        """
+        tasks: List[GenerationTask] = []
+        while True:
+            try:
+                task = ctx.task_storage.claim_next_pending()
+            except Exception as e:
+                if not tasks:
+                    raise
+                print(f"Worker: failed to claim a task: {e}")
+                task = None
+            if task is None:
+                break
+            tasks.append(task)
+            if len(tasks) >= batch_size or not slots.acquire(blocking=False):
+                return tasks
+        # Очередь кончилась — отдаём лишний слот, захваченный под следующую задачу
+        slots.release()
+        return tasks
+
+    print(
+        f"Worker: started with {cfg.concurrency} thread(s), fetch batch up to {batch_size} "
+        f"(poll every {cfg.poll_interval_sec}s, up to {cfg.max_idle_interval_sec}s when idle)"
+    )
+    executor = ThreadPoolExecutor(max_workers=cfg.concurrency, thread_name_prefix="worker")
+    try:
+        while not stop_event.is_set():
+            if not slots.acquire(timeout=cfg.poll_interval_sec):
+                continue
+            try:
+                tasks = _claim_batch()
+            except Exception as e:
+                slots.release()
+                print(f"Worker: failed to claim a task: {e}")
+                stop_event.wait(idle_interval)
+                continue
+
+            if not tasks:
+                stop_event.wait(idle_interval)
+                idle_interval = min(idle_interval * 2, cfg.max_idle_interval_sec)
+                continue
+
+            idle_interval = cfg.poll_interval_sec
+            # Ошибка задачи записывается в неё же в process_task — пул продолжает работу
+            if len(tasks) == 1:
+                executor.submit(process_task, ctx, tasks[0]).add_done_callback(_on_done)
+            else:
+                print(f"Worker: claimed a batch of {len(tasks)} task(s)")
+                executor.submit(_dispatch_batch, tasks)
+    finally:
+        executor.shutdown(wait=True)
+        ctx.close()
+        http_pool.close_all()
+        print(f"Worker: stopped, processed {processed} task(s)")
+    return processed
@@ -0,0 +1,89 @@
+# src/storage/checkpoint_storage.py
+from __future__ import annotations
+
+import json
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from src.models.analyzed_content import AnalyzedContent
+from src.models.reference import Reference
+from src.models.serialization import to_serializable
+from src.storage.serialization import analyzed_from_dict, reference_from_dict
+
+
+@dataclass
+class TaskCheckpoint:
+    """
+    Промежуточные результаты задачи: что уже получено и оплачено.
+    None — стадия ещё не пройдена.
+    """
+
+    reference: Optional[Reference] = None
+    analyzed: Optional[AnalyzedContent] = None
+
+
+class CheckpointStorage:
+    """
+    Чекпоинты стадий конвейера: по JSON-файлу на задачу (<task_id>.json).
+
+    После fetch сохраняется Reference, после анализа — AnalyzedContent.
+    Повторный запуск задачи (retry) продолжает с первой незавершённой стадии,
+    не тратя заново Apify и LLM. После успешного завершения чекпоинт удаляется.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, task_id: str) -> Path:
+        return self.root / f"{task_id}.json"
+
+    def _read(self, task_id: str) -> dict:
+        try:
+            with self._path(task_id).open("r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"Warning: Failed to read checkpoint for task {task_id}: {e}")
+            return {}
+
+    def _write(self, task_id: str, data: dict) -> None:
+        # tmp + os.replace: недописанный файл не подменит рабочий чекпоинт
+        path = self._path(task_id)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with tmp_path.open("w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def load(self, task_id: str) -> TaskCheckpoint:
+        data = self._read(task_id)
+        checkpoint = TaskCheckpoint()
+        try:
+            if data.get("reference"):
+                checkpoint.reference = reference_from_dict(data["reference"])
+            if data.get("analyzed"):
+                checkpoint.analyzed = analyzed_from_dict(data["analyzed"])
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"Warning: Broken checkpoint for task {task_id}, starting over: {e}")
+            return TaskCheckpoint()
+        return checkpoint
+
+    def save_reference(self, task_id: str, reference: Reference) -> None:
+        # Новый Reference делает старый анализ неактуальным
+        self._write(task_id, {"reference": to_serializable(reference)})
+
+    def save_analyzed(self, task_id: str, analyzed: AnalyzedContent) -> None:
+        data = self._read(task_id)
+        data["analyzed"] = to_serializable(analyzed)
+        self._write(task_id, data)
+
+    def clear(self, task_id: str) -> None:
+        try:
+            self._path(task_id).unlink()
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,26 @@
+# src/storage/factory.py
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import Union
+
+from src.storage.sqlite_task_storage import SqliteTaskStorage
+from src.storage.task_storage import TaskStorage
+
+
+AnyTaskStorage = Union[TaskStorage, SqliteTaskStorage]
+
+
+def create_task_storage(data_dir: Path) -> AnyTaskStorage:
+    """
+    Создаёт хранилище задач по переменной окружения TASK_STORAGE_BACKEND:
+    - "jsonl" (по умолчанию) — data/tasks.jsonl;
+    - "sqlite" — data/tasks.sqlite3 (WAL), для нескольких воркеров.
+    """
+    backend = os.getenv("TASK_STORAGE_BACKEND", "jsonl").lower()
+    if backend == "sqlite":
+        return SqliteTaskStorage(data_dir / "tasks.sqlite3")
+    if backend != "jsonl":
+        raise RuntimeError(f"Unknown TASK_STORAGE_BACKEND: {backend}")
+    return TaskStorage(data_dir / "tasks.jsonl")
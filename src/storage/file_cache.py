@@ -0,0 +1,142 @@
+# src/storage/file_cache.py
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+
+class FileCache:
+    """
+    Кэш на диске: по JSON-файлу на ключ (имя — sha256 ключа).
+
+    - ttl_sec: записи старше этого возраста считаются промахом и удаляются
+      (None — без срока годности);
+    - max_entries: при превышении удаляются давно не читанные записи (LRU),
+      время последнего обращения хранится в mtime файла.
+
+    Запись атомарна (временный файл + os.replace), поэтому кэш можно делить
+    между потоками и процессами без блокировок: в худшем случае одна запись
+    перетрёт другую такой же.
+    """
+
+    def __init__(self, root: Path, *, ttl_sec: Optional[float] = None, max_entries: int = 10_000) -> None:
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.ttl_sec = ttl_sec
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._count = sum(1 for _ in self.root.glob("*.json"))
+
+    def _path(self, key: str) -> Path:
+        return self.root / f"{hashlib.sha256(key.encode('utf-8')).hexdigest()}.json"
+
+    def _count_hit(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key: str) -> Optional[Any]:
+        """Значение по ключу или None (нет записи, истёк TTL, файл битый)."""
+        path = self._path(key)
+        try:
+            with path.open("r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            self._count_hit(False)
+            return None
+        except (json.JSONDecodeError, OSError):
+            self._discard(path)
+            self._count_hit(False)
+            return None
+
+        # Совпадение хэшей разных ключей маловероятно, но проверить дёшево
+        expired = self.ttl_sec is not None and time.time() - entry.get("stored_at", 0) > self.ttl_sec
+        if entry.get("key") != key or expired:
+            if expired:
+                self._discard(path)
+            self._count_hit(False)
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self._count_hit(True)
+        return entry.get("value")
+
+    def put(self, key: str, value: Any) -> None:
+        path = self._path(key)
+        is_new = not path.exists()
+        fd, tmp_name = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"key": key, "stored_at": time.time(), "value": value}, f, ensure_ascii=False)
+            os.replace(tmp_name, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_name)
+            except OSError:
+                pass
+            raise
+
+        if is_new:
+            with self._lock:
+                self._count += 1
+                over_limit = self._count > self.max_entries
+            if over_limit:
+                self._evict()
+
+    def delete(self, key: str) -> None:
+        self._discard(self._path(key))
+
+    def clear(self) -> None:
+        for path in self.root.glob("*.json"):
+            self._discard(path)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": self._count,
+            }
+
+    def _discard(self, path: Path) -> None:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            return
+        except OSError:
+            return
+        with self._lock:
+            self._count = max(self._count - 1, 0)
+
+    def _evict(self) -> None:
+        """Удаляет самые давно читанные записи, оставляя ~90% от max_entries."""
+        entries = []
+        for path in self.root.glob("*.json"):
+            try:
+                entries.append((path.stat().st_mtime, path))
+            except FileNotFoundError:
+                continue
+        with self._lock:
+            self._count = len(entries)
+        # Запас, чтобы не сканировать каталог на каждой следующей записи
+        keep = int(self.max_entries * 0.9)
+        if len(entries) <= keep:
+            return
+        entries.sort()
+        for _, path in entries[: len(entries) - keep]:
+            self._discard(path)
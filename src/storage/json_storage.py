@@ -1,69 +1,736 @@
 # src/storage/json_storage.py
 from __future__ import annotations
 
+import gzip
 import json
+import lzma
+import os
+import shutil
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone
+from itertools import islice
 from pathlib import Path
 from contextlib import contextmanager
-from typing import List
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
 
 from src.models.persisted_run import PersistedRun
 
 
+# Расширения запечатанных сегментов по типу сжатия
+SEGMENT_SUFFIXES = {"gzip": ".gz", "lzma": ".xz", None: ""}
+
+# Запись индекса: (сегмент или None для активного файла, offset, length)
+IndexEntry = Tuple[Optional[str], int, int]
+
+
 class JsonStorage:
     """
-    Хранит результаты прогонов пайплайна в одном JSONL‑файле:
+    Хранит результаты прогонов пайплайна в JSONL‑файлах:
     одна строка = один PersistedRun.
+
+    Запись идёт в активный сегмент (`runs.jsonl`). Когда он дорастает до
+    max_segment_bytes (или его первая запись старше max_segment_age),
+    сегмент запечатывается: сжимается в `runs.000001.jsonl.gz` и попадает
+    в манифест `runs.manifest.json` вместе с диапазоном created_at.
+    Все читатели прозрачно проходят и по активному, и по сжатым сегментам.
+
+    Рядом лежит sidecar-индекс `<file>.idx` (JSONL: run_id -> сегмент/offset/length),
+    чтобы достать прогон по id одним seek + одним json.loads.
+    run_id = created_at.isoformat(), как его записывает воркер в задачу.
+    Для сжатых сегментов offset — в распакованном потоке, так что seek
+    стоит распаковки не более одного сегмента.
     """
 
-    def __init__(self, path: Path) -> None:
+    DEFAULT_MAX_SEGMENT_BYTES = 64 * 1024 * 1024
+
+    def __init__(
+        self,
+        path: Path,
+        *,
+        max_segment_bytes: Optional[int] = DEFAULT_MAX_SEGMENT_BYTES,
+        max_segment_age: Optional[timedelta] = None,
+        compression: Optional[str] = "gzip",
+    ) -> None:
+        if compression not in SEGMENT_SUFFIXES:
+            raise ValueError(f"Unsupported segment compression: {compression}")
         self.path = path
         self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segment_age = max_segment_age
+        self.compression = compression
+
+        # Отдельный lock-файл: при ротации активный файл удаляется,
+        # и блокировка на нём самом потерялась бы вместе с ним.
+        self.lock_path = path.with_name(path.name + ".lock")
+        self.index_path = path.with_name(path.name + ".idx")
+        self.manifest_path = path.with_name(path.stem + ".manifest.json")
+
+        self._index: Dict[str, IndexEntry] = {}
+        self._index_read = 0      # сколько байт .idx уже прочитано
+        self._index_id: Optional[tuple] = None
+        self._indexed_until = 0   # до какого смещения индекс покрывает активный файл
+        self._sealed_entries = 0  # сколько записей индекса указывают на запечатанные сегменты
+        self._rebuilt_for: Optional[tuple] = None  # _index_state() на момент последней пересборки
+        # flock защищает от других процессов, мьютекс — индекс от соседних потоков
+        self._mutex = threading.RLock()
+
+        with self._locked(exclusive=True):
+            self._recover_locked()
 
-    @staticmethod
     @contextmanager
-    def _locked_open(path: Path, mode: str):
+    def _locked(self, exclusive: bool):
         """
-        Открывает файл и, если доступно, ставит файловую блокировку.
+        Блокирует хранилище целиком через lock-файл, если flock доступен.
         Нужна для защиты от гонок при параллельных записях/чтениях.
         """
-        f = path.open(mode, encoding="utf-8")
-        try:
+        with self._mutex:
+            f = self.lock_path.open("a", encoding="utf-8")
             try:
-                import fcntl
-                lock_type = fcntl.LOCK_EX if "w" in mode or "a" in mode else fcntl.LOCK_SH
-                fcntl.flock(f.fileno(), lock_type)
-            except Exception:
-                # Если блокировка недоступна, продолжаем без неё
-                pass
-            yield f
-        finally:
-            try:
-                import fcntl
-                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
-            except Exception:
-                pass
-            f.close()
+                try:
+                    import fcntl
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                except Exception:
+                    # Если блокировка недоступна, продолжаем без неё
+                    pass
+                yield
+            finally:
+                try:
+                    import fcntl
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                except Exception:
+                    pass
+                f.close()
 
     def append_run(self, run: PersistedRun) -> None:
-        data = run.to_serializable_dict()
-        line = json.dumps(data, ensure_ascii=False)
-        with self._locked_open(self.path, "a") as f:
-            f.write(line + "\n")
+        """
+        Дописывает прогон. created_at (он же run_id) проставляется здесь,
+        под той же блокировкой, что и запись: иначе параллельные воркеры
+        допишут прогоны не в порядке created_at, а на этом порядке стоят
+        iter_runs (ранний выход по since/until) и курсор /runs.
+        """
+        with self._locked(exclusive=True):
+            self._recover_locked()
+            self._drop_torn_tail()
+            self._maybe_rotate()
+            run.created_at = self._next_created_at()
+            data = run.to_serializable_dict()
+            line = (json.dumps(data, ensure_ascii=False) + "\n").encode("utf-8")
+            with self.path.open("ab") as out:
+                offset = out.seek(0, os.SEEK_END)
+                out.write(line)
+            # Хвост, дописанный в обход индекса (старый код, ручные правки), индексируем заодно
+            self._load_index()
+            entries = self._scan_entries(None, self._indexed_until, offset)
+            entries.append((data["created_at"], None, offset, len(line)))
+            self._write_index_entries(entries)
 
     def load_runs(self, limit: int | None = None) -> List[dict]:
         """
-        Простой reader на будущее. Возвращает сырые dict.
+        Простой reader на будущее. Возвращает сырые dict (первые limit штук).
+        Для больших файлов лучше iter_runs().
+        """
+        return list(islice(self.iter_runs(), limit))
+
+    def iter_runs(
+        self,
+        *,
+        reverse: bool = False,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        content_type: Optional[str] = None,
+        platform: Optional[str] = None,
+        min_usefulness: Optional[float] = None,
+    ) -> Iterator[dict]:
+        """
+        Лениво отдаёт прогоны по одному, в прямом или обратном порядке.
+
+        Память не зависит от размера файла: читаем построчно (или блоками
+        с конца при reverse=True). append_run проставляет created_at под
+        блокировкой записи, так что файл упорядочен по времени, поэтому
+        при выходе за since/until чтение обрывается, а не идёт до конца,
+        а сегменты вне диапазона по манифесту не открываются вовсе.
+        Фильтры since/until включительные, по created_at.
+
+        Блокировка на всё время итерации не держится: на старте фиксируем
+        манифест и размер активного файла — дописанное позже в выдачу не попадёт.
+        """
+        since = _as_naive_utc(since)
+        until = _as_naive_utc(until)
+
+        with self._locked(exclusive=False):
+            segments = self._read_manifest()
+            try:
+                active: Optional[BinaryIO] = self.path.open("rb")
+            except FileNotFoundError:
+                active = None
+            end = os.fstat(active.fileno()).st_size if active is not None else 0
+
+        sources: List[Optional[dict]] = [*segments, None]
+        if reverse:
+            sources.reverse()
+
+        try:
+            for segment in sources:
+                if segment is not None:
+                    first = _parse_iso(segment.get("first_created_at"))
+                    last = _parse_iso(segment.get("last_created_at"))
+                    if since is not None and last is not None and last < since:
+                        if reverse:
+                            return
+                        continue
+                    if until is not None and first is not None and first > until:
+                        if not reverse:
+                            return
+                        continue
+                    lines = self._iter_segment_lines(segment["name"], reverse)
+                elif active is not None:
+                    lines = _iter_lines_reversed(active, end) if reverse else _iter_lines(active, end)
+                else:
+                    continue
+
+                for line in lines:
+                    obj = _loads_line(line)
+                    if obj is None:
+                        continue
+                    created_at = _parse_created_at(obj)
+                    if created_at is not None:
+                        if since is not None and created_at < since:
+                            if reverse:
+                                return
+                            continue
+                        if until is not None and created_at > until:
+                            if not reverse:
+                                return
+                            continue
+                    if not _run_matches(obj, content_type, platform, min_usefulness):
+                        continue
+                    yield obj
+        finally:
+            if active is not None:
+                active.close()
+
+    def load_last_run(self) -> Optional[dict]:
         """
-        runs: List[dict] = []
-        if not self.path.exists():
-            return runs
-        with self._locked_open(self.path, "r") as f:
-            for i, line in enumerate(f):
-                if limit is not None and i >= limit:
+        Возвращает последний прогон, читая файл с конца блоками.
+
+        Стоимость не зависит от размера файла: читаем только хвост
+        до последней полной строки.
+        """
+        return next(self.iter_runs(reverse=True), None)
+
+    def get_run(self, run_id: str) -> Optional[dict]:
+        """
+        Возвращает прогон по run_id (created_at.isoformat()) или None.
+        """
+        if self._index_incomplete():
+            # .idx удалён или обрезан, а сегменты на месте — индекс пересобирается целиком
+            self.rebuild_index()
+        elif self._index_lags():
+            # Данные дописаны в обход индекса (старый код, первый запуск) — догоняем
+            self._catch_up_index()
+        obj = self._read_indexed(run_id)
+        if obj is not None and obj.get("created_at") != run_id:
+            # Индекс не соответствует данным — перестраиваем и пробуем ещё раз
+            self.rebuild_index()
+            obj = self._read_indexed(run_id)
+        elif obj is None and self._needs_rebuild_on_miss():
+            # Промах: один раз на текущий набор сегментов и индекс перепроверяем пересборкой
+            self.rebuild_index()
+            obj = self._read_indexed(run_id)
+        return obj or None
+
+    def rotate(self) -> None:
+        """Принудительно запечатывает активный сегмент (если он не пуст)."""
+        with self._locked(exclusive=True):
+            self._recover_locked()
+            self._drop_torn_tail()
+            if self._active_size() > 0:
+                self._rotate_locked()
+
+    def rebuild_index(self) -> None:
+        """Перестраивает sidecar-индекс по всем сегментам и активному файлу."""
+        with self._locked(exclusive=True):
+            self._recover_locked()
+            self._rebuild_index_locked()
+            self._rebuilt_for = self._index_state()
+
+    def _rebuild_index_locked(self) -> None:
+        entries: List[Tuple[str, Optional[str], int, int]] = []
+        for segment in self._read_manifest():
+            entries.extend(self._scan_entries(segment["name"], 0, None))
+        entries.extend(self._scan_entries(None, 0, self._active_size()))
+        self._rewrite_index(entries)
+
+    # --- Сегменты и манифест ---
+
+    def _active_size(self) -> int:
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    def _read_manifest(self) -> List[dict]:
+        try:
+            with self.manifest_path.open("r", encoding="utf-8") as f:
+                return json.load(f).get("segments", [])
+        except FileNotFoundError:
+            return []
+
+    def _write_manifest(self, segments: List[dict]) -> None:
+        tmp_path = self.manifest_path.with_name(self.manifest_path.name + ".tmp")
+        with tmp_path.open("w", encoding="utf-8") as f:
+            json.dump({"segments": segments}, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+
+    @staticmethod
+    def _segment_compression(name: str) -> Optional[str]:
+        for compression, suffix in SEGMENT_SUFFIXES.items():
+            if suffix and name.endswith(suffix):
+                return compression
+        return None
+
+    def _open_segment(self, name: str) -> BinaryIO:
+        path = self.path.with_name(name)
+        compression = self._segment_compression(name)
+        if compression == "gzip":
+            return gzip.open(path, "rb")
+        if compression == "lzma":
+            return lzma.open(path, "rb")
+        return path.open("rb")
+
+    def _open_for_write(self, path: Path) -> BinaryIO:
+        if self.compression == "gzip":
+            return gzip.open(path, "wb")
+        if self.compression == "lzma":
+            return lzma.open(path, "wb")
+        return path.open("wb")
+
+    def _iter_segment_lines(self, name: str, reverse: bool) -> Iterator[bytes]:
+        with self._open_segment(name) as f:
+            if not reverse:
+                yield from _iter_lines(f, None)
+                return
+            if self._segment_compression(name) is None:
+                yield from _iter_lines_reversed(f, f.seek(0, os.SEEK_END))
+                return
+            # По сжатому потоку назад не пройти — распаковываем во временный файл
+            with tempfile.TemporaryFile() as tmp:
+                shutil.copyfileobj(f, tmp)
+                yield from _iter_lines_reversed(tmp, tmp.tell())
+
+    def _next_created_at(self) -> datetime:
+        """
+        Текущее время, но строго позже последнего записанного прогона
+        (часы могут отстать или совпасть до микросекунды). Под блокировкой.
+        """
+        now = datetime.utcnow()
+        last: Optional[datetime] = None
+        size = self._active_size()
+        if size > 0:
+            with self.path.open("rb") as f:
+                for line in _iter_lines_reversed(f, size):
+                    obj = _loads_line(line)
+                    if obj is not None:
+                        last = _parse_created_at(obj)
+                        break
+        else:
+            segments = self._read_manifest()
+            last = _parse_iso(segments[-1].get("last_created_at")) if segments else None
+        if last is not None and now <= last:
+            now = last + timedelta(microseconds=1)
+        return now
+
+    def _drop_torn_tail(self) -> None:
+        """
+        Отрезает недописанную строку упавшего писателя (после последнего \\n)
+        в активном файле, иначе новая запись склеится с ней. Под эксклюзивной блокировкой.
+        """
+        size = self._active_size()
+        if size == 0:
+            return
+        with self.path.open("r+b") as f:
+            pos = size
+            while pos > 0:
+                step = min(64 * 1024, pos)
+                f.seek(pos - step)
+                chunk = f.read(step)
+                newline = chunk.rfind(b"\n")
+                if newline != -1:
+                    pos = pos - step + newline + 1
                     break
-                line = line.strip()
+                pos -= step
+            if pos < size:
+                print(f"Warning: Dropping torn tail of {self.path} at offset {pos}")
+                f.truncate(pos)
+
+    def _maybe_rotate(self) -> None:
+        """Запечатывает активный сегмент, если он вырос или устарел. Под блокировкой."""
+        size = self._active_size()
+        if size == 0:
+            return
+        due = self.max_segment_bytes is not None and size >= self.max_segment_bytes
+        if not due and self.max_segment_age is not None:
+            with self.path.open("rb") as f:
+                first_line = next(_iter_lines(f, size), None)
+            obj = _loads_line(first_line) if first_line else None
+            first = _parse_created_at(obj) if obj is not None else None
+            due = first is not None and datetime.utcnow() - first >= self.max_segment_age
+        if due:
+            self._rotate_locked()
+
+    def _sealing_path(self, seq: int) -> Path:
+        return self.path.with_name(f"{self.path.stem}.{seq:06d}{self.path.suffix}.sealing")
+
+    def _rotate_locked(self) -> None:
+        """
+        Запечатывает активный сегмент. Сначала активный файл атомарно
+        переименовывается в `runs.NNNNNN.jsonl.sealing`, и только потом
+        пишутся сжатый сегмент и манифест: в любой момент записи лежат либо
+        в .sealing, либо в сегменте из манифеста (дубль возможен только
+        вместе с .sealing, и _recover_locked его убирает), но никогда
+        одновременно в активном файле и в сегменте.
+        """
+        segments = self._read_manifest()
+        seq = (segments[-1]["seq"] if segments else 0) + 1
+
+        # Перед переносом убеждаемся, что индекс покрывает весь активный файл
+        self._load_index()
+        self._write_index_entries(self._scan_entries(None, self._indexed_until, self._active_size()))
+
+        sealing_path = self._sealing_path(seq)
+        os.replace(self.path, sealing_path)
+        name = self._seal(sealing_path, seq, segments)
+
+        # Записи активного файла теперь живут в запечатанном сегменте
+        self._rewrite_index([
+            (run_id, name if segment is None else segment, offset, length)
+            for run_id, (segment, offset, length) in self._index.items()
+        ])
+        os.remove(sealing_path)
+
+    def _seal(self, sealing_path: Path, seq: int, segments: List[dict]) -> str:
+        """Сжимает .sealing-файл в сегмент seq и дописывает его в манифест."""
+        name = f"{self.path.stem}.{seq:06d}{self.path.suffix}{SEGMENT_SUFFIXES[self.compression]}"
+        segment_path = self.path.with_name(name)
+        tmp_path = segment_path.with_name(name + ".tmp")
+
+        # Настоящие min/max, а не первая/последняя строка: в файлах, записанных
+        # до того, как created_at стал проставляться под блокировкой, порядок не гарантирован
+        first: Optional[datetime] = None
+        last: Optional[datetime] = None
+        count = 0
+        with sealing_path.open("rb") as src, self._open_for_write(tmp_path) as dst:
+            for raw in src:
+                dst.write(raw)
+                line = raw.strip()
                 if not line:
                     continue
-                obj = json.loads(line)
-                runs.append(obj)
-        return runs
+                count += 1
+                try:
+                    created_at = _parse_created_at(json.loads(line))
+                except json.JSONDecodeError:
+                    created_at = None
+                if created_at is not None:
+                    first = created_at if first is None else min(first, created_at)
+                    last = created_at if last is None else max(last, created_at)
+        os.replace(tmp_path, segment_path)
+
+        segments.append({
+            "seq": seq,
+            "name": name,
+            "compression": self.compression,
+            "first_created_at": first.isoformat() if first else None,
+            "last_created_at": last.isoformat() if last else None,
+            "count": count,
+            "raw_bytes": os.path.getsize(sealing_path),
+            "stored_bytes": os.path.getsize(segment_path),
+        })
+        segments.sort(key=lambda segment: segment["seq"])
+        self._write_manifest(segments)
+        return name
+
+    def _recover_locked(self) -> None:
+        """
+        Доводит до конца ротацию, прерванную падением процесса. Под блокировкой.
+
+        Остался .sealing-файл: если его сегмента ещё нет в манифесте —
+        запечатываем заново, если есть — файл просто лишний. Индекс в обоих
+        случаях мог остаться со смещениями в бывшем активном файле, поэтому
+        он перестраивается.
+        """
+        prefix = f"{self.path.stem}."
+        suffix = f"{self.path.suffix}.sealing"
+        leftovers = sorted(self.path.parent.glob(f"{prefix}*{suffix}"))
+        if not leftovers:
+            return
+        for sealing_path in leftovers:
+            try:
+                seq = int(sealing_path.name[len(prefix):-len(suffix)])
+            except ValueError:
+                continue
+            segments = self._read_manifest()
+            if not any(segment["seq"] == seq for segment in segments):
+                print(f"Warning: Resuming interrupted rotation of {sealing_path}")
+                self._seal(sealing_path, seq, segments)
+            os.remove(sealing_path)
+        self._rebuild_index_locked()
+
+    # --- Индекс ---
+
+    def _index_state(self) -> tuple:
+        """
+        Набор сегментов и identity файла индекса: меняется при ротации и пересборке.
+        Вызывается под блокировкой.
+        """
+        names = tuple(segment["name"] for segment in self._read_manifest())
+        try:
+            st = os.stat(self.index_path)
+        except FileNotFoundError:
+            return names, None
+        return names, (st.st_dev, st.st_ino)
+
+    def _needs_rebuild_on_miss(self) -> bool:
+        with self._locked(exclusive=False):
+            return self._rebuilt_for != self._index_state()
+
+    def _index_incomplete(self) -> bool:
+        """
+        Индекс покрывает меньше записей, чем лежит в сегментах по манифесту.
+        Для одного и того же состояния пересборка не повторяется: в сегменте
+        могут быть строки без created_at, которые в индекс не попадают.
+        """
+        with self._locked(exclusive=False):
+            self._load_index()
+            sealed = sum(segment.get("count", 0) for segment in self._read_manifest())
+            return self._sealed_entries < sealed and self._rebuilt_for != self._index_state()
+
+    def _index_lags(self) -> bool:
+        with self._locked(exclusive=False):
+            self._load_index()
+            return self._indexed_until < self._active_size()
+
+    def _catch_up_index(self) -> None:
+        with self._locked(exclusive=True):
+            self._load_index()
+            self._write_index_entries(self._scan_entries(None, self._indexed_until, self._active_size()))
+
+    def _read_indexed(self, run_id: str) -> Optional[dict]:
+        with self._locked(exclusive=False):
+            self._load_index()
+            loc = self._index.get(run_id)
+            if loc is None:
+                return None
+            segment, offset, length = loc
+            try:
+                f = self._open_segment(segment) if segment is not None else self.path.open("rb")
+            except FileNotFoundError:
+                return {}
+            with f:
+                f.seek(offset)
+                raw = f.read(length)
+        try:
+            return json.loads(raw)
+        except json.JSONDecodeError:
+            # Смещение указывает не на начало строки — пусть get_run перестроит индекс
+            return {}
+
+    def _reset_index(self) -> None:
+        self._index = {}
+        self._index_read = 0
+        self._index_id = None
+        self._indexed_until = 0
+        self._sealed_entries = 0
+
+    def _load_index(self) -> None:
+        """Дочитывает новые записи sidecar-индекса. Вызывается под блокировкой."""
+        try:
+            st = os.stat(self.index_path)
+        except FileNotFoundError:
+            self._reset_index()
+            return
+        index_id = (st.st_dev, st.st_ino)
+        if index_id != self._index_id or st.st_size < self._index_read:
+            # Индекс перестроили (rebuild/ротация), в том числе в другом процессе
+            self._reset_index()
+            self._index_id = index_id
+        if st.st_size == self._index_read:
+            return
+        with self.index_path.open("rb") as f:
+            f.seek(self._index_read)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break
+                self._index_read += len(raw)
+                try:
+                    entry = json.loads(raw)
+                except json.JSONDecodeError:
+                    continue
+                self._remember(entry["run_id"], entry.get("segment"), entry["offset"], entry["length"])
+
+    def _remember(self, run_id: str, segment: Optional[str], offset: int, length: int) -> None:
+        old = self._index.get(run_id)
+        was_sealed = old is not None and old[0] is not None
+        if was_sealed != (segment is not None):
+            self._sealed_entries += 1 if segment is not None else -1
+        self._index[run_id] = (segment, offset, length)
+        if segment is None:
+            self._indexed_until = max(self._indexed_until, offset + length)
+
+    @staticmethod
+    def _index_line(run_id: str, segment: Optional[str], offset: int, length: int) -> str:
+        entry: Dict[str, Any] = {"run_id": run_id, "offset": offset, "length": length}
+        if segment is not None:
+            entry["segment"] = segment
+        return json.dumps(entry, ensure_ascii=False) + "\n"
+
+    def _write_index_entries(self, entries: List[Tuple[str, Optional[str], int, int]]) -> None:
+        if not entries:
+            return
+        chunk = "".join(self._index_line(*e) for e in entries).encode("utf-8")
+        with self.index_path.open("ab") as f:
+            f.write(chunk)
+        if self._index_id is None:
+            st = os.stat(self.index_path)
+            self._index_id = (st.st_dev, st.st_ino)
+        self._index_read += len(chunk)
+        for entry in entries:
+            self._remember(*entry)
+
+    def _rewrite_index(self, entries: List[Tuple[str, Optional[str], int, int]]) -> None:
+        tmp_path = self.index_path.with_name(self.index_path.name + ".tmp")
+        with tmp_path.open("w", encoding="utf-8") as out:
+            for entry in entries:
+                out.write(self._index_line(*entry))
+        os.replace(tmp_path, self.index_path)
+        self._reset_index()
+        self._load_index()
+
+    def _scan_entries(
+        self,
+        segment: Optional[str],
+        start: int,
+        end: Optional[int],
+    ) -> List[Tuple[str, Optional[str], int, int]]:
+        """Строит записи индекса для строк сегмента в диапазоне [start, end)."""
+        entries: List[Tuple[str, Optional[str], int, int]] = []
+        if end is not None and start >= end:
+            return entries
+        try:
+            f = self._open_segment(segment) if segment is not None else self.path.open("rb")
+        except FileNotFoundError:
+            return entries
+        with f:
+            f.seek(start)
+            offset = start
+            for raw in f:
+                if (end is not None and offset >= end) or not raw.endswith(b"\n"):
+                    break
+                line = raw.strip()
+                if line:
+                    try:
+                        run_id = json.loads(line).get("created_at")
+                    except json.JSONDecodeError:
+                        run_id = None
+                    if run_id:
+                        entries.append((run_id, segment, offset, len(raw)))
+                offset += len(raw)
+        return entries
+
+
+def _iter_lines(f: BinaryIO, end: Optional[int]) -> Iterator[bytes]:
+    """
+    Непустые строки файла от начала до смещения end (None — до конца).
+    Строка без \\n в конце — недописанная запись, она пропускается.
+    """
+    f.seek(0)
+    pos = 0
+    for raw in f:
+        pos += len(raw)
+        if (end is not None and pos > end) or not raw.endswith(b"\n"):
+            break
+        line = raw.strip()
+        if line:
+            yield line
+
+
+def _iter_lines_reversed(f: BinaryIO, end: int, block_size: int = 64 * 1024) -> Iterator[bytes]:
+    """
+    Непустые строки файла от смещения end к началу, чтение блоками.
+    Хвост без \\n в конце — недописанная запись, он пропускается.
+    """
+    pos = end
+    tail = b""
+    last_block = True
+    while pos > 0:
+        step = min(block_size, pos)
+        pos -= step
+        f.seek(pos)
+        chunk = f.read(step) + tail
+        lines = chunk.split(b"\n")
+        if last_block and len(lines) > 1:
+            # После последнего \n — пусто или обрывок; дальше все строки полные
+            lines[-1] = b""
+            last_block = False
+        # Первый кусок может быть неполной строкой — оставляем до следующего блока
+        tail = lines[0]
+        for raw in reversed(lines[1:]):
+            line = raw.strip()
+            if line:
+                yield line
+    line = tail.strip()
+    if line and not last_block:
+        yield line
+
+
+def _loads_line(line: bytes) -> Optional[dict]:
+    """Разбирает строку прогона; битая строка пропускается с предупреждением."""
+    try:
+        obj = json.loads(line)
+    except json.JSONDecodeError:
+        print(f"Warning: Skipping undecodable run line: {line[:200]!r}")
+        return None
+    return obj if isinstance(obj, dict) else None
+
+
+def _as_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # created_at пишется через datetime.utcnow(), т.е. naive UTC
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _parse_iso(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return _as_naive_utc(datetime.fromisoformat(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_created_at(obj: dict) -> Optional[datetime]:
+    return _parse_iso(obj.get("created_at"))
+
+
+def _run_matches(
+    obj: dict,
+    content_type: Optional[str],
+    platform: Optional[str],
+    min_usefulness: Optional[float],
+) -> bool:
+    analyzed = obj.get("analyzed") or {}
+    if content_type is not None and analyzed.get("content_type") != content_type:
+        return False
+    if platform is not None and (obj.get("reference") or {}).get("platform") != platform:
+        return False
+    if min_usefulness is not None:
+        try:
+            usefulness = float(analyzed.get("usefulness_score") or 0.0)
+        except (TypeError, ValueError):
+            usefulness = 0.0
+        if usefulness < min_usefulness:
+            return False
+    return True
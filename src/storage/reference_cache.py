@@ -0,0 +1,50 @@
+# src/storage/reference_cache.py
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Optional
+
+from src.clients.youtube_client import normalize_youtube_url
+from src.config.settings import Settings
+from src.models.reference import Reference
+from src.models.serialization import to_serializable
+from src.storage.file_cache import FileCache
+from src.storage.serialization import reference_from_dict
+
+
+class ReferenceCache:
+    """
+    Кэш Reference по нормализованному URL видео.
+
+    Метрики (просмотры, лайки) со временем устаревают, поэтому записи живут ttl_sec.
+    """
+
+    def __init__(self, root: Path, *, ttl_sec: Optional[float], max_entries: int) -> None:
+        self._cache = FileCache(root, ttl_sec=ttl_sec, max_entries=max_entries)
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> Optional["ReferenceCache"]:
+        """Кэш по настройкам; None, если он выключен (TTL = 0)."""
+        cfg = settings.cache
+        if cfg.reference_ttl_hours <= 0:
+            return None
+        return cls(
+            cfg.dir / "references",
+            ttl_sec=cfg.reference_ttl_hours * 3600,
+            max_entries=cfg.reference_max_entries,
+        )
+
+    def get(self, url: str) -> Optional[Reference]:
+        obj = self._cache.get(normalize_youtube_url(url))
+        if obj is None:
+            return None
+        try:
+            return reference_from_dict(obj)
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def put(self, ref: Reference) -> None:
+        self._cache.put(normalize_youtube_url(ref.url), to_serializable(ref))
+
+    def stats(self) -> dict:
+        return self._cache.stats()
@@ -0,0 +1,83 @@
+# src/storage/search_cache.py
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import List, Optional
+
+from src.clients.youtube_client import normalize_youtube_url
+from src.config.settings import Settings
+from src.models.reference import Reference
+from src.models.serialization import to_serializable
+from src.storage.file_cache import FileCache
+from src.storage.serialization import reference_from_dict
+
+
+class SearchCache:
+    """
+    Кэш результатов поиска YouTube по (query, max_results, max_age_days).
+
+    Результат запроса считается свежим ttl_sec; устаревший — промах, поиск
+    запускается заново. Рядом лежит индекс URL видео -> ключ запроса, чтобы
+    найти Reference по URL без перебора всех закэшированных поисков.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        *,
+        ttl_sec: float,
+        max_entries: int = 1000,
+        index_max_entries: int = 50_000,
+    ) -> None:
+        self._queries = FileCache(root / "queries", ttl_sec=ttl_sec, max_entries=max_entries)
+        self._index = FileCache(root / "index", ttl_sec=ttl_sec, max_entries=index_max_entries)
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> Optional["SearchCache"]:
+        """Кэш по настройкам; None, если он выключен (TTL = 0)."""
+        cfg = settings.cache
+        if cfg.search_ttl_hours <= 0:
+            return None
+        return cls(
+            cfg.dir / "search",
+            ttl_sec=cfg.search_ttl_hours * 3600,
+            max_entries=cfg.search_max_entries,
+        )
+
+    @staticmethod
+    def _key(query: str, max_results: int, max_age_days: int) -> str:
+        return json.dumps([query, max_results, max_age_days], ensure_ascii=False)
+
+    def get(self, query: str, max_results: int, max_age_days: int) -> Optional[List[Reference]]:
+        """Свежий результат поиска или None."""
+        return self._load(self._key(query, max_results, max_age_days))
+
+    def put(self, query: str, max_results: int, max_age_days: int, refs: List[Reference]) -> None:
+        key = self._key(query, max_results, max_age_days)
+        self._queries.put(key, [to_serializable(r) for r in refs])
+        for ref in refs:
+            self._index.put(normalize_youtube_url(ref.url), key)
+
+    def lookup(self, url: str) -> Optional[Reference]:
+        """Ищет видео по URL среди свежих закэшированных поисков."""
+        target = normalize_youtube_url(url)
+        key = self._index.get(target)
+        if key is None:
+            return None
+        for ref in self._load(key) or []:
+            if normalize_youtube_url(ref.url) == target:
+                return ref
+        return None
+
+    def stats(self) -> dict:
+        return self._queries.stats()
+
+    def _load(self, key: str) -> Optional[List[Reference]]:
+        items = self._queries.get(key)
+        if items is None:
+            return None
+        try:
+            return [reference_from_dict(obj) for obj in items]
+        except (KeyError, TypeError, ValueError):
+            return None
@@ -0,0 +1,49 @@
+# src/storage/serialization.py
+from __future__ import annotations
+
+from datetime import datetime
+
+from src.models.analyzed_content import AnalyzedContent, ContentType
+from src.models.reference import EngagementMetrics, Platform, Reference
+
+
+def reference_from_dict(obj: dict) -> Reference:
+    """Восстанавливает Reference из словаря, сохранённого через to_serializable."""
+    metrics = obj.get("metrics") or {}
+    return Reference(
+        platform=Platform(obj["platform"]),
+        url=obj["url"],
+        title=obj["title"],
+        author=obj.get("author"),
+        publish_date=datetime.fromisoformat(obj["publish_date"]),
+        metrics=EngagementMetrics(
+            views=metrics.get("views", 0),
+            likes=metrics.get("likes", 0),
+            comments=metrics.get("comments", 0),
+            shares=metrics.get("shares", 0),
+        ),
+        duration_sec=obj.get("duration_sec"),
+        caption_or_description=obj.get("caption_or_description"),
+        tags=obj.get("tags"),
+        raw=obj.get("raw"),
+        topic_score=obj.get("topic_score"),
+        popularity_score=obj.get("popularity_score"),
+        final_score=obj.get("final_score"),
+    )
+
+
+def analyzed_from_dict(obj: dict) -> AnalyzedContent:
+    """Восстанавливает AnalyzedContent из словаря."""
+    return AnalyzedContent(
+        reference_url=obj["reference_url"],
+        title=obj["title"],
+        summary=obj["summary"],
+        key_points=obj["key_points"],
+        content_type=ContentType(obj["content_type"]),
+        target_audience_score=obj["target_audience_score"],
+        usefulness_score=obj["usefulness_score"],
+        suggested_carousel_angle=obj["suggested_carousel_angle"],
+        raw_llm_output=obj.get("raw_llm_output"),
+        llm_model=obj.get("llm_model"),
+        escalation_reason=obj.get("escalation_reason"),
+    )
@@ -0,0 +1,196 @@
+# src/storage/sqlite_task_storage.py
+from __future__ import annotations
+
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from src.models.task import GenerationTask, PipelineMode, TaskStatus
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id TEXT PRIMARY KEY,
+    source_url TEXT NOT NULL,
+    platform TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    run_id TEXT,
+    error TEXT,
+    pipeline_mode TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_status_created ON tasks (status, created_at);
+CREATE INDEX IF NOT EXISTS idx_tasks_created ON tasks (created_at);
+""".strip()
+
+COLUMNS = ("id", "source_url", "platform", "status", "created_at", "updated_at", "run_id", "error", "pipeline_mode")
+
+# Колонки, добавленные после первой версии схемы: в старых базах их досоздаёт _migrate
+MIGRATIONS = {
+    "pipeline_mode": "ALTER TABLE tasks ADD COLUMN pipeline_mode TEXT",
+}
+
+
+class SqliteTaskStorage:
+    """
+    Хранилище задач в SQLite (WAL) с тем же интерфейсом, что и TaskStorage.
+
+    Главное отличие — claim_next_pending(): одним UPDATE ... RETURNING
+    забирает самую старую pending-задачу и переводит её в IN_PROGRESS,
+    поэтому несколько воркеров на одной базе не возьмут одну задачу дважды.
+    """
+
+    def __init__(self, path: Path, *, timeout: float = 30.0) -> None:
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._timeout = timeout
+        # Соединение на поток: sqlite3.Connection нельзя шарить между потоками
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            self._migrate(conn)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=self._timeout)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _migrate(conn: sqlite3.Connection) -> None:
+        existing = {row["name"] for row in conn.execute("PRAGMA table_info(tasks)")}
+        for column, ddl in MIGRATIONS.items():
+            if column not in existing:
+                conn.execute(ddl)
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    @staticmethod
+    def _to_row(task: GenerationTask) -> tuple:
+        return (
+            task.id,
+            task.source_url,
+            task.platform,
+            task.status.value,
+            task.created_at.isoformat(),
+            task.updated_at.isoformat(),
+            task.run_id,
+            task.error,
+            task.pipeline_mode.value if task.pipeline_mode else None,
+        )
+
+    @staticmethod
+    def _from_row(row: sqlite3.Row) -> GenerationTask:
+        return GenerationTask(
+            id=row["id"],
+            source_url=row["source_url"],
+            platform=row["platform"],
+            status=TaskStatus(row["status"]),
+            created_at=datetime.fromisoformat(row["created_at"]),
+            updated_at=datetime.fromisoformat(row["updated_at"]),
+            run_id=row["run_id"],
+            error=row["error"],
+            pipeline_mode=PipelineMode(row["pipeline_mode"]) if row["pipeline_mode"] else None,
+        )
+
+    def add_task(self, task: GenerationTask) -> None:
+        placeholders = ", ".join("?" for _ in COLUMNS)
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT INTO tasks ({', '.join(COLUMNS)}) VALUES ({placeholders})",
+                self._to_row(task),
+            )
+
+    def list_tasks(self, status: Optional[TaskStatus] = None) -> List[GenerationTask]:
+        conn = self._connect()
+        if status is None:
+            rows = conn.execute("SELECT * FROM tasks ORDER BY created_at").fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT * FROM tasks WHERE status = ? ORDER BY created_at",
+                (status.value,),
+            ).fetchall()
+        return [self._from_row(r) for r in rows]
+
+    def list_tasks_page(
+        self,
+        status: Optional[TaskStatus] = None,
+        *,
+        limit: int = 50,
+        after: Optional[str] = None,
+    ) -> Tuple[List[GenerationTask], Optional[str]]:
+        """
+        Страница задач от новых к старым (keyset-пагинация по created_at, id).
+        """
+        conn = self._connect()
+        where: List[str] = []
+        params: list = []
+        if status is not None:
+            where.append("status = ?")
+            params.append(status.value)
+        if after is not None:
+            cursor = conn.execute("SELECT created_at, id FROM tasks WHERE id = ?", (after,)).fetchone()
+            if cursor is None:
+                raise ValueError(f"Unknown cursor: {after}")
+            where.append("(created_at, id) < (?, ?)")
+            params.extend([cursor["created_at"], cursor["id"]])
+        sql = "SELECT * FROM tasks"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY created_at DESC, id DESC LIMIT ?"
+        # Берём на одну строку больше, чтобы понять, есть ли следующая страница
+        rows = conn.execute(sql, (*params, limit + 1)).fetchall()
+        page = [self._from_row(r) for r in rows[:limit]]
+        next_cursor = page[-1].id if len(rows) > limit else None
+        return page, next_cursor
+
+    def get_task(self, task_id: str) -> Optional[GenerationTask]:
+        row = self._connect().execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        return self._from_row(row) if row is not None else None
+
+    def update_task(self, task: GenerationTask) -> None:
+        task.updated_at = datetime.utcnow()
+        assignments = ", ".join(f"{c} = excluded.{c}" for c in COLUMNS if c != "id")
+        placeholders = ", ".join("?" for _ in COLUMNS)
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT INTO tasks ({', '.join(COLUMNS)}) VALUES ({placeholders}) "
+                f"ON CONFLICT(id) DO UPDATE SET {assignments}",
+                self._to_row(task),
+            )
+
+    def fetch_next_pending(self) -> Optional[GenerationTask]:
+        row = self._connect().execute(
+            "SELECT * FROM tasks WHERE status = ? ORDER BY created_at LIMIT 1",
+            (TaskStatus.PENDING.value,),
+        ).fetchone()
+        return self._from_row(row) if row is not None else None
+
+    def claim_next_pending(self) -> Optional[GenerationTask]:
+        """
+        Атомарно берёт самую старую pending-задачу и переводит её в IN_PROGRESS.
+        """
+        now = datetime.utcnow().isoformat()
+        with self._connect() as conn:
+            row = conn.execute(
+                """
+                UPDATE tasks SET status = ?, updated_at = ?
+                WHERE id = (
+                    SELECT id FROM tasks WHERE status = ? ORDER BY created_at LIMIT 1
+                ) AND status = ?
+                RETURNING *
+                """,
+                (TaskStatus.IN_PROGRESS.value, now, TaskStatus.PENDING.value, TaskStatus.PENDING.value),
+            ).fetchone()
+        return self._from_row(row) if row is not None else None
@@ -1,79 +1,246 @@
 # src/storage/task_storage.py
 from __future__ import annotations
 
+import bisect
 import json
+import os
+import threading
+from dataclasses import replace
 from datetime import datetime
 from pathlib import Path
 from contextlib import contextmanager
-from typing import List, Optional
+from typing import IO, Dict, List, Optional, Tuple
 
-from src.models.task import GenerationTask, TaskStatus
+from src.models.task import GenerationTask, PipelineMode, TaskStatus
 
 
 class TaskStorage:
     """
-    Примитивное хранилище задач в JSONL-файле.
+    Хранилище задач в JSONL-файле в режиме append-only лога.
 
-    Упрощение: при каждом изменении состояния задачи файл перезаписывается целиком.
-    Для текущих объёмов это ок.
+    Каждая мутация (add/update) — одна дописанная строка с полным состоянием
+    задачи; при чтении побеждает последняя запись с данным id. Поэтому
+    старый формат (одна строка = одна задача) читается без миграции.
+
+    В памяти держится индекс id -> задача, который строится при открытии
+    и дальше догоняет хвост файла (записи других процессов) по сохранённому
+    смещению. Когда мёртвых записей становится слишком много, лог
+    сворачивается обратно в снапшот (compact).
+
+    Плюс вторичные индексы: все задачи и задачи каждого статуса отсортированы
+    по (created_at, id) — на них работают выборка pending и постраничный вывод.
     """
 
-    def __init__(self, path: Path) -> None:
+    # Компактим, когда записей в логе в N раз больше, чем живых задач
+    COMPACT_RATIO = 4
+    # ...но не раньше, чем лог дорастёт до этого числа записей
+    COMPACT_MIN_RECORDS = 1000
+
+    def __init__(
+        self,
+        path: Path,
+        *,
+        compact_ratio: int = COMPACT_RATIO,
+        compact_min_records: int = COMPACT_MIN_RECORDS,
+    ) -> None:
         self.path = path
         self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Отдельный lock-файл: compact подменяет основной файл через os.replace,
+        # и блокировка на самом файле данных потерялась бы вместе с ним.
+        # В нём же лежит номер поколения лога, который compact увеличивает.
+        self.lock_path = path.with_name(path.name + ".lock")
+        self.compact_ratio = compact_ratio
+        self.compact_min_records = compact_min_records
+
+        self._tasks: Dict[str, GenerationTask] = {}
+        self._ordered: List[Tuple[datetime, str]] = []
+        self._by_status: Dict[TaskStatus, List[Tuple[datetime, str]]] = {s: [] for s in TaskStatus}
+        self._offset = 0
+        self._records = 0
+        self._file_id: Optional[tuple] = None
+        self._generation: Optional[int] = None
+        self._lock_file: Optional[IO[str]] = None
+        # flock защищает от других процессов, мьютекс — индекс от соседних потоков
+        self._mutex = threading.Lock()
 
-    @staticmethod
     @contextmanager
-    def _locked_open(path: Path, mode: str):
+    def _locked(self, exclusive: bool):
         """
-        Открывает файл и, если возможно, ставит файловую блокировку.
+        Блокирует хранилище целиком через lock-файл, если flock доступен.
         """
-        f = path.open(mode, encoding="utf-8")
+        self._mutex.acquire()
+        f = self.lock_path.open("a+", encoding="utf-8")
         try:
             try:
                 import fcntl
-                lock_type = fcntl.LOCK_EX if "w" in mode or "a" in mode else fcntl.LOCK_SH
-                fcntl.flock(f.fileno(), lock_type)
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
             except Exception:
                 pass
-            yield f
+            self._lock_file = f
+            yield
         finally:
+            self._lock_file = None
             try:
                 import fcntl
                 fcntl.flock(f.fileno(), fcntl.LOCK_UN)
             except Exception:
                 pass
             f.close()
+            self._mutex.release()
+
+    def _file_identity(self) -> Optional[tuple]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_dev, st.st_ino)
+
+    def _read_generation(self) -> int:
+        """Номер поколения лога из lock-файла. Вызывается под блокировкой."""
+        f = self._lock_file
+        if f is None:
+            return 0
+        f.seek(0)
+        try:
+            return int(f.read().strip() or 0)
+        except ValueError:
+            return 0
 
-    def _load_all(self) -> List[GenerationTask]:
-        if not self.path.exists():
-            return []
-        tasks: List[GenerationTask] = []
-        with self._locked_open(self.path, "r") as f:
-            for line in f:
-                line = line.strip()
+    def _write_generation(self, generation: int) -> None:
+        f = self._lock_file
+        if f is None:
+            return
+        f.seek(0)
+        f.truncate()
+        f.write(f"{generation}\n")
+        f.flush()
+        self._generation = generation
+
+    def _refresh(self) -> None:
+        """
+        Догоняет индекс до текущего состояния файла.
+
+        Вызывается под блокировкой. Если файл был подменён (compact в другом
+        процессе) или укорочен, индекс перестраивается с нуля. Одной пары
+        (st_dev, st_ino) для этого мало: после двух os.replace подряд ext4
+        отдаёт новому файлу тот же inode, поэтому сверяется ещё и поколение.
+        """
+        generation = self._read_generation()
+        file_id = self._file_identity()
+        if file_id is None:
+            self._reset()
+            self._file_id = None
+            self._generation = generation
+            return
+
+        if (
+            file_id != self._file_id
+            or generation != self._generation
+            or os.path.getsize(self.path) < self._offset
+        ):
+            self._reset()
+            self._file_id = file_id
+            self._generation = generation
+
+        with self.path.open("rb") as f:
+            f.seek(self._offset)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    # Недописанная строка — дочитаем в следующий раз
+                    break
+                self._offset += len(raw)
+                line = raw.strip()
                 if not line:
                     continue
                 try:
                     obj = json.loads(line)
                     task = self._from_dict(obj)
-                    tasks.append(task)
                 except (json.JSONDecodeError, KeyError, ValueError) as e:
                     print(f"Warning: Failed to parse task line: {e}")
                     continue
-        return tasks
+                self._put(task)
+                self._records += 1
 
-    def _save_all(self, tasks: List[GenerationTask]) -> None:
-        with self._locked_open(self.path, "w") as f:
-            for task in tasks:
-                line = json.dumps(task.to_serializable_dict(), ensure_ascii=False)
-                f.write(line + "\n")
+    def _reset(self) -> None:
+        self._tasks = {}
+        self._ordered = []
+        self._by_status = {s: [] for s in TaskStatus}
+        self._offset = 0
+        self._records = 0
+
+    @staticmethod
+    def _sort_key(task: GenerationTask) -> Tuple[datetime, str]:
+        return (task.created_at, task.id)
+
+    def _put(self, task: GenerationTask) -> None:
+        """Кладёт задачу в индекс id -> задача и во вторичные индексы."""
+        key = self._sort_key(task)
+        old = self._tasks.get(task.id)
+        if old is None:
+            bisect.insort(self._ordered, key)
+        else:
+            old_key = self._sort_key(old)
+            if old_key != key:
+                _remove_sorted(self._ordered, old_key)
+                bisect.insort(self._ordered, key)
+            _remove_sorted(self._by_status[old.status], old_key)
+        bisect.insort(self._by_status[task.status], key)
+        self._tasks[task.id] = task
+
+    def _append(self, task: GenerationTask) -> None:
+        """
+        Дописывает одну запись в лог. Вызывается под эксклюзивной блокировкой
+        сразу после _refresh, поэтому всё, что лежит за _offset, — недописанная
+        строка упавшего писателя: её отрезаем, иначе новая запись склеится с ней.
+        """
+        line = json.dumps(task.to_serializable_dict(), ensure_ascii=False) + "\n"
+        data = line.encode("utf-8")
+        with self.path.open("ab") as f:
+            if os.fstat(f.fileno()).st_size > self._offset:
+                print(f"Warning: Dropping torn tail of {self.path} at offset {self._offset}")
+                f.truncate(self._offset)
+            f.write(data)
+            f.flush()
+            size = os.fstat(f.fileno()).st_size
+        if self._file_id is None:
+            self._file_id = self._file_identity()
+        self._offset = size
+        self._records += 1
+        self._put(replace(task))
+
+    def _maybe_compact(self) -> None:
+        if self._records < self.compact_min_records:
+            return
+        if self._records < self.compact_ratio * max(len(self._tasks), 1):
+            return
+        self._compact_locked()
+
+    def _compact_locked(self) -> None:
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with tmp_path.open("w", encoding="utf-8") as f:
+            for task in self._tasks.values():
+                f.write(json.dumps(task.to_serializable_dict(), ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._write_generation((self._generation or 0) + 1)
+        self._file_id = self._file_identity()
+        self._offset = os.path.getsize(self.path)
+        self._records = len(self._tasks)
+
+    def compact(self) -> None:
+        """Сворачивает лог в снапшот: по одной строке на задачу."""
+        with self._locked(exclusive=True):
+            self._refresh()
+            if self._file_id is not None:
+                self._compact_locked()
 
     @staticmethod
     def _from_dict(obj: dict) -> GenerationTask:
         status = TaskStatus(obj["status"])
         created_at = datetime.fromisoformat(obj["created_at"])
         updated_at = datetime.fromisoformat(obj["updated_at"])
+        pipeline_mode = obj.get("pipeline_mode")
         return GenerationTask(
             id=obj["id"],
             source_url=obj["source_url"],
@@ -83,44 +250,87 @@ class TaskStorage:
             updated_at=updated_at,
             run_id=obj.get("run_id"),
             error=obj.get("error"),
+            pipeline_mode=PipelineMode(pipeline_mode) if pipeline_mode else None,
         )
 
     def add_task(self, task: GenerationTask) -> None:
-        tasks = self._load_all()
-        tasks.append(task)
-        self._save_all(tasks)
+        with self._locked(exclusive=True):
+            self._refresh()
+            self._append(task)
+            self._maybe_compact()
 
     def list_tasks(self, status: Optional[TaskStatus] = None) -> List[GenerationTask]:
-        tasks = self._load_all()
-        if status is None:
-            return tasks
-        return [t for t in tasks if t.status == status]
+        with self._locked(exclusive=False):
+            self._refresh()
+            keys = self._ordered if status is None else self._by_status[status]
+            return [replace(self._tasks[task_id]) for _, task_id in keys]
+
+    def list_tasks_page(
+        self,
+        status: Optional[TaskStatus] = None,
+        *,
+        limit: int = 50,
+        after: Optional[str] = None,
+    ) -> Tuple[List[GenerationTask], Optional[str]]:
+        """
+        Страница задач от новых к старым.
+
+        after — id последней задачи предыдущей страницы (курсор).
+        Возвращает задачи и курсор следующей страницы (None, если она последняя).
+        """
+        with self._locked(exclusive=False):
+            self._refresh()
+            keys = self._ordered if status is None else self._by_status[status]
+            end = len(keys)
+            if after is not None:
+                cursor_task = self._tasks.get(after)
+                if cursor_task is None:
+                    raise ValueError(f"Unknown cursor: {after}")
+                end = bisect.bisect_left(keys, self._sort_key(cursor_task))
+            start = max(end - limit, 0)
+            page = [replace(self._tasks[task_id]) for _, task_id in reversed(keys[start:end])]
+        next_cursor = page[-1].id if page and start > 0 else None
+        return page, next_cursor
 
     def get_task(self, task_id: str) -> Optional[GenerationTask]:
-        tasks = self._load_all()
-        for t in tasks:
-            if t.id == task_id:
-                return t
-        return None
+        with self._locked(exclusive=False):
+            self._refresh()
+            task = self._tasks.get(task_id)
+            return replace(task) if task is not None else None
 
     def update_task(self, task: GenerationTask) -> None:
-        tasks = self._load_all()
-        updated: List[GenerationTask] = []
-        found = False
-        for t in tasks:
-            if t.id == task.id:
-                task.updated_at = datetime.utcnow()
-                updated.append(task)
-                found = True
-            else:
-                updated.append(t)
-        if not found:
-            updated.append(task)
-        self._save_all(updated)
+        with self._locked(exclusive=True):
+            self._refresh()
+            task.updated_at = datetime.utcnow()
+            self._append(task)
+            self._maybe_compact()
 
     def fetch_next_pending(self) -> Optional[GenerationTask]:
-        tasks = self._load_all()
-        for task in tasks:
-            if task.status == TaskStatus.PENDING:
-                return task
+        with self._locked(exclusive=False):
+            self._refresh()
+            pending = self._by_status[TaskStatus.PENDING]
+            if pending:
+                return replace(self._tasks[pending[0][1]])
+        return None
+
+    def claim_next_pending(self) -> Optional[GenerationTask]:
+        """
+        Берёт первую pending-задачу и переводит её в IN_PROGRESS
+        под одной эксклюзивной блокировкой.
+        """
+        with self._locked(exclusive=True):
+            self._refresh()
+            pending = self._by_status[TaskStatus.PENDING]
+            if pending:
+                task = self._tasks[pending[0][1]]
+                claimed = replace(task, status=TaskStatus.IN_PROGRESS, updated_at=datetime.utcnow())
+                self._append(claimed)
+                self._maybe_compact()
+                return replace(claimed)
         return None
+
+
+def _remove_sorted(keys: List[Tuple[datetime, str]], key: Tuple[datetime, str]) -> None:
+    i = bisect.bisect_left(keys, key)
+    if i < len(keys) and keys[i] == key:
+        del keys[i]